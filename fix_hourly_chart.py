@@ -1,61 +1,21 @@
-import os
 import sys
-from datetime import datetime
 
-class HourlyChartFixer:
-    def __init__(self, html_file='daily_cycle_count.html'):
-        self.html_file = html_file
-        self.content = None
-        
-    def load_file(self):
-        try:
-            if not os.path.exists(self.html_file):
-                print(f"❌ File not found: {self.html_file}")
-                return False
-            with open(self.html_file, 'r', encoding='utf-8') as f:
-                self.content = f.read()
-            print(f"✅ Loaded {self.html_file}")
-            return True
-        except Exception as e:
-            print(f"❌ Error: {str(e)}")
-            return False
-    
-    def backup_file(self):
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{self.html_file}.backup_{timestamp}"
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                f.write(self.content)
-            print(f"✅ Backup: {backup_file}")
-            return True
-        except Exception as e:
-            print(f"⚠️ Backup failed: {str(e)}")
-            return False
-    
-    def add_function_call(self):
-        """Add renderTsHourlyChart call after renderTsAnalytics"""
-        print("\n📝 Step 1: Adding function call...")
-        
-        old_call = '''            renderTsAnalytics(sessions, analyticsDate, logsToProcess);
+from patch_engine import INSERT_AFTER_LINE, INSERT_BEFORE, Patch, patch_file, print_results
+
+# Adds renderTsHourlyChart() to the timestamp modal: the call from
+# renderTimestamps(), the function itself and the Full Report button listener.
+
+HTML_FILE = 'daily_cycle_count.html'
+
+CALL_ANCHOR = '''            renderTsAnalytics(sessions, analyticsDate, logsToProcess);
             renderBreakLogTable(logsToProcess, attendance);'''
-        
-        new_call = '''            renderTsAnalytics(sessions, analyticsDate, logsToProcess);
+
+CALL_TEXT = '''            renderTsAnalytics(sessions, analyticsDate, logsToProcess);
             renderTsHourlyChart(analyticsDate);
             renderBreakLogTable(logsToProcess, attendance);'''
-        
-        if old_call in self.content:
-            self.content = self.content.replace(old_call, new_call)
-            print("✅ Function call added")
-            return True
-        else:
-            print("❌ Could not find renderTsAnalytics location")
-            return False
-    
-    def add_function_definition(self):
-        """Add the renderTsHourlyChart function"""
-        print("📝 Step 2: Adding function definition...")
-        
-        new_function = '''
+
+# Inserted before renderInactiveUsersTable
+FUNCTION_TEXT = '''
         function renderTsHourlyChart(date) {
             const ctx = document.getElementById('ts-hourly-chart');
             if (!ctx || typeof Chart === 'undefined') return;
@@ -183,24 +143,10 @@ class HourlyChartFixer:
             }
         }
 '''
-        
-        # Find insertion point - before renderInactiveUsersTable
-        insert_marker = '        function renderInactiveUsersTable(sessions, attendanceData, logs) {'
-        insert_pos = self.content.find(insert_marker)
-        
-        if insert_pos != -1:
-            self.content = self.content[:insert_pos] + new_function + '\n        ' + self.content[insert_pos:]
-            print("✅ Function definition added")
-            return True
-        else:
-            print("❌ Could not find insertion point")
-            return False
-    
-    def add_button_listener(self):
-        """Add button event listener"""
-        print("📝 Step 3: Adding button listener...")
-        
-        listener = '''
+
+FUNCTION_ANCHOR = '        function renderInactiveUsersTable(sessions, attendanceData, logs) {'
+
+LISTENER_TEXT = '''
         const tsViewHourlyFullBtn = document.getElementById('ts-view-hourly-full-btn');
         if (tsViewHourlyFullBtn) {
             tsViewHourlyFullBtn.addEventListener('click', () => {
@@ -209,47 +155,33 @@ class HourlyChartFixer:
             });
         }
 '''
-        
-        # Find where tsAnalyticsDateFilter is defined
-        marker = "const tsAnalyticsDateFilter = document.getElementById('ts-analytics-date-filter');"
-        pos = self.content.find(marker)
-        
-        if pos != -1:
-            end_line = self.content.find('\n', pos)
-            self.content = self.content[:end_line+1] + listener + self.content[end_line+1:]
-            print("✅ Button listener added")
-            return True
-        else:
-            print("⚠️ Could not add button listener (may already exist)")
-            return False
-    
-    def save_file(self):
-        try:
-            with open(self.html_file, 'w', encoding='utf-8') as f:
-                f.write(self.content)
-            print(f"\n✅ File saved")
-            return True
-        except Exception as e:
-            print(f"❌ Error saving: {str(e)}")
-            return False
-    
+
+# Inserted after the line defining tsAnalyticsDateFilter
+LISTENER_ANCHOR = "const tsAnalyticsDateFilter = document.getElementById('ts-analytics-date-filter');"
+
+PATCHES = [
+    Patch("renderTsHourlyChart call", CALL_ANCHOR, CALL_TEXT,
+          marker="renderTsHourlyChart(analyticsDate);", files=HTML_FILE),
+    Patch("renderTsHourlyChart definition", FUNCTION_ANCHOR, FUNCTION_TEXT + '\n        ', mode=INSERT_BEFORE,
+          marker="function renderTsHourlyChart(date)", files=HTML_FILE),
+    Patch("Full Report button listener", LISTENER_ANCHOR, LISTENER_TEXT, mode=INSERT_AFTER_LINE,
+          marker="const tsViewHourlyFullBtn = ", files=HTML_FILE),
+]
+
+class HourlyChartFixer:
+    def __init__(self, html_file=HTML_FILE):
+        self.html_file = html_file
+        self.results = []
+
     def run(self):
         print("="*70)
         print("HOURLY OUTPUT CHART - COMPLETE FIX")
         print("="*70 + "\n")
-        
-        if not self.load_file():
-            return False
-        
-        self.backup_file()
-        
-        success = True
-        success &= self.add_function_call()
-        success &= self.add_function_definition()
-        success &= self.add_button_listener()
-        
-        if success:
-            self.save_file()
+
+        self.results = [patch_file(self.html_file, PATCHES)]
+        print_results(self.results)
+
+        if self.results and all(r.ok for r in self.results):
             print("\n" + "="*70)
             print("✅ ALL FIXES APPLIED SUCCESSFULLY!")
             print("="*70)
@@ -268,4 +200,4 @@ class HourlyChartFixer:
 if __name__ == '__main__':
     fixer = HourlyChartFixer()
     success = fixer.run()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
@@ -1,47 +1,13 @@
-import os
 import sys
-from datetime import datetime
 
-class LayoutFixer:
-    def __init__(self, html_file='daily_cycle_count.html'):
-        self.html_file = html_file
-        self.content = None
-        self.success = False
-        
-    def load_file(self):
-        """Load the HTML file"""
-        try:
-            if not os.path.exists(self.html_file):
-                print(f"❌ File not found: {self.html_file}")
-                return False
-            
-            with open(self.html_file, 'r', encoding='utf-8') as f:
-                self.content = f.read()
-            print(f"✅ Loaded {self.html_file} ({len(self.content)} characters)")
-            return True
-        except Exception as e:
-            print(f"❌ Error loading file: {str(e)}")
-            return False
-    
-    def backup_file(self):
-        """Create a backup"""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{self.html_file}.backup_{timestamp}"
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                f.write(self.content)
-            print(f"✅ Backup created: {backup_file}")
-            return True
-        except Exception as e:
-            print(f"⚠️  Backup failed: {str(e)}")
-            return False
-    
-    def apply_layout_fix(self):
-        """Apply the layout fixes"""
-        print("\n📝 Applying Layout Fixes...")
-        
-        # Old right column section
-        old_right_column = '''            <!-- Right Column: Hourly Output Chart + Analytics -->
+from patch_engine import Patch, patch_file, print_results
+
+# Reworks the right column of the timestamp modal (hourly chart and
+# analytics overview) in daily_cycle_count.html.
+
+HTML_FILE = 'daily_cycle_count.html'
+
+RIGHT_COLUMN_ANCHOR = '''            <!-- Right Column: Hourly Output Chart + Analytics -->
             <div style="width: 40%; display:flex; flex-direction:column; border-left:1px solid #eee; padding-left:20px; gap: 15px; overflow-y: auto;">
                 
                 <!-- Hourly Output Chart Section -->
@@ -81,9 +47,8 @@ class LayoutFixer:
                     <div id="ts-analytics-content" style="overflow-y: auto;"></div>
                 </div>
             </div>'''
-        
-        # New improved right column section
-        new_right_column = '''            <!-- Right Column: Hourly Output Chart + Analytics -->
+
+RIGHT_COLUMN_TEXT = '''            <!-- Right Column: Hourly Output Chart + Analytics -->
             <div style="width: 40%; display:flex; flex-direction:column; border-left:1px solid #eee; padding-left:20px; gap: 15px; overflow-y: auto; min-width: 350px;">
                 
                 <!-- Hourly Output Chart Section -->
@@ -123,45 +88,31 @@ class LayoutFixer:
                     <div id="ts-analytics-content" style="overflow-y:auto; flex:1; padding:8px; background:#fff; border:1px solid #eee; border-radius:4px;"></div>
                 </div>
             </div>'''
-        
-        if old_right_column in self.content:
-            self.content = self.content.replace(old_right_column, new_right_column)
-            print("✅ Layout fixes applied successfully!")
-            return True
-        else:
-            print("❌ Could not find right column section to update")
-            print("   The HTML structure may have changed.")
-            return False
-    
-    def save_file(self):
-        """Save the modified file"""
-        try:
-            with open(self.html_file, 'w', encoding='utf-8') as f:
-                f.write(self.content)
-            print(f"\n✅ File saved: {self.html_file}")
-            return True
-        except Exception as e:
-            print(f"❌ Error saving file: {str(e)}")
-            return False
-    
+
+PATCHES = [
+    Patch("Timestamp modal right column layout", RIGHT_COLUMN_ANCHOR, RIGHT_COLUMN_TEXT, files=HTML_FILE),
+]
+
+class LayoutFixer:
+    def __init__(self, html_file=HTML_FILE):
+        self.html_file = html_file
+        self.results = []
+        self.success = False
+
     def run(self):
         """Execute all steps"""
         print("="*60)
         print("TIMESTAMP MODAL - LAYOUT FIXES")
         print("="*60 + "\n")
-        
-        if not self.load_file():
-            return False
-        
-        self.backup_file()
-        
-        if not self.apply_layout_fix():
+
+        print("📝 Applying Layout Fixes...")
+        self.results = [patch_file(self.html_file, PATCHES)]
+        print_results(self.results)
+        self.success = bool(self.results) and all(r.ok for r in self.results)
+        if not self.success:
             print("\n❌ Layout fix failed!")
             return False
-        
-        if not self.save_file():
-            return False
-        
+
         print("\n" + "="*60)
         print("✅ ALL LAYOUT FIXES APPLIED SUCCESSFULLY!")
         print("="*60)
@@ -174,10 +125,10 @@ class LayoutFixer:
         print("   ✓ Enhanced visual hierarchy")
         print("\n🔄 Reload your browser to see the changes!")
         print("="*60 + "\n")
-        
+
         return True
 
 if __name__ == '__main__':
     fixer = LayoutFixer()
     success = fixer.run()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
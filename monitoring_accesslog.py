@@ -0,0 +1,235 @@
+import os
+import re
+import time
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from monitoring_system_v3 import ICollector, Metric, MetricType
+
+logger = logging.getLogger(__name__)
+
+# --- Access Log Collector ---
+
+# Matches the request part shared by Python's http.server log and the
+# Common/Combined Log Format:  "GET /api/ping?x=1 HTTP/1.1" 404
+# The query string is left out of the path group. Lines without a request
+# (e.g. http.server's "code 404, message File not found") do not match.
+REQUEST_RE = re.compile(rb'"([A-Z]+) ([^ "?]*)[^"]*" (\d{3})\b')
+
+_ID_SEGMENT = re.compile(r"/(?:\d+|[0-9a-fA-F]{24,}|[0-9a-fA-F-]{36})(?=/|$)")
+
+_CHUNK = 1 << 20
+OTHER_PATH = "other"
+
+class _TailedFile:
+    """Read position in one log file, identified by (st_dev, st_ino)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd: Optional[int] = None
+        self.identity: Optional[Tuple[int, int]] = None
+        self.offset = 0
+        self.size = 0
+        self.rotations = 0
+        self.bytes_read = 0
+
+    def open(self, st: os.stat_result, offset: int):
+        self.fd = os.open(self.path, os.O_RDONLY)
+        self.identity = (st.st_dev, st.st_ino)
+        self.offset = offset
+        self.size = st.st_size
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class AccessLogCollector(ICollector):
+    """
+    Turns HTTP access logs into request and error counters.
+
+    Each cycle reads only the bytes appended since the previous one (up to
+    `max_bytes_per_cycle` per file; the rest is picked up next cycle) and
+    runs one precompiled regex over whole chunks instead of splitting
+    lines. Counts are aggregated in-process and emitted as cumulative
+    COUNTER series:
+
+      http_requests_total{log, method, path, status}
+      http_request_errors_total{log, path}          status >= 400
+
+    plus per-log http_requests_per_sec and http_error_ratio gauges for the
+    last cycle. Query strings are dropped and numeric/hex id segments are
+    collapsed to ":id"; beyond `max_paths` distinct paths per log the rest
+    are counted as "other".
+
+    Rotation is detected by the file's inode: a renamed log is read to its
+    end before the new file is opened from the start, a truncated log is
+    re-read from the start. Offsets and totals are part of get_state(), so
+    with a Checkpointer a restart resumes where it stopped. Without saved
+    state a log is read from its end unless `from_start` is set.
+    """
+
+    def __init__(self, paths: List[str], max_paths: int = 200, from_start: bool = False,
+                 max_bytes_per_cycle: int = 64 * 1024 * 1024):
+        self.paths = list(paths)
+        self.max_paths = max_paths
+        self.from_start = from_start
+        self.max_bytes_per_cycle = max_bytes_per_cycle
+        self._files: Dict[str, _TailedFile] = {path: _TailedFile(path) for path in self.paths}
+        self._saved: Dict[str, Tuple[int, int, int]] = {}
+        self._totals: Dict[str, Counter] = {path: Counter() for path in self.paths}
+        self._known_paths: Dict[str, set] = {path: set() for path in self.paths}
+        self._prev: Dict[str, Tuple[float, float]] = {}
+        self._prev_time: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({', '.join(os.path.basename(p) for p in self.paths)})"
+
+    def collect(self) -> List[Metric]:
+        now = time.time()
+        mono = time.monotonic()
+        elapsed = None if self._prev_time is None else mono - self._prev_time
+        self._prev_time = mono
+        metrics: List[Metric] = []
+        for path, tailed in self._files.items():
+            try:
+                self._tail(tailed)
+            except OSError as e:
+                logger.error(f"Failed to read access log {path}: {e}")
+            self._emit(metrics, path, now, elapsed)
+        return metrics
+
+    # -- tailing --
+
+    def _tail(self, tailed: _TailedFile):
+        try:
+            st = os.stat(tailed.path)
+        except FileNotFoundError:
+            st = None  # rotated away and not recreated yet
+        if tailed.fd is not None and (st is None or (st.st_dev, st.st_ino) != tailed.identity):
+            self._read(tailed, final=True)
+            tailed.close()
+            tailed.rotations += 1
+            if st is None:
+                return
+            tailed.open(st, 0)
+        elif tailed.fd is None:
+            if st is None:
+                return
+            saved = self._saved.pop(tailed.path, None)
+            if saved is not None and (st.st_dev, st.st_ino) == tuple(saved[:2]) and st.st_size >= saved[2]:
+                offset = saved[2]
+            elif saved is not None or tailed.identity is not None or self.from_start:
+                offset = 0  # a new file after rotation
+            else:
+                offset = st.st_size
+            tailed.open(st, offset)
+        elif st.st_size < tailed.offset:
+            tailed.offset = 0  # truncated in place (copytruncate)
+        tailed.size = st.st_size
+        self._read(tailed)
+
+    def _read(self, tailed: _TailedFile, final: bool = False):
+        budget = self.max_bytes_per_cycle
+        found = Counter()
+        while budget > 0:
+            data = os.pread(tailed.fd, min(_CHUNK, budget), tailed.offset)
+            if not data:
+                break
+            end = len(data) if final else data.rfind(b"\n") + 1
+            if end == 0:
+                if len(data) < _CHUNK:
+                    break  # partial last line, wait for the rest
+                end = len(data)  # a line longer than a chunk; count what we can
+            found.update(REQUEST_RE.findall(data, 0, end))
+            tailed.offset += end
+            tailed.bytes_read += end
+            budget -= end
+        tailed.size = max(tailed.size, tailed.offset)
+        if found:
+            self._aggregate(tailed.path, found)
+
+    def _aggregate(self, log: str, found: Counter):
+        totals = self._totals[log]
+        known = self._known_paths[log]
+        for (method, raw_path, status), count in found.items():
+            path = _ID_SEGMENT.sub("/:id", raw_path.decode("latin-1")) or "/"
+            if path not in known:
+                if len(known) >= self.max_paths:
+                    path = OTHER_PATH
+                else:
+                    known.add(path)
+            totals[(method.decode("ascii"), path, status.decode("ascii"))] += count
+
+    # -- metrics --
+
+    def _emit(self, metrics: List[Metric], log: str, now: float, elapsed: Optional[float]):
+        name = os.path.basename(log)
+        requests = errors = 0
+        errors_by_path: Counter = Counter()
+        for (method, path, status), count in self._totals[log].items():
+            metrics.append(Metric(name="http_requests_total", value=float(count), timestamp=now,
+                                  tags={"log": name, "method": method, "path": path, "status": status},
+                                  metric_type=MetricType.COUNTER))
+            requests += count
+            if status >= "400":
+                errors += count
+                errors_by_path[path] += count
+        for path, count in errors_by_path.items():
+            metrics.append(Metric(name="http_request_errors_total", value=float(count), timestamp=now,
+                                  tags={"log": name, "path": path}, metric_type=MetricType.COUNTER))
+
+        prev = self._prev.get(log)
+        self._prev[log] = (requests, errors)
+        if prev is not None and elapsed:
+            delta_requests = requests - prev[0]
+            delta_errors = errors - prev[1]
+            metrics.append(Metric(name="http_requests_per_sec", value=delta_requests / elapsed,
+                                  timestamp=now, tags={"log": name}))
+            ratio = delta_errors / delta_requests if delta_requests else 0.0
+            metrics.append(Metric(name="http_error_ratio", value=ratio, timestamp=now, tags={"log": name}))
+
+    def metrics(self) -> List[Metric]:
+        """Tailing progress per log, for engine instrumentation."""
+        now = time.time()
+        metrics = []
+        for path, tailed in self._files.items():
+            tags = {"log": os.path.basename(path)}
+            metrics.append(Metric(name="access_log_backlog_bytes", value=float(max(tailed.size - tailed.offset, 0)),
+                                  timestamp=now, tags=tags))
+            metrics.append(Metric(name="access_log_read_bytes_total", value=float(tailed.bytes_read),
+                                  timestamp=now, tags=dict(tags), metric_type=MetricType.COUNTER))
+            metrics.append(Metric(name="access_log_rotations_total", value=float(tailed.rotations),
+                                  timestamp=now, tags=dict(tags), metric_type=MetricType.COUNTER))
+        return metrics
+
+    # -- checkpoint state --
+
+    def get_state(self) -> Dict[str, object]:
+        """Offsets and inodes of each log plus the running totals."""
+        files = {}
+        for path, tailed in self._files.items():
+            if tailed.identity is not None:
+                files[path] = [tailed.identity[0], tailed.identity[1], tailed.offset]
+            elif path in self._saved:
+                files[path] = list(self._saved[path])
+        totals = [[path, method, route, status, count]
+                  for path, counts in self._totals.items()
+                  for (method, route, status), count in counts.items()]
+        return {"files": files, "totals": totals}
+
+    def set_state(self, state: Dict[str, object]):
+        for path, saved in state.get("files", {}).items():
+            if path in self._files and self._files[path].fd is None:
+                self._saved[path] = tuple(saved)
+        for path, method, route, status, count in state.get("totals", []):
+            if path in self._totals:
+                self._totals[path][(method, route, status)] += count
+                if route != OTHER_PATH:
+                    self._known_paths[path].add(route)
+
+    def close(self):
+        for tailed in self._files.values():
+            tailed.close()
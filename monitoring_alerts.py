@@ -0,0 +1,212 @@
+import json
+import time
+import queue
+import logging
+import threading
+import urllib.request
+from typing import Dict, List, Optional
+
+from monitoring_system_v3 import IAlertChannel, Metric
+
+logger = logging.getLogger(__name__)
+
+# --- Alert Dispatch ---
+
+class Alert:
+    __slots__ = ("message", "severity", "timestamp")
+
+    def __init__(self, message: str, severity: str, timestamp: Optional[float] = None):
+        self.message = message
+        self.severity = severity
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"message": self.message, "severity": self.severity, "timestamp": self.timestamp}
+
+class WebhookAlertChannel(IAlertChannel):
+    """POSTs alerts as JSON to `url`. Batches are sent as {"alerts": [...]} in one request."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send_alert(self, message: str, severity: str):
+        self.send_alerts([Alert(message, severity)])
+
+    def send_alerts(self, alerts: List[Alert]):
+        body = json.dumps({"alerts": [a.to_dict() for a in alerts]}).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, method="POST", headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class _ChannelWorker:
+    """Queue, worker thread and counters for one wrapped channel."""
+
+    def __init__(self, channel: IAlertChannel, dispatcher: "AlertDispatcher"):
+        self.channel = channel
+        self.name = type(channel).__name__
+        self.queue: queue.Queue = queue.Queue(maxsize=dispatcher.max_queue)
+        self.dispatcher = dispatcher
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self._tokens = float(dispatcher.burst)
+        self._refilled = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"alerts-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        d = self.dispatcher
+        while True:
+            try:
+                first = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                if d._closing.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = time.monotonic() + d.batch_wait
+            while len(batch) < d.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._throttle()
+            self._deliver(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _throttle(self):
+        """Token bucket: at most `rate_limit` sends per second with bursts of `burst`."""
+        d = self.dispatcher
+        if not d.rate_limit:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(d.burst), self._tokens + (now - self._refilled) * d.rate_limit)
+            self._refilled = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            time.sleep((1.0 - self._tokens) / d.rate_limit)
+
+    def _deliver(self, batch: List[Alert]):
+        d = self.dispatcher
+        delay = d.retry_backoff
+        send_batch = getattr(self.channel, "send_alerts", None)
+        done = 0  # alerts already delivered one by one; a retry resumes after them
+        for attempt in range(d.max_retries + 1):
+            try:
+                if send_batch is not None:
+                    send_batch(batch)
+                    done = len(batch)
+                else:
+                    while done < len(batch):
+                        alert = batch[done]
+                        self.channel.send_alert(alert.message, alert.severity)
+                        done += 1
+                self.sent += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == d.max_retries:
+                    self.sent += done
+                    self.failed += len(batch) - done
+                    logger.error(f"Alert channel {self.name} failed after {attempt + 1} attempts: {e}")
+                    return
+                self.retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, d.max_backoff)
+
+class AlertDispatcher(IAlertChannel):
+    """
+    Non-blocking front for slow alert channels.
+
+    Register it with MonitoringEngine.register_alerter() in place of the
+    channels it wraps. send_alert() only enqueues; each wrapped channel has
+    its own bounded queue and worker thread that coalesces up to
+    `batch_size` alerts (waiting at most `batch_wait` seconds) into one
+    send, calling the channel's send_alerts() when it has one. Sends are
+    rate limited per channel and retried with exponential backoff. When a
+    queue is full the alert is dropped and counted rather than blocking
+    the collection loop.
+    """
+
+    def __init__(self, channels: Optional[List[IAlertChannel]] = None, max_queue: int = 1000,
+                 batch_size: int = 50, batch_wait: float = 0.5, rate_limit: float = 0.0,
+                 burst: int = 5, max_retries: int = 3, retry_backoff: float = 0.5,
+                 max_backoff: float = 30.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.rate_limit = rate_limit
+        self.burst = max(burst, 1)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._closing = threading.Event()
+        self._workers: List[_ChannelWorker] = []
+        for channel in channels or []:
+            self.add_channel(channel)
+
+    def add_channel(self, channel: IAlertChannel):
+        self._workers.append(_ChannelWorker(channel, self))
+
+    def send_alert(self, message: str, severity: str):
+        alert = Alert(message, severity)
+        for worker in self._workers:
+            try:
+                worker.queue.put_nowait(alert)
+            except queue.Full:
+                worker.dropped += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            w.name: {
+                "queue_depth": w.queue.qsize(),
+                "sent": w.sent,
+                "batches": w.batches,
+                "dropped": w.dropped,
+                "failed": w.failed,
+                "retries": w.retries,
+            }
+            for w in self._workers
+        }
+
+    def metrics(self) -> List[Metric]:
+        """Back-pressure figures as Metrics, tagged by channel."""
+        metrics = []
+        now = time.time()
+        for channel, stats in self.stats().items():
+            tags = {"channel": channel}
+            metrics.append(Metric(name="alert_queue_depth", value=float(stats["queue_depth"]),
+                                  timestamp=now, tags=tags))
+            for key in ("sent", "dropped", "failed"):
+                metrics.append(Metric(name=f"alerts_{key}_total", value=float(stats[key]),
+                                      timestamp=now, tags=dict(tags)))
+        return metrics
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every queued alert was handled. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            while worker.queue.unfinished_tasks:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        self._closing.set()
+        for worker in self._workers:
+            worker.thread.join(timeout)
+        for worker in self._workers:
+            try:
+                worker.channel.close()
+            except Exception as e:
+                logger.error(f"Error closing alert channel {worker.name}: {e}")
@@ -0,0 +1,399 @@
+import copy
+import json
+import math
+import uuid
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# --- IMS Cycle-Count Analytics ---
+#
+# Record shapes follow daily_cycle_count.html:
+#   counters    (localStorage "ims_daily_counters_v1")
+#       {id, date, shift, required, standardRate, targetOutput, note,
+#        hourlyActuals: {"6:00 - 7:00": n, ...}, hourlyTargets: {...}}
+#   attendance  (localStorage "ims_daily_counters_attendance_v1")
+#       {id, date, shift, userId, name, role, jobDescription, timeIn, ..., status}
+
+COUNTERS_KEYS = ("ims_daily_counters_v1", "counters")
+ATTENDANCE_KEYS = ("ims_daily_counters_attendance_v1", "attendance")
+
+# The chart's day runs from 6:00 to 6:00
+HOURS = [(6 + i) % 24 for i in range(24)]
+HOUR_LABELS = [f"{h}:00 - {h + 1}:00" for h in HOURS]
+SHIFT_HOURS = {
+    "1st Shift-(6am-2pm)": range(6, 14),
+    "2nd Shift-(2pm-10pm)": range(14, 22),
+    "3rd Shift-(10pm-6am)": (22, 23, 0, 1, 2, 3, 4, 5),
+}
+# Attendance with this status is not counted towards the daily target
+SLIDE_STATUS = "Temporary slide to Other task"
+
+def _number(value: Any) -> float:
+    """JavaScript's Number(x) || 0."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+def _js_round(value: float) -> int:
+    return math.floor(value + 0.5)
+
+def _counter_key(record: Dict[str, Any]) -> str:
+    return str(record.get("id") or f"{record.get('date')}|{record.get('shift')}")
+
+def _attendance_key(record: Dict[str, Any]) -> str:
+    return str(record.get("id") or
+               f"{record.get('date')}|{record.get('shift')}|{record.get('userId')}|{record.get('name')}")
+
+class CycleCountAnalytics:
+    """
+    Pre-aggregated output and target figures for the daily counters page.
+
+    Counter and attendance records are indexed by date. A change to a
+    record only invalidates the dates it belongs to (before and after the
+    change); a date's aggregate is rebuilt from that day's records the
+    next time it is read, so the cost of an update or a chart payload
+    depends on one day's records, not on the size of the history.
+
+    Aggregates reproduce the browser's arithmetic: the hourly chart sums
+    hourlyActuals/hourlyTargets over the 24 hour labels and, for
+    counters without hourlyTargets, spreads round(activeTarget / 8) over
+    the shift's hours, where activeTarget is headcount * standardRate
+    (or targetOutput when no rate is set). The daily view sums all
+    hourlyActuals and excludes attendance marked as a temporary slide.
+    Output tracked only through cycle-count timestamps is not part of the
+    exported datasets and counts as 0.
+
+    Versions restart at 0 with the process, so `epoch` (random per
+    instance) is part of every ETag built from them.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, Any]] = {}
+        self._attendance: Dict[str, Dict[str, Any]] = {}
+        self._counters_by_date: Dict[str, Set[str]] = {}
+        self._attendance_by_date: Dict[str, Set[str]] = {}
+        self._days: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:12]
+
+    # -- ingest --
+
+    def load(self, path: str):
+        """Loads an exported JSON file (a localStorage dump or db.json) and syncs to it."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.load_data(data)
+
+    def load_data(self, data: Dict[str, Any]):
+        counters = next((data[k] for k in COUNTERS_KEYS if k in data), None)
+        attendance = next((data[k] for k in ATTENDANCE_KEYS if k in data), None)
+        self.sync(counters=counters, attendance=attendance)
+
+    def sync(self, counters: Optional[List[Dict[str, Any]]] = None,
+             attendance: Optional[List[Dict[str, Any]]] = None):
+        """
+        Replaces a whole dataset with a fresh export. Only records that were
+        added, changed or removed invalidate their dates. A dataset passed
+        as None is left untouched.
+        """
+        with self._lock:
+            if counters is not None:
+                self._sync(self._counters, self._counters_by_date, counters, _counter_key)
+            if attendance is not None:
+                self._sync(self._attendance, self._attendance_by_date, attendance, _attendance_key)
+
+    def upsert_counters(self, records: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for record in records:
+                self._put(self._counters, self._counters_by_date, _counter_key(record), record)
+
+    def upsert_attendance(self, records: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for record in records:
+                self._put(self._attendance, self._attendance_by_date, _attendance_key(record), record)
+
+    def remove_counter(self, record_id: str):
+        with self._lock:
+            self._put(self._counters, self._counters_by_date, record_id, None)
+
+    def remove_attendance(self, record_id: str):
+        with self._lock:
+            self._put(self._attendance, self._attendance_by_date, record_id, None)
+
+    def _sync(self, records, by_date, fresh, key_of):
+        seen = set()
+        for record in fresh:
+            key = key_of(record)
+            seen.add(key)
+            self._put(records, by_date, key, record)
+        for key in [k for k in records if k not in seen]:
+            self._put(records, by_date, key, None)
+
+    def _put(self, records, by_date, key: str, record: Optional[Dict[str, Any]]):
+        old = records.get(key)
+        if old == record:
+            return
+        if old is not None:
+            date = old.get("date")
+            by_date.get(date, set()).discard(key)
+            self._invalidate(date)
+        if record is None:
+            records.pop(key, None)
+            return
+        # deep copy: the caller may edit hourlyActuals in place and upsert the same record again
+        records[key] = copy.deepcopy(record)
+        date = record.get("date")
+        by_date.setdefault(date, set()).add(key)
+        self._invalidate(date)
+
+    def _invalidate(self, date: str):
+        self._days.pop(date, None)
+        self._versions[date] = self._versions.get(date, 0) + 1
+
+    # -- aggregation --
+
+    def dates(self) -> List[str]:
+        with self._lock:
+            return sorted(d for d, keys in self._counters_by_date.items() if keys and d)
+
+    def version(self, date: str) -> int:
+        """Changes whenever the figures for `date` may have changed."""
+        with self._lock:
+            return self._versions.get(date, 0)
+
+    def etag(self, date: str, version: Optional[int] = None) -> str:
+        """Entity tag for the payloads of `date` (at `version`, default the current one)."""
+        if version is None:
+            version = self.version(date)
+        return f'"{date}-{self.epoch}-{version}"'
+
+    def day(self, date: str) -> Dict[str, Any]:
+        """Hourly and per-shift figures for one date, built once per change."""
+        with self._lock:
+            return self._day_locked(date)
+
+    def _day_locked(self, date: str) -> Dict[str, Any]:
+        day = self._days.get(date)
+        if day is None:
+            day = self._days[date] = self._aggregate(date)
+        return day
+
+    def _aggregate(self, date: str) -> Dict[str, Any]:
+        counters = [self._counters[k] for k in sorted(self._counters_by_date.get(date, ()))]
+        attendance = [self._attendance[k] for k in self._attendance_by_date.get(date, ())]
+        headcount: Dict[str, int] = {}
+        present: Dict[str, int] = {}
+        for entry in attendance:
+            shift = entry.get("shift")
+            headcount[shift] = headcount.get(shift, 0) + 1
+            if entry.get("status") != SLIDE_STATUS:
+                present[shift] = present.get(shift, 0) + 1
+
+        hourly_output = dict.fromkeys(HOUR_LABELS, 0.0)
+        hourly_target = dict.fromkeys(HOUR_LABELS, 0.0)
+        shifts: Dict[str, Dict[str, float]] = {}
+        for counter in counters:
+            shift = counter.get("shift")
+            actuals = counter.get("hourlyActuals")
+            targets = counter.get("hourlyTargets")
+            rate = _number(counter.get("standardRate"))
+
+            if actuals:
+                for label, value in actuals.items():
+                    if label in hourly_output:
+                        hourly_output[label] += _number(value)
+            if isinstance(targets, dict):
+                for label, value in targets.items():
+                    if label in hourly_target:
+                        hourly_target[label] += _number(value)
+            else:
+                active = headcount.get(shift, 0) * rate if rate > 0 else _number(counter.get("targetOutput"))
+                per_hour = _js_round(active / 8) if active > 0 else 0
+                for hour in SHIFT_HOURS.get(shift, ()):
+                    hourly_target[f"{hour}:00 - {hour + 1}:00"] += per_hour
+
+            output = sum(_number(v) for v in actuals.values()) if actuals else 0.0
+            if targets:
+                target = sum(_number(v) for v in targets.values())
+            else:
+                target = present.get(shift, 0) * rate if rate > 0 else _number(counter.get("targetOutput"))
+            totals = shifts.setdefault(shift, {"output": 0.0, "target": 0.0, "headcount": present.get(shift, 0)})
+            totals["output"] += output
+            totals["target"] += target
+
+        return {
+            "date": date,
+            "hourly_output": [hourly_output[label] for label in HOUR_LABELS],
+            "hourly_target": [hourly_target[label] for label in HOUR_LABELS],
+            "shifts": shifts,
+            "output": sum(s["output"] for s in shifts.values()),
+            "target": sum(s["target"] for s in shifts.values()),
+        }
+
+    # -- payloads --
+
+    def hourly(self, date: str) -> Dict[str, Any]:
+        """Payload for the hourly output chart (renderTsHourlyChart)."""
+        # figures, version and has_data from one consistent view
+        with self._lock:
+            day = self._day_locked(date)
+            version = self._versions.get(date, 0)
+            has_data = bool(self._counters_by_date.get(date))
+        cumulative, running = [], 0.0
+        for value in day["hourly_output"]:
+            running += value
+            cumulative.append(running)
+        return {
+            "date": date,
+            "version": version,
+            "has_data": has_data,
+            "labels": HOUR_LABELS,
+            "output": day["hourly_output"],
+            "target": day["hourly_target"],
+            "cumulative": cumulative,
+        }
+
+    def daily(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Per-date output and target totals for start <= date <= end (ISO dates)."""
+        dates = [d for d in self.dates() if (start is None or d >= start) and (end is None or d <= end)]
+        days = [self.day(d) for d in dates]
+        return {
+            "dates": dates,
+            "output": [d["output"] for d in days],
+            "target": [d["target"] for d in days],
+        }
+
+    def shifts(self, date: str) -> Dict[str, Any]:
+        with self._lock:
+            day = self._day_locked(date)
+            version = self._versions.get(date, 0)
+        return {"date": date, "version": version, "shifts": day["shifts"]}
+
+# --- HTTP ---
+
+class _AnalyticsHandler(BaseHTTPRequestHandler):
+    analytics: CycleCountAnalytics = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        analytics = self.analytics
+        if parts.path == "/analytics/daily":
+            return self._reply(200, analytics.daily(params.get("start"), params.get("end")))
+        date = params.get("date")
+        if parts.path in ("/analytics/hourly", "/analytics/shifts"):
+            if not date:
+                return self._reply(400, {"error": "date is required"})
+            etag = analytics.etag(date)
+            if self.headers.get("If-None-Match") == etag:
+                return self._reply(304, None, etag)
+            payload = analytics.hourly(date) if parts.path == "/analytics/hourly" else analytics.shifts(date)
+            # tag what is sent, even if the date changed since the check
+            return self._reply(200, payload, analytics.etag(date, payload["version"]))
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        upsert = {"/analytics/counters": self.analytics.upsert_counters,
+                  "/analytics/attendance": self.analytics.upsert_attendance}.get(path)
+        if upsert is None:
+            return self._reply(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) would wait for the client to close the connection
+            return self._reply(400, {"error": "bad Content-Length"})
+        try:
+            records = json.loads(self.rfile.read(length))
+            if isinstance(records, dict):
+                records = [records]
+            upsert(records)
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(200, {"updated": len(records)})
+
+    def _reply(self, status: int, payload: Optional[Dict[str, Any]], etag: Optional[str] = None):
+        body = b"" if payload is None else json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("analytics %s - %s", self.address_string(), format % args)
+
+class AnalyticsServer:
+    """
+    Serves CycleCountAnalytics payloads as JSON:
+
+      GET  /analytics/hourly?date=YYYY-MM-DD     hourly output, target and cumulative
+      GET  /analytics/shifts?date=YYYY-MM-DD     per-shift totals and headcount
+      GET  /analytics/daily?start=...&end=...    per-date totals
+      POST /analytics/counters, /analytics/attendance   upsert changed records
+
+    Per-date payloads carry an ETag, so an unchanged day costs a 304.
+    """
+
+    def __init__(self, analytics: CycleCountAnalytics, host: str = "127.0.0.1", port: int = 9110):
+        self.analytics = analytics
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server is not None else (self.host, self.port)
+
+    def start(self):
+        handler = type("AnalyticsHandler", (_AnalyticsHandler,), {"analytics": self.analytics})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="analytics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve pre-aggregated IMS cycle-count analytics.")
+    parser.add_argument("data", nargs="?", default="db.json", help="exported JSON (localStorage dump or db.json)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9110)
+    args = parser.parse_args(argv)
+
+    analytics = CycleCountAnalytics()
+    analytics.load(args.data)
+    server = AnalyticsServer(analytics, args.host, args.port).start()
+    print(f"Serving analytics for {len(analytics.dates())} dates on http://{server.address[0]}:{server.address[1]}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
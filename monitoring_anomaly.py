@@ -0,0 +1,304 @@
+import json
+import math
+import time
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: only the anomaly detector needs it
+    np = None
+
+from monitoring_system_v3 import IAlertChannel, ICollector, Metric
+
+logger = logging.getLogger(__name__)
+
+# --- Statistical Anomaly Detection ---
+
+def ewma(grid, alpha: float):
+    """
+    Exponentially weighted mean and variance along axis 1 of a
+    (series x steps) array, for all series at once. NaN steps (no sample)
+    carry the previous state forward; a series starts at its first sample.
+    Returns (mean, variance) after the last step.
+    """
+    n = grid.shape[0]
+    mean = np.full(n, np.nan)
+    var = np.full(n, np.nan)
+    for column in grid.T:
+        seen = ~np.isnan(column)
+        first = seen & np.isnan(mean)
+        update = seen & ~first
+        mean[first] = column[first]
+        var[first] = 0.0
+        delta = np.where(update, column - mean, 0.0)
+        mean = mean + alpha * delta
+        var = np.where(update, (1.0 - alpha) * (var + alpha * delta * delta), var)
+    return mean, var
+
+def score_grid(grid, season_mean, season_std, alpha: float = 0.05, z_window: int = 60,
+               min_std: float = 1e-6, rel_min_std: float = 0.01):
+    """
+    Anomaly scores of the latest sample of every series.
+
+    `grid` holds recent samples, one row per series and one column per
+    step (NaN where a series has no sample); `season_mean`/`season_std`
+    describe each series in the same window one season ago (NaN if
+    unknown). For each row the latest sample is compared with:
+
+      zscore    mean/std of the `z_window` steps before it
+      ewma      the EWMA baseline and deviation up to it
+      seasonal  the seasonal mean/std
+
+    Standard deviations are floored at min_std + rel_min_std * |mean| so
+    flat series do not score infinite on the slightest change. Returns
+    (current, zscore, ewma, seasonal); rows without samples are NaN.
+    """
+    grid = np.array(grid, dtype=float)
+    rows, steps = grid.shape
+    seen = ~np.isnan(grid)
+    has_sample = seen.any(axis=1)
+    last = steps - 1 - np.argmax(seen[:, ::-1], axis=1)
+    index = np.arange(rows)
+    current = np.where(has_sample, grid[index, last], np.nan)
+    grid[index[has_sample], last[has_sample]] = np.nan  # baselines exclude the sample being scored
+
+    def z(mean, std):
+        floor = min_std + rel_min_std * np.abs(mean)
+        return (current - mean) / np.maximum(std, floor)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        window = grid[:, -z_window:]
+        counts = (~np.isnan(window)).sum(axis=1)
+        totals = np.nansum(window, axis=1)
+        window_mean = np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+        window_var = np.nansum((window - window_mean[:, None]) ** 2, axis=1) / np.maximum(counts - 1, 1)
+        zscore = np.where(counts >= 2, z(window_mean, np.sqrt(window_var)), np.nan)
+
+        mean, var = ewma(grid, alpha)
+        ewma_score = z(mean, np.sqrt(var))
+
+        seasonal = z(np.asarray(season_mean, dtype=float), np.asarray(season_std, dtype=float))
+    return current, zscore, ewma_score, seasonal
+
+class AnomalyDetector(ICollector):
+    """
+    Batch statistical alerting over the history written by SQLiteStorage.
+
+    The detector keeps the last `lookback` seconds of every selected
+    series on a `step`-second grid (read with one SQL query per `chunk`
+    series, served by the (series_id, timestamp) index) plus SQL sums over
+    the same window one `season` earlier; after the first run only the
+    new steps are read (see refresh). Each run scores the latest sample
+    of all series in one vectorized pass (see score_grid). The score of a series is the
+    largest absolute of its z-score, EWMA and seasonal deviations; it is
+    emitted as anomaly_score{metric=<name>, <tags>}, and crossing
+    `threshold` (or falling below `clear_threshold`) is reported through
+    `channels` once per transition. Register it with the engine like any
+    collector, with an interval of a minute or so.
+
+    Requires numpy.
+    """
+
+    SCORE_METRIC = "anomaly_score"
+
+    def __init__(self, db_path: str = "metrics.db", channels: Optional[List[IAlertChannel]] = None,
+                 names: Optional[List[str]] = None, step: float = 10.0, lookback: float = 3600.0,
+                 season: float = 86400.0, halflife: float = 300.0, z_window: float = 600.0,
+                 threshold: float = 4.0, clear_threshold: Optional[float] = None, min_season_samples: int = 10,
+                 late: float = 60.0, chunk: int = 500, severity: str = "critical"):
+        if np is None:
+            raise ImportError("AnomalyDetector requires numpy")
+        self.db_path = db_path
+        self.channels = channels if channels is not None else []
+        self.names = names
+        self.step = step
+        self.steps = max(1, int(round(lookback / step)))
+        self.season = season
+        self.alpha = 1.0 - 0.5 ** (step / halflife)
+        self.z_steps = max(2, int(z_window / step))
+        self.threshold = threshold
+        self.clear_threshold = threshold * 0.75 if clear_threshold is None else clear_threshold
+        self.min_season_samples = min_season_samples
+        self.late = late
+        self.chunk = chunk
+        self.severity = severity
+        self.firing: Dict[int, float] = {}
+        self.last_duration = 0.0
+        self.last_series = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._grid = None
+        self._season = None
+        self._ids: List[int] = []
+        self._end = 0
+        self._last_now = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({self.db_path})"
+
+    def close(self):
+        self._conn.close()
+
+    def _series(self) -> List[Tuple[int, str, str]]:
+        if self.names:
+            marks = ",".join("?" * len(self.names))
+            return self._conn.execute(
+                f"SELECT id, name, tags FROM series WHERE name IN ({marks}) ORDER BY id", self.names).fetchall()
+        return self._conn.execute("SELECT id, name, tags FROM series WHERE name != ? ORDER BY id",
+                                  (self.SCORE_METRIC,)).fetchall()
+
+    @property
+    def _start(self) -> float:
+        return (self._end - self.steps) * self.step
+
+    def _chunks(self, ids: List[int]):
+        for offset in range(0, len(ids), self.chunk):
+            chunk = ids[offset:offset + self.chunk]
+            yield offset, chunk, ",".join("?" * len(chunk))
+
+    def _fill(self, ids: List[int], first_row: int, since: float, until: float):
+        """Writes the samples of `ids` (grid rows from `first_row` on) in [since, until) onto the grid."""
+        start = self._start
+        for offset, chunk, marks in self._chunks(ids):
+            # IN on the leading index column becomes one index seek per series
+            rows = self._conn.execute(
+                f"SELECT series_id, timestamp, value FROM metrics "
+                f"WHERE series_id IN ({marks}) AND timestamp >= ? AND timestamp < ?",
+                (*chunk, since, until)).fetchall()
+            if rows:
+                data = np.array(rows, dtype=float)
+                row_index = first_row + offset + np.searchsorted(chunk, data[:, 0])
+                columns = np.clip(((data[:, 1] - start) // self.step).astype(np.int64), 0, self.steps - 1)
+                order = np.argsort(data[:, 1], kind="stable")  # later samples win within a step
+                self._grid[row_index[order], columns[order]] = data[order, 2]
+
+    def _aggregate(self, ids: List[int], first_row: int, since: float, until: float, sign: float):
+        """Adds (sign=1) or removes (sign=-1) count/sum/sum of squares over [since, until) to the seasonal sums."""
+        if until <= since:
+            return
+        for offset, chunk, marks in self._chunks(ids):
+            rows = self._conn.execute(
+                f"SELECT series_id, COUNT(*), SUM(value), SUM(value * value) FROM metrics "
+                f"WHERE series_id IN ({marks}) AND timestamp >= ? AND timestamp < ? GROUP BY series_id",
+                (*chunk, since, until)).fetchall()
+            if rows:
+                data = np.array(rows, dtype=float)
+                self._season[first_row + offset + np.searchsorted(chunk, data[:, 0])] += sign * data[:, 1:]
+
+    def refresh(self, series_ids: List[int], now: float):
+        """
+        Brings the grid and seasonal sums up to `now` for `series_ids`
+        (ascending, as returned by _series). After the first run only the
+        steps since the previous run (plus `late` seconds, for samples a
+        buffered storage flushed after that run) are read, and the
+        seasonal window slides by adding and removing its edges; series
+        created since are appended and loaded whole. Going back in time,
+        skipping a whole lookback or a changed series set reloads all.
+        """
+        end = math.ceil(now / self.step)
+        known = len(self._ids)
+        if (self._grid is None or now < self._last_now or end - self._end >= self.steps
+                or series_ids[:known] != self._ids):
+            self._end = end
+            self._ids = []
+            self._grid = np.empty((0, self.steps))
+            self._season = np.empty((0, 3))
+            known = 0
+        else:
+            old_start = self._start
+            shift = end - self._end
+            if shift:
+                self._grid[:, :-shift] = self._grid[:, shift:]
+                self._grid[:, -shift:] = np.nan
+                self._end = end
+            start = self._start
+            since = math.floor(max(self._last_now - self.late, start) / self.step) * self.step
+            self._grid[:, int(round((since - start) / self.step)):] = np.nan
+            self._fill(self._ids, 0, since, now)
+            self._aggregate(self._ids, 0, old_start - self.season, start - self.season, -1.0)
+            self._aggregate(self._ids, 0, self._last_now - self.season, now - self.season, 1.0)
+            self._season[self._season[:, 0] <= 0] = 0.0  # no rounding residue on emptied windows
+
+        if len(series_ids) > known:
+            added = series_ids[known:]
+            self._grid = np.vstack([self._grid, np.full((len(added), self.steps), np.nan)])
+            self._season = np.vstack([self._season, np.zeros((len(added), 3))])
+            self._ids = list(series_ids)
+            self._fill(added, known, self._start, now)
+            self._aggregate(added, known, self._start - self.season, now - self.season, 1.0)
+        self._last_now = now
+
+    def baselines(self):
+        """Returns (grid, season_mean, season_std) as of the last refresh."""
+        count, total, total_sq = self._season.T
+        enough = count >= max(self.min_season_samples, 2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(enough, total / count, np.nan)
+            std = np.sqrt(np.maximum(total_sq - total * mean, 0.0) / (count - 1))
+        return self._grid, mean, np.where(enough, std, np.nan)
+
+    def collect(self) -> List[Metric]:
+        return self.evaluate()
+
+    def evaluate(self, now: Optional[float] = None) -> List[Metric]:
+        """Scores every selected series as of `now`; returns the anomaly_score metrics."""
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        series = self._series()
+        self.last_series = len(series)
+        if not series:
+            return []
+        self.refresh([s[0] for s in series], now)
+        grid, season_mean, season_std = self.baselines()
+        current, zscore, ewma_score, seasonal = score_grid(grid, season_mean, season_std, self.alpha, self.z_steps)
+        with np.errstate(invalid="ignore"):
+            scores = np.fmax(np.fmax(np.abs(zscore), np.abs(ewma_score)), np.abs(seasonal))
+
+        metrics = []
+        for row in np.flatnonzero(~np.isnan(scores)):
+            series_id, name, raw_tags = series[row]
+            score = float(scores[row])
+            tags = dict(json.loads(raw_tags) if raw_tags else {}, metric=name)
+            metrics.append(Metric(name=self.SCORE_METRIC, value=score, timestamp=now, tags=tags))
+            if score >= self.threshold and series_id not in self.firing:
+                self.firing[series_id] = now
+                parts = ", ".join(f"{label} {value:.1f}" for label, value in
+                                  (("z", zscore[row]), ("ewma", ewma_score[row]), ("seasonal", seasonal[row]))
+                                  if not np.isnan(value))
+                self._alert(f"Anomaly: {self._subject(name, tags)} at {current[row]:.2f} scores {score:.1f} "
+                            f"({parts}; threshold {self.threshold})", self.severity)
+            elif score < self.clear_threshold and series_id in self.firing:
+                del self.firing[series_id]
+                self._alert(f"Anomaly resolved: {self._subject(name, tags)} at {current[row]:.2f}", "info")
+        self.last_duration = time.perf_counter() - started
+        return metrics
+
+    @staticmethod
+    def _subject(name: str, tags: Dict[str, str]) -> str:
+        where = ",".join(f"{k}={v}" for k, v in sorted(tags.items()) if k != "metric")
+        return f"{name}{{{where}}}" if where else name
+
+    def _alert(self, message: str, severity: str):
+        for channel in self.channels:
+            try:
+                channel.send_alert(message, severity)
+            except Exception as e:
+                logger.error(f"Failed to send anomaly alert: {e}")
+
+    def metrics(self) -> List[Metric]:
+        now = time.time()
+        tags = {"db": self.db_path}
+        return [
+            Metric(name="anomaly_eval_seconds", value=self.last_duration, timestamp=now, tags=tags),
+            Metric(name="anomaly_series", value=float(self.last_series), timestamp=now, tags=dict(tags)),
+            Metric(name="anomaly_firing", value=float(len(self.firing)), timestamp=now, tags=dict(tags)),
+        ]
+
+    def get_state(self) -> Dict[str, object]:
+        """Series currently firing, so a restart does not alert on them again."""
+        return {"firing": [[series_id, since] for series_id, since in self.firing.items()]}
+
+    def set_state(self, state: Dict[str, object]):
+        self.firing.update({series_id: since for series_id, since in state.get("firing", [])})
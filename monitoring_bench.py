@@ -0,0 +1,295 @@
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from monitoring_system_v3 import (
+    MonitoringEngine, ICollector, IStorage, Metric, SQLiteStorage, BufferedSQLiteStorage,
+)
+from monitoring_ringbuffer import RecentStore
+from monitoring_codec import NDJSONEncoder, decode_batch, decode_ndjson, encode_batch
+from monitoring_segments import SegmentStorage
+from monitoring_query import MetricQuery
+from monitoring_rules import AlertRule, RuleEngine
+
+# --- Synthetic Workload ---
+
+class SyntheticCollector(ICollector):
+    """
+    Emits `metrics` metric names x `series` tag combinations per collect().
+    Tag values cycle through `cardinality` distinct values per tag key, so
+    the number of distinct series is bounded by metrics * cardinality ** len(tag_keys).
+    """
+
+    def __init__(self, index: int = 0, metrics: int = 10, series: int = 10, cardinality: int = 10,
+                 tag_keys: tuple = ("host", "region"), delay: float = 0.0, seed: int = 0):
+        self.index = index
+        self.metric_names = [f"synthetic_{index}_{m}" for m in range(metrics)]
+        self.series = series
+        self.cardinality = cardinality
+        self.tag_keys = tag_keys
+        self.delay = delay
+        self._random = random.Random(seed + index)
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({self.index})"
+
+    def collect(self) -> List[Metric]:
+        if self.delay:
+            time.sleep(self.delay)
+        now = time.time()
+        uniform = self._random.uniform
+        metrics = []
+        for name in self.metric_names:
+            for s in range(self.series):
+                tags = {key: f"{key}-{(s + k) % self.cardinality}" for k, key in enumerate(self.tag_keys)}
+                metrics.append(Metric(name=name, value=uniform(0.0, 100.0), timestamp=now, tags=tags))
+        return metrics
+
+class NullStorage(IStorage):
+    def save(self, metric: Metric):
+        pass
+
+# Storage backends by name; each factory gets a scratch directory.
+BACKENDS: Dict[str, Callable[[str], IStorage]] = {
+    "none": lambda workdir: NullStorage(),
+    "memory": lambda workdir: RecentStore(capacity=360),
+    "sqlite": lambda workdir: SQLiteStorage(os.path.join(workdir, "bench.db")),
+    "buffered": lambda workdir: BufferedSQLiteStorage(os.path.join(workdir, "bench.db")),
+    "segment": lambda workdir: SegmentStorage(os.path.join(workdir, "segments")),
+}
+
+# Engine configuration overrides by mode name
+MODES: Dict[str, Dict[str, Any]] = {
+    "sequential": {"max_workers": 1},
+    "concurrent": {"max_workers": 8},
+}
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def _measure_memory(build: Callable[[], Any]) -> int:
+    """Bytes still allocated by `build()`'s result once it returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+# --- Benchmarks ---
+
+def _run_pipeline(backend: str, mode: str, cycles: int, collectors: int, metrics: int,
+                  series: int, cardinality: int, delay: float, rules: bool, workdir: str) -> Dict[str, Any]:
+    config = {"thresholds": {}, "interval": 0, **MODES[mode]}
+    engine = MonitoringEngine(config)
+    if rules:
+        engine.set_rule_engine(RuleEngine([
+            AlertRule(name=f"rule_{c}_{m}", metric=f"synthetic_{c}_{m}", threshold=99.9)
+            for c in range(collectors) for m in range(metrics)]))
+    for c in range(collectors):
+        engine.register_collector(SyntheticCollector(c, metrics, series, cardinality, delay=delay))
+    engine.register_storage(BACKENDS[backend](workdir))
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(cycles):
+        cycle_start = time.perf_counter()
+        engine.run_once()
+        latencies.append(time.perf_counter() - cycle_start)
+    engine.stop()
+    elapsed = time.perf_counter() - start
+    samples = cycles * collectors * metrics * series
+    return {
+        "samples": samples,
+        "elapsed_s": round(elapsed, 4),
+        "samples_per_sec": round(samples / elapsed, 1) if elapsed else 0.0,
+        "cycle_p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "cycle_p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+def bench_pipeline(backend: str = "buffered", mode: str = "sequential", cycles: int = 20,
+                   collectors: int = 4, metrics: int = 10, series: int = 25, cardinality: int = 25,
+                   delay: float = 0.0, rules: bool = True, trace_memory: bool = True) -> Dict[str, Any]:
+    """
+    End-to-end run_once() benchmark for one backend/mode pair. Timings come
+    from an untraced run; the memory peak from a second run under
+    tracemalloc, since tracing skews throughput.
+    """
+    params = dict(backend=backend, mode=mode, cycles=cycles, collectors=collectors, metrics=metrics,
+                  series=series, cardinality=cardinality, delay=delay, rules=rules)
+    workdir = tempfile.mkdtemp(prefix="ims-bench-")
+    try:
+        result = _run_pipeline(workdir=workdir, **params)
+        result["db_bytes"] = _dir_size(workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if trace_memory:
+        workdir = tempfile.mkdtemp(prefix="ims-bench-")
+        try:
+            gc.collect()
+            tracemalloc.start()
+            _run_pipeline(workdir=workdir, **params)
+            result["memory_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {**params, **result}
+
+def bench_evaluate(samples: int = 100000, rule_count: int = 1000) -> Dict[str, float]:
+    """Per-sample cost of _evaluate with the legacy threshold lookup and with the rule engine."""
+    metrics = [Metric(name=f"m{i % rule_count}", value=float(i % 100), tags={"host": "a"}) for i in range(samples)]
+    legacy = MonitoringEngine({"thresholds": {f"m{i}": 1000.0 for i in range(rule_count)}, "interval": 0})
+    ruled = MonitoringEngine({"thresholds": {}, "interval": 0})
+    ruled.set_rule_engine(RuleEngine([AlertRule(name=f"r{i}", metric=f"m{i}", threshold=1000.0)
+                                      for i in range(rule_count)]))
+    result = {"samples": samples, "rules": rule_count}
+    for label, engine in (("thresholds", legacy), ("rule_engine", ruled)):
+        start = time.perf_counter()
+        for metric in metrics:
+            engine._evaluate(metric)
+        result[f"{label}_us_per_sample"] = round((time.perf_counter() - start) / samples * 1e6, 3)
+    return result
+
+def bench_serialize(samples: int = 100000) -> Dict[str, float]:
+    """Per-sample encode/decode cost of Metric.to_json and the monitoring_codec formats."""
+    metrics = [Metric(name="cpu_usage", value=float(i), tags={"host": f"host-{i % 50}"}) for i in range(samples)]
+    ndjson = NDJSONEncoder()
+    result: Dict[str, float] = {"samples": samples}
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        out = fn()
+        result[f"{label}_us_per_sample"] = round((time.perf_counter() - start) / samples * 1e6, 3)
+        return out
+
+    timed("to_json", lambda: [m.to_json() for m in metrics])
+    text = timed("ndjson_encode", lambda: ndjson.encode_batch(metrics))
+    timed("ndjson_decode", lambda: decode_ndjson(text))
+    data = timed("binary_encode", lambda: encode_batch(metrics))
+    timed("binary_decode", lambda: decode_batch(data))
+    result["binary_bytes_per_sample"] = round(len(data) / samples, 2)
+    result["ndjson_bytes_per_sample"] = round(len(text) / samples, 2)
+    return result
+
+def bench_scan(samples: int = 200000, series: int = 100) -> Dict[str, Any]:
+    """Ingest rate and full-range scan rate of the buffered SQLite and segment backends."""
+    metrics = [Metric(name="cpu_usage", value=float(i), timestamp=1e9 + i // series,
+                      tags={"host": f"host-{i % series}"}) for i in range(samples)]
+    result: Dict[str, Any] = {"samples": samples, "series": series}
+    workdir = tempfile.mkdtemp(prefix="ims-bench-")
+    try:
+        for backend in ("buffered", "segment"):
+            storage = BACKENDS[backend](workdir)
+            start = time.perf_counter()
+            for metric in metrics:
+                storage.save(metric)
+            storage.flush()
+            result[f"{backend}_ingest_per_sec"] = round(samples / (time.perf_counter() - start), 1)
+
+            start = time.perf_counter()
+            if backend == "segment":
+                scanned = sum(1 for _ in storage.scan())
+            else:
+                query = MetricQuery(os.path.join(workdir, "bench.db"))
+                scanned = sum(1 for _ in query.range("cpu_usage", 0.0))
+                query.close()
+            result[f"{backend}_scan_per_sec"] = round(scanned / (time.perf_counter() - start), 1)
+            storage.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def bench_recent_memory(series: int = 100, samples_per_series: int = 360) -> Dict[str, float]:
+    """Memory per retained sample: list of Metric objects vs RecentStore ring buffers."""
+    def as_metrics():
+        return [Metric(name="cpu_usage", value=float(i), timestamp=1e9 + i, tags={"host": f"host-{s}"})
+                for i in range(samples_per_series) for s in range(series)]
+
+    def as_rings():
+        store = RecentStore(capacity=samples_per_series)
+        for i in range(samples_per_series):
+            for s in range(series):
+                store.save(Metric(name="cpu_usage", value=float(i), timestamp=1e9 + i, tags={"host": f"host-{s}"}))
+        return store
+
+    total = series * samples_per_series
+    metric_bytes = _measure_memory(as_metrics) / total
+    ring_bytes = _measure_memory(as_rings) / total
+    return {
+        "samples": total,
+        "metric_list_bytes_per_sample": round(metric_bytes, 2),
+        "ring_buffer_bytes_per_sample": round(ring_bytes, 2),
+        "ratio": round(metric_bytes / ring_bytes, 2),
+    }
+
+def run_suite(backends: List[str], modes: List[str], cycles: int, collectors: int, metrics: int,
+              series: int, cardinality: int, delay: float, trace_memory: bool = True) -> Dict[str, Any]:
+    return {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "pipeline": [
+            bench_pipeline(backend, mode, cycles, collectors, metrics, series, cardinality, delay,
+                           trace_memory=trace_memory)
+            for backend in backends for mode in modes
+        ],
+        "evaluate": bench_evaluate(),
+        "serialize": bench_serialize(),
+        "scan": bench_scan(),
+        "recent_memory": bench_recent_memory(),
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Monitoring pipeline benchmarks")
+    parser.add_argument("--backends", default="sqlite,buffered",
+                        help=f"comma separated, any of: {','.join(BACKENDS)}")
+    parser.add_argument("--modes", default="sequential,concurrent",
+                        help=f"comma separated, any of: {','.join(MODES)}")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--collectors", type=int, default=4)
+    parser.add_argument("--metrics", type=int, default=10, help="metric names per collector")
+    parser.add_argument("--series", type=int, default=25, help="tag sets per metric name")
+    parser.add_argument("--cardinality", type=int, default=25, help="distinct values per tag key")
+    parser.add_argument("--delay", type=float, default=0.0, help="simulated collect() latency in seconds")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    # Per-cycle INFO logging would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = run_suite(args.backends.split(","), args.modes.split(","), args.cycles, args.collectors,
+                        args.metrics, args.series, args.cardinality, args.delay,
+                        trace_memory=not args.no_memory)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
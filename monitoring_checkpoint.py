@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import zlib
+import struct
+import logging
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from monitoring_system_v3 import Metric
+
+logger = logging.getLogger(__name__)
+
+# --- Snapshot File Format ---
+#
+#   header   "IMSC" u8 version u8 reserved u16 reserved f64 written_at u32 index length
+#   index    JSON {section name: [offset, length]}, offsets relative to the end of the index
+#   sections zlib-compressed JSON, one per component
+#
+# Sections are independent, so a reader can decode just the ones it needs.
+
+MAGIC = b"IMSC"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sBBHdI")
+
+class SnapshotError(ValueError):
+    pass
+
+class _LazySection(Mapping):
+    """Read-only mapping over one compressed section, decoded on first access."""
+
+    def __init__(self, blob: bytes):
+        self._blob = blob
+        self._data: Optional[Dict[str, Any]] = None
+
+    def _decoded(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = json.loads(zlib.decompress(self._blob))
+            self._blob = b""
+        return self._data
+
+    def __getitem__(self, key):
+        return self._decoded()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._decoded())
+
+    def __len__(self) -> int:
+        return len(self._decoded())
+
+def write_snapshot(path: str, sections: Dict[str, Any], written_at: Optional[float] = None) -> int:
+    """
+    Writes `sections` atomically: the snapshot goes to a temporary file that
+    is fsynced and renamed over `path`, so readers see the old or the new
+    snapshot, never a torn one. Returns the file size.
+    """
+    index: Dict[str, Tuple[int, int]] = {}
+    blobs = []
+    offset = 0
+    for name, state in sections.items():
+        blob = zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), 1)
+        index[name] = (offset, len(blob))
+        offset += len(blob)
+        blobs.append(blob)
+    index_bytes = json.dumps(index).encode("utf-8")
+    header = _HEADER.pack(MAGIC, VERSION, 0, 0, time.time() if written_at is None else written_at, len(index_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(header) + len(index_bytes) + offset
+
+def read_snapshot(path: str) -> Tuple[float, Dict[str, Mapping]]:
+    """Returns (written_at, sections); each section is decoded when first used."""
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        magic, version, _, _, written_at, index_length = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not an engine snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version}")
+        base = _HEADER.size + index_length
+        index = json.loads(data[_HEADER.size:base])
+    except (struct.error, ValueError) as e:
+        raise SnapshotError(f"corrupt snapshot {path}: {e}") from e
+    if base + sum(length for _, length in index.values()) != len(data):
+        raise SnapshotError(f"snapshot {path} is truncated")
+    return written_at, {name: _LazySection(data[base + offset:base + offset + length])
+                        for name, (offset, length) in index.items()}
+
+# --- Checkpointing ---
+
+class Checkpointer:
+    """
+    Periodically saves engine state so a restart continues where the last
+    run stopped.
+
+    Components take part by implementing get_state() (JSON-compatible data)
+    and set_state(state): the engine's counters, the rule engine (alert and
+    window state) and any collector that has them (e.g. previous counter
+    readings of ProcResourceCollector). Attach with
+    MonitoringEngine.set_checkpointer() after registering components; the
+    latest snapshot is restored then. Only the snapshot's index is read at
+    that point, sections are decompressed when a component first looks at
+    them. State is captured on the engine thread every `interval` seconds
+    and written by a background thread; stop() writes a final snapshot.
+    Snapshots older than `max_age` seconds are ignored. Collectors owned
+    by a ShardPool keep their state in the worker and are not included.
+    """
+
+    def __init__(self, path: str = "engine.state", interval: float = 30.0, max_age: float = 3600.0):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.checkpoints = 0
+        self.failures = 0
+        self.last_bytes = 0
+        self.last_duration = 0.0
+        self.last_written: Optional[float] = None
+        self.restore_seconds = 0.0
+        self._next_due = time.monotonic() + interval
+        self._writer: Optional[threading.Thread] = None
+
+    @staticmethod
+    def components(engine) -> Dict[str, Any]:
+        components = {"engine": engine.instrumentation}
+        if engine.rule_engine is not None:
+            components["rules"] = engine.rule_engine
+        for collector in engine.collectors:
+            if engine.shard_pool is not None and engine.shard_pool.owns(collector):
+                continue
+            if callable(getattr(collector, "get_state", None)):
+                components[f"collector:{collector.name}"] = collector
+        return components
+
+    def restore(self, engine) -> list:
+        """Hands saved sections to matching components. Returns the restored section names."""
+        start = time.perf_counter()
+        try:
+            written_at, sections = read_snapshot(self.path)
+        except FileNotFoundError:
+            return []
+        except (OSError, SnapshotError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return []
+        if time.time() - written_at > self.max_age:
+            logger.info(f"Ignoring checkpoint {self.path} older than {self.max_age}s")
+            return []
+        restored = []
+        for name, component in self.components(engine).items():
+            section = sections.get(name)
+            if section is None:
+                continue
+            try:
+                component.set_state(section)
+                restored.append(name)
+            except Exception as e:
+                logger.error(f"Could not restore {name} from checkpoint: {e}")
+        self.last_written = written_at
+        self.restore_seconds = time.perf_counter() - start
+        logger.info(f"Restored {len(restored)} components from {self.path} in {self.restore_seconds * 1000:.1f} ms")
+        return restored
+
+    def maybe_checkpoint(self, engine):
+        """Called by the engine after each cycle; checkpoints once `interval` has passed."""
+        if time.monotonic() < self._next_due:
+            return
+        if self._writer is not None and self._writer.is_alive():
+            return  # previous snapshot still being written
+        self.checkpoint(engine, wait=False)
+
+    def checkpoint(self, engine, wait: bool = True):
+        """Captures state now; writes it inline, or in the background with wait=False."""
+        self._next_due = time.monotonic() + self.interval
+        start = time.perf_counter()
+        sections = {}
+        for name, component in self.components(engine).items():
+            try:
+                sections[name] = component.get_state()
+            except Exception as e:
+                logger.error(f"Could not capture state of {name}: {e}")
+        if self._writer is not None:
+            self._writer.join()
+        if wait:
+            self._write(sections, start)
+        else:
+            self._writer = threading.Thread(target=self._write, args=(sections, start), name="checkpoint", daemon=True)
+            self._writer.start()
+
+    def _write(self, sections: Dict[str, Any], start: float):
+        try:
+            written_at = time.time()
+            self.last_bytes = write_snapshot(self.path, sections, written_at)
+            self.last_written = written_at
+            self.checkpoints += 1
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to write checkpoint {self.path}: {e}")
+        self.last_duration = time.perf_counter() - start
+
+    def metrics(self) -> list:
+        now = time.time()
+        tags = {"path": self.path}
+        age = now - self.last_written if self.last_written is not None else 0.0
+        return [
+            Metric(name="checkpoint_age_seconds", value=age, timestamp=now, tags=tags),
+            Metric(name="checkpoint_bytes", value=float(self.last_bytes), timestamp=now, tags=dict(tags)),
+            Metric(name="checkpoint_duration_seconds", value=self.last_duration, timestamp=now, tags=dict(tags)),
+        ]
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.join()
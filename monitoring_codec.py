@@ -0,0 +1,231 @@
+import json
+import math
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+from monitoring_system_v3 import Metric, MetricType
+
+# --- Binary Wire Format ---
+#
+# A batch is self-contained:
+#
+#   header   "IMSM" u8 version u8 reserved u16 reserved
+#   strings  u32 count, then per string: u16 length + UTF-8 bytes
+#   tagsets  u32 count, then per tag set: u16 pairs + pairs of (u32 key, u32 value) string ids
+#   records  u32 count, then per metric: u32 name id, u32 tagset id, f64 value, f64 timestamp, u8 type
+#
+# All integers are little endian. Names, tag keys and tag values are stored
+# once per batch in the string table, so a record is a fixed 25 bytes.
+
+MAGIC = b"IMSM"
+VERSION = 1
+CONTENT_TYPE = "application/x-ims-metrics"
+
+_HEADER = struct.Struct("<4sBBH")
+_U32 = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+_RECORD = struct.Struct("<IIddB")
+_FRAME = struct.Struct("<I")
+
+_TYPE_CODES = {MetricType.GAUGE: 0, MetricType.COUNTER: 1}
+_TYPES = {code: metric_type for metric_type, code in _TYPE_CODES.items()}
+
+class CodecError(ValueError):
+    pass
+
+def encode_batch(metrics: List[Metric]) -> bytes:
+    strings: Dict[str, int] = {}
+    tagsets: Dict[Tuple, int] = {}
+    tagset_pairs: List[List[int]] = []
+    records = bytearray(_RECORD.size * len(metrics))
+    pack_into = _RECORD.pack_into
+
+    def intern(s: str) -> int:
+        sid = strings.get(s)
+        if sid is None:
+            sid = strings[s] = len(strings)
+        return sid
+
+    offset = 0
+    for metric in metrics:
+        name_id = strings.get(metric.name)
+        if name_id is None:
+            name_id = intern(metric.name)
+        key = tuple(metric.tags.items())
+        tagset_id = tagsets.get(key)
+        if tagset_id is None:
+            tagset_id = tagsets[key] = len(tagset_pairs)
+            pairs = []
+            for k, v in key:
+                pairs.append(intern(str(k)))
+                pairs.append(intern(str(v)))
+            tagset_pairs.append(pairs)
+        pack_into(records, offset, name_id, tagset_id, metric.value, metric.timestamp,
+                  _TYPE_CODES[metric.metric_type])
+        offset += _RECORD.size
+
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, 0, 0))
+    out += _U32.pack(len(strings))
+    for s in strings:
+        raw = s.encode("utf-8")
+        out += _U16.pack(len(raw))
+        out += raw
+    out += _U32.pack(len(tagset_pairs))
+    for pairs in tagset_pairs:
+        out += _U16.pack(len(pairs) // 2)
+        out += struct.pack(f"<{len(pairs)}I", *pairs)
+    out += _U32.pack(len(metrics))
+    out += records
+    return bytes(out)
+
+def decode_tables(view: memoryview) -> Tuple[List[str], List[Dict[str, str]], int, int]:
+    """
+    Parses a batch up to its records. Returns the string table, the tag
+    sets, the byte offset of the first record and the record count, which
+    lets callers decode just a slice of the records with decode_records().
+    """
+    try:
+        magic, version, _, _ = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise CodecError("not an IMS metrics batch")
+        if version != VERSION:
+            raise CodecError(f"unsupported batch version {version}")
+        offset = _HEADER.size
+
+        (count,) = _U32.unpack_from(view, offset)
+        offset += 4
+        strings = []
+        for _ in range(count):
+            (length,) = _U16.unpack_from(view, offset)
+            offset += 2
+            strings.append(str(view[offset:offset + length], "utf-8"))
+            offset += length
+
+        (count,) = _U32.unpack_from(view, offset)
+        offset += 4
+        tagsets = []
+        for _ in range(count):
+            (pairs,) = _U16.unpack_from(view, offset)
+            offset += 2
+            ids = struct.unpack_from(f"<{pairs * 2}I", view, offset)
+            offset += pairs * 8
+            tagsets.append({strings[ids[i]]: strings[ids[i + 1]] for i in range(0, len(ids), 2)})
+
+        (count,) = _U32.unpack_from(view, offset)
+        offset += 4
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise CodecError(f"corrupt metrics batch: {e}") from e
+    if offset + count * _RECORD.size != len(view):
+        raise CodecError("batch length does not match record count")
+    return strings, tagsets, offset, count
+
+def iter_records(view: memoryview, offset: int, start: int, stop: int) -> Iterator[Tuple[int, int, float, float, int]]:
+    """Raw (name id, tag set id, value, timestamp, type code) tuples for records [start, stop)."""
+    return _RECORD.iter_unpack(view[offset + start * _RECORD.size:offset + stop * _RECORD.size])
+
+def decode_records(view: memoryview, strings: List[str], tagsets: List[Dict[str, str]],
+                   offset: int, start: int, stop: int) -> List[Metric]:
+    try:
+        return [
+            Metric(name=strings[name_id], value=value, timestamp=ts, tags=dict(tagsets[tagset_id]),
+                   metric_type=_TYPES[type_code])
+            for name_id, tagset_id, value, ts, type_code in iter_records(view, offset, start, stop)
+        ]
+    except (struct.error, IndexError, KeyError) as e:
+        raise CodecError(f"corrupt metrics batch: {e}") from e
+
+def decode_batch(data: bytes) -> List[Metric]:
+    view = memoryview(data)
+    strings, tagsets, offset, count = decode_tables(view)
+    return decode_records(view, strings, tagsets, offset, 0, count)
+
+def write_frame(stream: BinaryIO, metrics: List[Metric]):
+    """Writes one length-prefixed batch to a file or pipe."""
+    payload = encode_batch(metrics)
+    stream.write(_FRAME.pack(len(payload)))
+    stream.write(payload)
+
+def read_frames(stream: BinaryIO) -> Iterator[List[Metric]]:
+    """Yields batches written by write_frame() until EOF; a torn final frame is ignored."""
+    while True:
+        prefix = stream.read(_FRAME.size)
+        if len(prefix) < _FRAME.size:
+            return
+        (length,) = _FRAME.unpack(prefix)
+        payload = stream.read(length)
+        if len(payload) < length:
+            return
+        yield decode_batch(payload)
+
+# --- Newline-Delimited JSON ---
+
+class NDJSONEncoder:
+    """
+    Writes metrics as one JSON object per line, field-compatible with
+    Metric.to_json(). The JSON fragments for names and tag sets are built
+    once and reused, so encoding a sample is a single string format.
+    """
+
+    def __init__(self, max_cache: int = 100000):
+        self.max_cache = max_cache
+        self._names: Dict[str, str] = {}
+        self._tags: Dict[Tuple, str] = {}
+
+    def encode(self, metric: Metric) -> str:
+        name = self._names.get(metric.name)
+        if name is None:
+            if len(self._names) >= self.max_cache:
+                self._names.clear()
+            name = self._names[metric.name] = json.dumps(metric.name)
+        key = tuple(metric.tags.items())
+        tags = self._tags.get(key)
+        if tags is None:
+            if len(self._tags) >= self.max_cache:
+                self._tags.clear()
+            tags = self._tags[key] = json.dumps(metric.tags)
+        value = float(metric.value)
+        value = repr(value) if math.isfinite(value) else json.dumps(value)
+        return (f'{{"name": {name}, "value": {value}, "timestamp": {float(metric.timestamp)!r}, '
+                f'"tags": {tags}, "metric_type": "{metric.metric_type.value}"}}')
+
+    def encode_batch(self, metrics: List[Metric]) -> str:
+        return "".join([self.encode(m) + "\n" for m in metrics])
+
+def decode_ndjson(text: str) -> List[Metric]:
+    """
+    Parses one metric per line. The lines are handed to the JSON parser as
+    a single array so the whole batch is parsed in one call; a line-by-line
+    pass only runs to report which line is invalid.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+    try:
+        objects = json.loads("[" + ",".join(lines) + "]")
+        if len(objects) != len(lines):
+            raise ValueError("line holds more than one value")
+        return [_ndjson_metric(obj) for obj in objects]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    metrics = []
+    for line in lines:
+        try:
+            metrics.append(_ndjson_metric(json.loads(line)))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise CodecError(f"invalid metric line {line[:80]!r}: {e}") from e
+    return metrics
+
+def _ndjson_metric(obj: dict) -> Metric:
+    tags = obj.get("tags") or {}
+    if not isinstance(tags, dict):
+        raise TypeError("tags must be an object")
+    for key, value in tags.items():
+        if not isinstance(key, str) or not isinstance(value, str):
+            raise ValueError(f"tag {key!r} must map a string to a string")
+    return Metric(
+        name=str(obj["name"]),
+        value=float(obj["value"]),
+        timestamp=float(obj["timestamp"]),
+        tags=tags,
+        metric_type=MetricType(obj.get("metric_type", "gauge")),
+    )
@@ -0,0 +1,289 @@
+import json
+import time
+import socket
+import logging
+import selectors
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Deque, Dict, List, Optional
+
+from monitoring_system_v3 import ICollector, Metric
+from monitoring_codec import CONTENT_TYPE, CodecError, decode_batch, decode_ndjson
+
+logger = logging.getLogger(__name__)
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json")
+
+# --- Push Ingest ---
+
+_BUSY_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                  b"Content-Length: 29\r\nRetry-After: 1\r\nConnection: close\r\n\r\n"
+                  b'{"error": "too many clients"}')
+
+class _PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that serves connections on a bounded thread pool instead of
+    a thread each. At most `max_waiting` accepted connections queue for a
+    worker; beyond that new ones get 503 right away. While connections
+    are queued, workers idling on a keep-alive connection close it and
+    take the next one (see release_idle).
+    """
+
+    def __init__(self, address, handler, workers: int, max_waiting: int):
+        super().__init__(address, handler)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.max_waiting = max_waiting
+        self._lock = threading.Lock()
+        self._waiting = 0    # accepted, not picked up by a worker yet
+        self._releasing = 0  # idle keep-alive connections closing to make room for them
+        self._closed = False
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            refuse = self._waiting >= self.max_waiting
+            if not refuse:
+                self._waiting += 1
+        if refuse:
+            self.RequestHandlerClass.ingest._count("rejected_requests")
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._pool.submit(self._serve, request, client_address)
+
+    def release_idle(self) -> bool:
+        """True if an idle keep-alive handler should close: a queued connection needs its worker, or shutdown."""
+        with self._lock:
+            if self._closed:
+                return True
+            if self._waiting > self._releasing:
+                self._releasing += 1
+                return True
+            return False
+
+    def _serve(self, request, client_address):
+        with self._lock:
+            self._waiting -= 1
+            if self._releasing:
+                self._releasing -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        with self._lock:
+            self._closed = True
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class _IngestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid the delayed-ACK stall
+    server_version = "ims-ingest"
+    ingest: "IngestServer" = None
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._wait_for_request():
+            self.handle_one_request()
+
+    def _wait_for_request(self) -> bool:
+        """
+        Waits for the next request on a keep-alive connection. False (close
+        it) on EOF, after `timeout` idle seconds, or as soon as another
+        connection is queued for a worker.
+        """
+        sock = self.connection
+        deadline = time.monotonic() + self.timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_READ)
+            while True:
+                sock.settimeout(0)
+                try:
+                    if self.rfile.peek(1):
+                        return True  # already buffered or just arrived
+                    if not sock.recv(1, socket.MSG_PEEK):
+                        return False  # client closed
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    return False
+                finally:
+                    sock.settimeout(self.timeout)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.server.release_idle():
+                    return False
+                selector.select(min(remaining, 0.05))
+
+    def do_POST(self):
+        ingest = self.ingest
+        if self.path.split("?", 1)[0] != "/ingest":
+            return self._reply(404, {"error": "not found"})
+        length = self.headers.get("Content-Length")
+        if length is None:
+            return self._reply(411, {"error": "Content-Length required"}, close=True)
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            ingest._count("bad_requests")
+            return self._reply(400, {"error": "bad Content-Length"}, close=True)
+        if length > ingest.max_body:
+            ingest._count("rejected_requests")
+            return self._reply(413, {"error": f"body exceeds {ingest.max_body} bytes"}, close=True)
+        body = self.rfile.read(length)
+
+        content_type = self.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        try:
+            if content_type == CONTENT_TYPE:
+                metrics = decode_batch(body)
+            elif content_type in NDJSON_TYPES:
+                metrics = decode_ndjson(body.decode("utf-8"))
+            else:
+                ingest._count("rejected_requests")
+                return self._reply(415, {"error": f"unsupported Content-Type {content_type!r}"})
+        except (CodecError, UnicodeDecodeError) as e:
+            ingest._count("bad_requests")
+            return self._reply(400, {"error": str(e)})
+
+        if not ingest.offer(metrics):
+            return self._reply(429, {"error": "ingest queue full"}, headers={"Retry-After": "1"})
+        self._reply(202, {"accepted": len(metrics)})
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/health":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, self.ingest.stats())
+
+    def _reply(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None, close: bool = False):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("ingest %s - %s", self.address_string(), format % args)
+
+class IngestServer(ICollector):
+    """
+    Embedded HTTP endpoint that lets other services push metrics.
+
+    POST /ingest takes a batch either as NDJSON (Content-Type
+    application/x-ndjson, one Metric.to_json() object per line) or in the
+    binary batch format (application/x-ims-metrics). Accepted batches are
+    queued and handed to the engine by collect(), so they go through the
+    same evaluation and storage as pulled metrics; register the server
+    with MonitoringEngine.register_collector() and a short interval. Once
+    `max_pending` samples are waiting, requests get 429 with Retry-After
+    instead of growing the queue. Connections are kept alive and served
+    by a pool of `workers` threads; idle connections are closed after
+    `idle_timeout` seconds, or as soon as another client is waiting for a
+    worker. At most `max_waiting` connections queue for a worker; further
+    ones get 503 with Retry-After. GET /health returns the counters as
+    JSON.
+
+    The listener lives in this process, so do not hand this collector to
+    a ShardPool.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9109, max_pending: int = 100000,
+                 max_body: int = 8 * 1024 * 1024, workers: int = 16, idle_timeout: float = 15.0,
+                 max_waiting: int = 64):
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.max_waiting = max_waiting
+        self._batches: Deque[List[Metric]] = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "accepted": 0, "rejected_requests": 0, "bad_requests": 0}
+        self._server: Optional[_PooledHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({self.host}:{self.port})"
+
+    @property
+    def address(self):
+        """(host, port) actually bound; useful with port=0."""
+        return self._server.server_address if self._server is not None else (self.host, self.port)
+
+    def start(self):
+        handler = type("IngestHandler", (_IngestHandler,), {"ingest": self, "timeout": self.idle_timeout})
+        self._server = _PooledHTTPServer((self.host, self.port), handler, self.workers, self.max_waiting)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ingest-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Ingest server listening on {self.address[0]}:{self.address[1]}")
+        return self
+
+    def offer(self, metrics: List[Metric]) -> bool:
+        """Queues a pushed batch. Returns False (and drops it) when the queue is full."""
+        with self._lock:
+            self._counters["requests"] += 1
+            if metrics and self._pending + len(metrics) > self.max_pending:
+                self._counters["rejected_requests"] += 1
+                return False
+            if metrics:
+                self._batches.append(metrics)
+                self._pending += len(metrics)
+                self._counters["accepted"] += len(metrics)
+            return True
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters[key] += 1
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def collect(self) -> List[Metric]:
+        with self._lock:
+            batches, self._batches = self._batches, deque()
+            self._pending = 0
+        metrics = []
+        for batch in batches:
+            metrics.extend(batch)
+        return metrics
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, pending=self._pending)
+
+    def metrics(self) -> List[Metric]:
+        now = time.time()
+        tags = {"listener": f"{self.address[0]}:{self.address[1]}"}
+        stats = self.stats()
+        metrics = [Metric(name="ingest_queue_depth", value=float(stats["pending"]), timestamp=now, tags=tags)]
+        for key in ("requests", "accepted", "rejected_requests", "bad_requests"):
+            metrics.append(Metric(name=f"ingest_{key}_total", value=float(stats[key]), timestamp=now, tags=dict(tags)))
+        return metrics
+
+    def close(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
@@ -0,0 +1,266 @@
+import os
+import ssl
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from monitoring_system_v3 import ICollector, Metric
+
+logger = logging.getLogger(__name__)
+
+# --- HTTP Probing ---
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+class ProbeError(Exception):
+    pass
+
+class _ProbeResult:
+    __slots__ = ("url", "status", "connect", "ttfb", "total", "location")
+
+    def __init__(self, url: str, status: float, connect: float = 0.0, ttfb: float = 0.0, total: float = 0.0,
+                 location: Optional[str] = None):
+        self.url = url
+        self.status = status
+        self.connect = connect
+        self.ttfb = ttfb
+        self.total = total
+        self.location = location
+
+class _ConnectionPool:
+    """
+    Idle keep-alive connections per (scheme, host, port). Connections are
+    only handed back after a response has been fully read, so anything in
+    the pool is ready for the next request.
+    """
+
+    def __init__(self, max_idle_per_host: int):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[Tuple[str, str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+
+    def acquire(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return None
+
+    def release(self, key, conn):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle_per_host:
+            idle.append(conn)
+        else:
+            conn[1].close()
+
+    def close(self):
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle.clear()
+
+class HttpProbeCollector(ICollector):
+    """
+    Checks many HTTP(S) endpoints per cycle from a single collector.
+
+    Probes run on a private asyncio loop so keep-alive connections survive
+    between cycles. `concurrency` bounds the number of requests in flight
+    overall and `per_host` bounds them per host. Redirects are followed
+    (up to `max_redirects`, as urlopen() does), so `website_status` is the
+    status of the final response. Besides the status every probe emits
+    connect, time-to-first-byte and total latency in seconds over the
+    whole redirect chain; connect time is 0 when pooled connections were
+    reused.
+    """
+
+    def __init__(self, urls: List[str], concurrency: int = 100, per_host: int = 6,
+                 timeout: float = 5.0, method: str = "GET", max_redirects: int = 10):
+        self.urls = list(urls)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.method = method
+        self.max_redirects = max_redirects
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid = None
+
+    def _ensure_loop(self):
+        """
+        Starts the probe loop on first use, and again in a forked child
+        (threads and sockets do not survive fork, e.g. in a shard worker).
+        """
+        if self._loop is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pool = _ConnectionPool(self.per_host)
+        self._host_limits: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-probe", daemon=True)
+        self._thread.start()
+
+    def __getstate__(self):
+        # pickled into a ShardPool worker, which starts its own loop
+        state = self.__dict__.copy()
+        for key in ("_pool", "_host_limits", "_thread"):
+            state.pop(key, None)
+        state["_loop"] = state["_pid"] = state["_ssl_context"] = None
+        return state
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({len(self.urls)} urls)"
+
+    def collect(self) -> List[Metric]:
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._probe_all(), self._loop)
+        results = future.result()
+        metrics = []
+        for result in results:
+            tags = {"url": result.url}
+            metrics.append(Metric(name="website_status", value=result.status, tags=tags))
+            if result.status:
+                metrics.append(Metric(name="website_connect_seconds", value=result.connect, tags=tags))
+                metrics.append(Metric(name="website_ttfb_seconds", value=result.ttfb, tags=tags))
+                metrics.append(Metric(name="website_total_seconds", value=result.total, tags=tags))
+        return metrics
+
+    def close(self):
+        if self._loop is None or self._pid != os.getpid() or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._close_pool(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _close_pool(self):
+        self._pool.close()
+
+    async def _probe_all(self) -> List[_ProbeResult]:
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(url):
+            async with limit:
+                return await self._probe(url)
+
+        return await asyncio.gather(*(bounded(url) for url in self.urls))
+
+    async def _probe(self, url: str) -> _ProbeResult:
+        try:
+            target = url
+            connect = elapsed = 0.0
+            for _ in range(self.max_redirects + 1):
+                hop = await self._fetch(target)
+                if hop.status not in REDIRECT_CODES or hop.location is None:
+                    return _ProbeResult(url, hop.status, connect + hop.connect, elapsed + hop.ttfb, elapsed + hop.total)
+                connect += hop.connect
+                elapsed += hop.total
+                target = urljoin(target, hop.location)
+            raise ProbeError(f"more than {self.max_redirects} redirects")
+        except Exception as e:
+            logger.error(f"Website check failed for {url}: {e!r}")
+            return _ProbeResult(url, 0.0)  # 0 indicates connection failure
+
+    async def _fetch(self, url: str) -> _ProbeResult:
+        """One request to `url`, within `timeout` once a per-host slot is free."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ProbeError(f"unsupported scheme in {url!r}")
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        host_header = parts.netloc.rsplit("@", 1)[-1]
+        request = (f"{self.method} {path} HTTP/1.1\r\nHost: {host_header}\r\n"
+                   f"User-Agent: ims-monitor\r\nAccept: */*\r\nConnection: keep-alive\r\n\r\n").encode("latin-1")
+        host_limit = self._host_limits.get(key)
+        if host_limit is None:
+            host_limit = self._host_limits[key] = asyncio.Semaphore(self.per_host)
+        async with host_limit:
+            return await asyncio.wait_for(self._exchange(url, key, secure, request), self.timeout)
+
+    async def _exchange(self, url, key, secure, request) -> _ProbeResult:
+        start = time.perf_counter()
+        conn = self._pool.acquire(key)
+        if conn is not None:
+            try:
+                return await self._request(url, key, conn, request, start, 0.0)
+            except (ProbeError, ConnectionError, asyncio.IncompleteReadError):
+                # The server dropped an idle connection; retry on a fresh one.
+                conn[1].close()
+                start = time.perf_counter()
+            except BaseException:
+                # cancelled by the timeout, or a malformed response
+                conn[1].close()
+                raise
+        if secure and self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        conn = await asyncio.open_connection(
+            key[1], key[2], ssl=self._ssl_context if secure else None,
+            server_hostname=key[1] if secure else None)
+        connect = time.perf_counter() - start
+        try:
+            return await self._request(url, key, conn, request, start, connect)
+        except BaseException:
+            conn[1].close()
+            raise
+
+    async def _request(self, url, key, conn, request, start, connect) -> _ProbeResult:
+        reader, writer = conn
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        ttfb = time.perf_counter() - start
+        if not status_line:
+            raise ProbeError("connection closed before response")
+        try:
+            version, code = status_line.split(None, 2)[:2]
+            status = int(code)
+        except ValueError:
+            raise ProbeError(f"malformed status line {status_line!r}")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            field, _, value = line.partition(b":")
+            headers[field.strip().lower()] = value.strip()
+
+        reusable = await self._drain_body(reader, headers, status)
+        connection = headers.get(b"connection", b"").lower()
+        if connection == b"close" or (version == b"HTTP/1.0" and connection != b"keep-alive"):
+            reusable = False
+        total = time.perf_counter() - start
+        if reusable:
+            self._pool.release(key, conn)
+        else:
+            writer.close()
+        location = headers.get(b"location")
+        return _ProbeResult(url, float(status), connect, ttfb, total,
+                            location.decode("latin-1") if location is not None else None)
+
+    async def _drain_body(self, reader, headers, status) -> bool:
+        """Reads and discards the body. Returns False if the connection can't be reused."""
+        if self.method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return True
+        if headers.get(b"transfer-encoding", b"").lower() == b"chunked":
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return True
+                await reader.readexactly(size + 2)
+        length = headers.get(b"content-length")
+        if length is not None:
+            await reader.readexactly(int(length))
+            return True
+        await reader.read()
+        return False
@@ -0,0 +1,283 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from monitoring_system_v3 import ICollector, Metric, MetricType
+
+logger = logging.getLogger(__name__)
+
+# --- Linux /proc Collector ---
+
+_CHUNK = 65536
+
+def _read_fd(fd: int) -> bytes:
+    """Reads a whole /proc file from offset 0 through an already open descriptor."""
+    data = os.pread(fd, _CHUNK, 0)
+    if len(data) < _CHUNK:
+        return data
+    parts = [data]
+    offset = len(data)
+    while True:
+        chunk = os.pread(fd, _CHUNK, offset)
+        if not chunk:
+            return b"".join(parts)
+        parts.append(chunk)
+        offset += len(chunk)
+
+class ProcResourceCollector(ICollector):
+    """
+    Host metrics read straight from Linux /proc.
+
+    Every file is opened once and re-read with pread() each cycle, so a
+    cycle costs one syscall per file. Cumulative kernel counters are
+    emitted as MetricType.COUNTER; rates and percentages derived from the
+    delta to the previous cycle are emitted as GAUGE (and are absent on
+    the first cycle). With `processes=True` every /proc/<pid>/stat is
+    scanned, but only the `top_processes` busiest processes are emitted
+    per cycle to keep series cardinality bounded. At most `max_pid_fds`
+    of the per-process files are kept open (well below the default
+    RLIMIT_NOFILE of 1024); the rest are opened and closed each cycle.
+    """
+
+    SKIP_DISKS = (b"loop", b"ram", b"zram")
+
+    def __init__(self, proc_root: str = "/proc", host: str = "localhost", per_core: bool = True,
+                 processes: bool = False, top_processes: int = 10, max_pid_fds: int = 256):
+        self.proc_root = proc_root
+        self.host = host
+        self.per_core = per_core
+        self.processes = processes
+        self.top_processes = top_processes
+        self.max_pid_fds = max_pid_fds
+        self._clk_tck = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+        self._fds: Dict[str, int] = {}
+        self._pid_fds: Dict[bytes, int] = {}
+        self._prev: Dict[object, Tuple[float, ...]] = {}
+        self._prev_time: Optional[float] = None
+        # wall-clock time of the readings in _prev, for checkpoints
+        self._prev_wall: Optional[float] = None
+        # get_state may run while a concurrent-mode cycle is updating _prev
+        self._lock = threading.Lock()
+
+    def _fd(self, name: str) -> int:
+        fd = self._fds.get(name)
+        if fd is None:
+            fd = self._fds[name] = os.open(os.path.join(self.proc_root, name), os.O_RDONLY)
+        return fd
+
+    def __getstate__(self):
+        # pickled into a ShardPool worker: descriptors and the lock stay here
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_fds"], state["_pid_fds"] = {}, {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def close(self):
+        for fd in list(self._fds.values()) + list(self._pid_fds.values()):
+            os.close(fd)
+        self._fds.clear()
+        self._pid_fds.clear()
+
+    def collect(self) -> List[Metric]:
+        with self._lock:
+            return self._collect_locked()
+
+    def _collect_locked(self) -> List[Metric]:
+        now = time.time()
+        mono = time.monotonic()
+        elapsed = None if self._prev_time is None else mono - self._prev_time
+        self._prev_time = mono
+        self._prev_wall = now
+        metrics: List[Metric] = []
+        parts = [self._collect_stat, self._collect_meminfo, self._collect_diskstats, self._collect_netdev]
+        if self.processes:
+            parts.append(self._collect_processes)
+        for part in parts:
+            try:
+                part(metrics, now, elapsed)
+            except OSError as e:
+                logger.error(f"Failed to read /proc data in {part.__name__}: {e}")
+        return metrics
+
+    def _gauge(self, metrics, name, value, now, **tags):
+        tags["host"] = self.host
+        metrics.append(Metric(name=name, value=value, timestamp=now, tags=tags))
+
+    def _counter(self, metrics, name, value, now, **tags):
+        tags["host"] = self.host
+        metrics.append(Metric(name=name, value=value, timestamp=now, tags=tags, metric_type=MetricType.COUNTER))
+
+    def _delta(self, key, values: Tuple[float, ...]) -> Optional[Tuple[float, ...]]:
+        """Difference to the previous sample stored under `key`, or None on first sight."""
+        prev = self._prev.get(key)
+        self._prev[key] = values
+        if prev is None:
+            return None
+        delta = tuple(a - b for a, b in zip(values, prev))
+        if any(d < 0 for d in delta):
+            return None  # counter reset (reboot, device re-added)
+        return delta
+
+    def _boot_id(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.proc_root, "sys/kernel/random/boot_id")) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def get_state(self) -> Dict[str, object]:
+        """Previous counter readings, so rates resume right after a restart."""
+        with self._lock:
+            readings = list(self._prev.items())
+            taken = self._prev_wall
+        if taken is None:
+            return {}
+        entries = []
+        for key, values in readings:
+            if isinstance(key, bytes):
+                entries.append(["stat", key.decode(), list(values)])
+            elif key[0] in ("disk", "net"):
+                entries.append([key[0], key[1], list(values)])
+            # per-pid readings are skipped: pids are reused across restarts
+        # the time of the readings, not of the checkpoint: rates after a
+        # restart divide by the time since these values were read
+        return {"time": taken, "boot_id": self._boot_id(), "prev": entries}
+
+    def set_state(self, state: Dict[str, object]):
+        if "time" not in state or state.get("boot_id") != self._boot_id():
+            return  # nothing collected yet, or counters restarted with the host
+        age = time.time() - state["time"]
+        if age < 0:
+            return
+        for kind, name, values in state["prev"]:
+            key = name.encode() if kind == "stat" else (kind, name)
+            self._prev[key] = tuple(values)
+        self._prev_time = time.monotonic() - age
+        self._prev_wall = state["time"]
+
+    def _collect_stat(self, metrics, now, elapsed):
+        for line in _read_fd(self._fd("stat")).splitlines():
+            if line.startswith(b"cpu"):
+                fields = line.split()
+                label = fields[0]
+                if label != b"cpu" and not self.per_core:
+                    continue
+                ticks = tuple(map(int, fields[1:9]))
+                idle = ticks[3] + ticks[4]
+                total = sum(ticks)
+                delta = self._delta(label, (idle, total))
+                if delta is None or delta[1] <= 0:
+                    continue
+                usage = 100.0 * (1.0 - delta[0] / delta[1])
+                if label == b"cpu":
+                    self._gauge(metrics, "cpu_usage", usage, now)
+                else:
+                    self._gauge(metrics, "cpu_core_usage", usage, now, cpu=label.decode())
+            elif line.startswith(b"ctxt "):
+                self._counter(metrics, "context_switches_total", float(line[5:]), now)
+            elif line.startswith(b"processes "):
+                self._counter(metrics, "processes_forked_total", float(line[10:]), now)
+            elif line.startswith(b"procs_running "):
+                self._gauge(metrics, "procs_running", float(line[14:]), now)
+
+    def _collect_meminfo(self, metrics, now, elapsed):
+        values = {}
+        for line in _read_fd(self._fd("meminfo")).splitlines():
+            key, _, rest = line.partition(b":")
+            if key in (b"MemTotal", b"MemAvailable", b"SwapTotal", b"SwapFree"):
+                values[key] = int(rest.split()[0]) * 1024
+        total = values.get(b"MemTotal")
+        available = values.get(b"MemAvailable")
+        if total and available is not None:
+            self._gauge(metrics, "memory_usage", 100.0 * (total - available) / total, now)
+            self._gauge(metrics, "memory_available_bytes", float(available), now)
+        swap_total = values.get(b"SwapTotal")
+        if swap_total:
+            self._gauge(metrics, "swap_usage", 100.0 * (swap_total - values.get(b"SwapFree", 0)) / swap_total, now)
+
+    def _collect_diskstats(self, metrics, now, elapsed):
+        for line in _read_fd(self._fd("diskstats")).splitlines():
+            fields = line.split()
+            if len(fields) < 10 or fields[2].startswith(self.SKIP_DISKS):
+                continue
+            device = fields[2].decode()
+            read_bytes = int(fields[5]) * 512.0
+            written_bytes = int(fields[9]) * 512.0
+            self._counter(metrics, "disk_read_bytes_total", read_bytes, now, device=device)
+            self._counter(metrics, "disk_written_bytes_total", written_bytes, now, device=device)
+            delta = self._delta(("disk", device), (read_bytes, written_bytes))
+            if delta is not None and elapsed:
+                self._gauge(metrics, "disk_read_bytes_per_sec", delta[0] / elapsed, now, device=device)
+                self._gauge(metrics, "disk_written_bytes_per_sec", delta[1] / elapsed, now, device=device)
+
+    def _collect_netdev(self, metrics, now, elapsed):
+        for line in _read_fd(self._fd("net/dev")).splitlines()[2:]:
+            iface, _, rest = line.partition(b":")
+            fields = rest.split()
+            if len(fields) < 16:
+                continue
+            iface = iface.strip().decode()
+            rx, tx = float(fields[0]), float(fields[8])
+            self._counter(metrics, "net_rx_bytes_total", rx, now, interface=iface)
+            self._counter(metrics, "net_tx_bytes_total", tx, now, interface=iface)
+            delta = self._delta(("net", iface), (rx, tx))
+            if delta is not None and elapsed:
+                self._gauge(metrics, "net_rx_bytes_per_sec", delta[0] / elapsed, now, interface=iface)
+                self._gauge(metrics, "net_tx_bytes_per_sec", delta[1] / elapsed, now, interface=iface)
+
+    def _collect_processes(self, metrics, now, elapsed):
+        seen = {}
+        busiest = []
+        pid_fds = self._pid_fds
+        for entry in os.scandir(os.fsencode(self.proc_root)):
+            pid = entry.name
+            if not pid.isdigit():
+                continue
+            try:
+                fd = pid_fds.get(pid)
+                if fd is None:
+                    fd = os.open(entry.path + b"/stat", os.O_RDONLY)
+                    if len(pid_fds) < self.max_pid_fds:
+                        pid_fds[pid] = fd
+                        data = os.pread(fd, 1024, 0)
+                    else:
+                        try:
+                            data = os.pread(fd, 1024, 0)
+                        finally:
+                            os.close(fd)
+                else:
+                    data = os.pread(fd, 1024, 0)
+            except (FileNotFoundError, ProcessLookupError):
+                data = b""  # exited since the directory scan; EMFILE and the like propagate
+            if not data:
+                continue
+            # comm may itself contain spaces or parentheses
+            head, _, tail = data.rpartition(b")")
+            fields = tail.split(None, 22)
+            cpu_ticks = int(fields[11]) + int(fields[12])
+            seen[pid] = cpu_ticks
+            prev = self._prev.get(("pid", pid))
+            if prev is not None and elapsed:
+                usage = 100.0 * (cpu_ticks - prev[0]) / self._clk_tck / elapsed
+                busiest.append((usage, pid, head.partition(b"(")[2], int(fields[21])))
+        for pid, ticks in seen.items():
+            self._prev[("pid", pid)] = (ticks,)
+        for pid in [p for p in pid_fds if p not in seen]:
+            os.close(pid_fds.pop(pid))
+        # pids read past max_pid_fds have a reading but no handle to close
+        for key in [k for k in self._prev if k[0] == "pid" and k[1] not in seen]:
+            del self._prev[key]
+
+        self._gauge(metrics, "process_count", float(len(seen)), now)
+        busiest.sort(reverse=True)
+        for usage, pid, comm, rss_pages in busiest[:self.top_processes]:
+            tags = {"pid": pid.decode(), "comm": comm.decode(errors="replace")}
+            self._gauge(metrics, "process_cpu_usage", usage, now, **tags)
+            self._gauge(metrics, "process_rss_bytes", float(rss_pages * self._page_size), now, **tags)
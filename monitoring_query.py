@@ -0,0 +1,111 @@
+import json
+import time
+import heapq
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from monitoring_system_v3 import Metric
+from monitoring_rollup import DEFAULT_RETENTION, ROLLUP_TIERS, RollupPoint, tier_table
+
+# --- Query Layer ---
+
+class MetricQuery:
+    """
+    Read API over the database written by SQLiteStorage.
+
+    Tag filters are resolved against the small `series` table first, then
+    each matching series is read through the (series_id, timestamp) index
+    and the per-series streams are merged by timestamp. Results are
+    generators backed by live cursors, so large ranges are never
+    materialized in memory.
+    """
+
+    def __init__(self, db_path: str = "metrics.db", retention: Optional[Dict[str, float]] = None):
+        self.db_path = db_path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+
+    def close(self):
+        self._conn.close()
+
+    def series(self, name: str, tags: Optional[Dict[str, str]] = None) -> List[Tuple[str, Dict[str, str]]]:
+        """Returns the stored tag sets for `name` that contain every pair in `tags`."""
+        return [(raw, parsed) for _, raw, parsed in self._series(name, tags)]
+
+    def _series(self, name: str, tags: Optional[Dict[str, str]]) -> List[Tuple[int, str, Dict[str, str]]]:
+        matches = []
+        for series_id, raw in self._conn.execute("SELECT id, tags FROM series WHERE name = ? ORDER BY id", (name,)):
+            parsed = json.loads(raw) if raw else {}
+            if not tags or all(parsed.get(k) == v for k, v in tags.items()):
+                matches.append((series_id, raw, parsed))
+        return matches
+
+    def range(self, name: str, start: float, end: Optional[float] = None,
+              tags: Optional[Dict[str, str]] = None) -> Iterator[Metric]:
+        """Yields samples of `name` with start <= timestamp < end, oldest first."""
+        end = float("inf") if end is None else end
+        streams = [self._series_range(name, series_id, parsed, start, end)
+                   for series_id, _, parsed in self._series(name, tags)]
+        yield from heapq.merge(*streams, key=lambda m: m.timestamp)
+
+    def _series_range(self, name, series_id, parsed, start, end) -> Iterator[Metric]:
+        cursor = self._conn.execute(
+            "SELECT timestamp, value FROM metrics "
+            "WHERE series_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (series_id, start, end))
+        for ts, value in cursor:
+            yield Metric(name=name, value=value, timestamp=ts, tags=dict(parsed))
+
+    def latest(self, name: str, tags: Optional[Dict[str, str]] = None) -> Optional[Metric]:
+        """Returns the most recent sample of `name` across the matching series."""
+        best = None
+        for series_id, _, parsed in self._series(name, tags):
+            row = self._conn.execute(
+                "SELECT timestamp, value FROM metrics WHERE series_id = ? ORDER BY timestamp DESC LIMIT 1",
+                (series_id,)).fetchone()
+            if row is not None and (best is None or row[0] > best.timestamp):
+                best = Metric(name=name, value=row[1], timestamp=row[0], tags=dict(parsed))
+        return best
+
+    def select_tier(self, start: float, end: float, max_points: int, now: Optional[float] = None) -> str:
+        """
+        Picks the finest tier that answers [start, end) in at most
+        `max_points` points per series and still holds data back to
+        `start`; falls back to the coarsest tier. Raw data is assumed to
+        be sampled no faster than once per second.
+        """
+        now = time.time() if now is None else now
+        span = max(end - start, 0.0)
+        for tier, width in (("raw", 1),) + ROLLUP_TIERS:
+            if span / width <= max_points and start >= now - self.retention[tier]:
+                return tier
+        return ROLLUP_TIERS[-1][0]
+
+    def rollup(self, name: str, start: float, end: Optional[float] = None,
+               tags: Optional[Dict[str, str]] = None, max_points: int = 1000,
+               tier: Optional[str] = None) -> Iterator[RollupPoint]:
+        """
+        Yields aggregated points for `name`, served from the tier chosen by
+        select_tier() unless `tier` is given. Points of different series are
+        merged in timestamp order; raw samples come back as count=1 points.
+        """
+        now = time.time()
+        end = now if end is None else end
+        tier = tier or self.select_tier(start, end, max_points, now)
+        if tier == "raw":
+            for m in self.range(name, start, end, tags):
+                yield RollupPoint(m.timestamp, m.value, m.value, m.value, 1, m.value, m.tags)
+            return
+
+        width = dict(ROLLUP_TIERS)[tier]
+        streams = [self._tier_range(tier_table(tier), name, raw, parsed, start - start % width, end)
+                   for raw, parsed in self.series(name, tags)]
+        yield from heapq.merge(*streams, key=lambda p: p.timestamp)
+
+    def _tier_range(self, table, name, raw, parsed, start, end) -> Iterator[RollupPoint]:
+        cursor = self._conn.execute(
+            f"SELECT bucket, min, max, sum, count, last FROM {table} "
+            "WHERE name = ? AND tags = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+            (name, raw, start, end))
+        for bucket, lo, hi, total, count, last in cursor:
+            yield RollupPoint(bucket, lo, hi, total / count, count, last, dict(parsed))
@@ -0,0 +1,485 @@
+import os
+import ssl
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import logging
+import threading
+import http.client
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from monitoring_system_v3 import ICollector, Metric, MetricType
+
+logger = logging.getLogger(__name__)
+
+# --- WebSocket Event Collector ---
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+class WebSocketError(Exception):
+    """Failed handshake, malformed frame or lost connection."""
+
+def _mask(payload: bytes, key: bytes) -> bytes:
+    # XOR against the repeated key as one big integer instead of byte by byte
+    if not payload:
+        return b""
+    n = len(payload)
+    repeated = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(n, "big")
+
+def encode_frame(opcode: int, payload: bytes = b"", mask: bool = True) -> bytes:
+    """One final frame; clients must mask, servers must not (RFC 6455 5.1)."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    return bytes(header) + key + _mask(payload, key)
+
+def decode_frames(buffer: bytearray, max_size: int = 16 * 1024 * 1024) -> List[Tuple[bool, int, bytes]]:
+    """
+    Removes every complete frame from the front of `buffer` and returns
+    them as (fin, opcode, payload), unmasked. A partial frame stays in the
+    buffer until more bytes arrive.
+    """
+    frames = []
+    pos = 0
+    size = len(buffer)
+    while size - pos >= 2:
+        first, second = buffer[pos], buffer[pos + 1]
+        length = second & 0x7F
+        offset = pos + 2
+        if length == 126:
+            if size - offset < 2:
+                break
+            length = struct.unpack_from("!H", buffer, offset)[0]
+            offset += 2
+        elif length == 127:
+            if size - offset < 8:
+                break
+            length = struct.unpack_from("!Q", buffer, offset)[0]
+            offset += 8
+        if length > max_size:
+            raise WebSocketError(f"frame of {length} bytes exceeds {max_size}")
+        key = None
+        if second & 0x80:
+            if size - offset < 4:
+                break
+            key = bytes(buffer[offset:offset + 4])
+            offset += 4
+        if size - offset < length:
+            break
+        payload = bytes(buffer[offset:offset + length])
+        frames.append((bool(first & 0x80), first & 0x0F, _mask(payload, key) if key else payload))
+        pos = offset + length
+    del buffer[:pos]
+    return frames
+
+class WebSocketConnection:
+    """
+    Minimal RFC 6455 client over a plain or TLS socket: handshake, masked
+    sends, reassembly of fragmented messages and automatic pong replies.
+    Enough for subscribing to a JSON event feed; no extensions.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0, ssl_context: Optional[ssl.SSLContext] = None,
+                 max_message: int = 16 * 1024 * 1024):
+        parts = urlsplit(url)
+        if parts.scheme not in ("ws", "wss"):
+            raise ValueError(f"not a WebSocket URL: {url}")
+        self.url = url
+        self.secure = parts.scheme == "wss"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.secure else 80)
+        self.resource = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.max_message = max_message
+        self.sock: Optional[socket.socket] = None
+        self._buffer = bytearray()
+        self._fragments: List[bytes] = []
+        self._fragment_opcode = OP_TEXT
+        self._send_lock = threading.Lock()
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            if self.secure:
+                context = self.ssl_context or ssl.create_default_context()
+                sock = context.wrap_socket(sock, server_hostname=self.host)
+            self.sock = sock
+            self._handshake()
+        except BaseException:
+            sock.close()
+            self.sock = None
+            raise
+        return self
+
+    def _handshake(self):
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        host = self.host if self.port in (80, 443) else f"{self.host}:{self.port}"
+        request = (f"GET {self.resource} HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\n"
+                   f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n")
+        self.sock.sendall(request.encode("ascii"))
+        while b"\r\n\r\n" not in self._buffer:
+            if len(self._buffer) > 65536:
+                raise WebSocketError("handshake response too large")
+            data = self.sock.recv(4096)
+            if not data:
+                raise WebSocketError("connection closed during handshake")
+            self._buffer += data
+        head, _, rest = bytes(self._buffer).partition(b"\r\n\r\n")
+        self._buffer = bytearray(rest)  # the server may send frames right after the 101
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = status_line.split(" ", 2)
+        if len(status) < 2 or status[1] != "101":
+            raise WebSocketError(f"handshake refused: {status_line}")
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        if headers.get("sec-websocket-accept") != expected:
+            raise WebSocketError("bad Sec-WebSocket-Accept")
+
+    def send(self, opcode: int, payload: bytes = b""):
+        with self._send_lock:
+            self.sock.sendall(encode_frame(opcode, payload))
+
+    def recv(self, timeout: float) -> List[Tuple[int, bytes]]:
+        """
+        Waits up to `timeout` seconds for data and returns the complete
+        messages as (opcode, payload): TEXT/BINARY messages, PONG and
+        CLOSE. PINGs are answered here. Raises WebSocketError once the
+        peer has gone away.
+        """
+        messages = self._drain()
+        if messages:
+            return messages
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(65536)
+        except socket.timeout:
+            return []
+        if not data:
+            raise WebSocketError("connection closed by peer")
+        self._buffer += data
+        return self._drain()
+
+    def _drain(self) -> List[Tuple[int, bytes]]:
+        messages = []
+        for fin, opcode, payload in decode_frames(self._buffer, self.max_message):
+            if opcode == OP_PING:
+                self.send(OP_PONG, payload)
+            elif opcode in (OP_PONG, OP_CLOSE):
+                messages.append((opcode, payload))
+            else:
+                if opcode != OP_CONTINUATION:
+                    self._fragment_opcode = opcode
+                self._fragments.append(payload)
+                if sum(map(len, self._fragments)) > self.max_message:
+                    raise WebSocketError(f"message exceeds {self.max_message} bytes")
+                if fin:
+                    messages.append((self._fragment_opcode, b"".join(self._fragments)))
+                    self._fragments = []
+        return messages
+
+    def abort(self):
+        """Shuts the socket down from another thread, waking a blocked recv()."""
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self, code: int = 1000):
+        if self.sock is None:
+            return
+        try:
+            self.send(OP_CLOSE, struct.pack("!H", code))
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.sock = None
+
+class RealtimeCollector(ICollector):
+    """
+    Event-driven collector for the IMS server's WebSocket feed.
+
+    A background thread keeps one subscription to `url` (server.js serves
+    it at /ws) and turns each event into metrics the moment it arrives,
+    timestamped with its arrival time:
+
+      ims_ws_events_total{endpoint, type}          COUNTER
+      ims_docs_total{endpoint}                     docsCount of docs_updated
+      ims_docs_admin{endpoint, status}             its computeAdminCounts
+      ims_ws_broadcast_lag_seconds{endpoint}       arrival - event "ts" (ms)
+
+    The lag compares two clocks, so it is only meaningful when the server
+    is local or NTP-synced. A second thread times GET `ping_path` every
+    `ping_interval` seconds over one keep-alive HTTP connection to the
+    same host (ims_ping_seconds, ims_ping_status; status 0 when
+    unreachable), whether or not the WebSocket is connected, so the
+    collector never holds more than two sockets and a slow ping never
+    delays reading events. A WebSocket ping every `keepalive` seconds
+    detects silent connection loss. Lost connections are retried with exponential backoff between
+    `backoff_min` and `backoff_max` seconds (with jitter).
+
+    Like IngestServer, metrics are queued and handed to the engine by
+    collect() along with ims_ws_events_per_sec; register it with a short
+    interval. At most `max_pending` samples are held; the oldest are
+    dropped beyond that. Do not hand it to a ShardPool.
+    """
+
+    def __init__(self, url: str = "ws://localhost:3000/ws", ping_path: Optional[str] = "/api/ping",
+                 ping_interval: float = 10.0, keepalive: float = 30.0, timeout: float = 5.0,
+                 backoff_min: float = 1.0, backoff_max: float = 60.0, max_pending: int = 100000,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("ws", "wss"):
+            raise ValueError(f"not a WebSocket URL: {url}")
+        self.url = url
+        self.ping_path = ping_path
+        self.ping_interval = ping_interval
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.max_pending = max_pending
+        self.ssl_context = ssl_context
+        self._tags = {"endpoint": url}
+        # the ping goes to the WebSocket's host over plain HTTP(S)
+        self._http_secure = parts.scheme == "wss"
+        self._http_host = parts.hostname
+        self._http_port = parts.port or (443 if self._http_secure else 80)
+        self._pending: Deque[Metric] = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ping_thread: Optional[threading.Thread] = None
+        self._ws: Optional[WebSocketConnection] = None
+        self._http: Optional[http.client.HTTPConnection] = None
+        self._event_totals: Dict[str, int] = {}
+        self._events_seen = 0
+        self._rate_mark: Tuple[float, int] = (time.monotonic(), 0)
+        self.connected = False
+        self.connects = 0
+        self.failures = 0
+        self.dropped = 0
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({self.url})"
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="realtime-ws", daemon=True)
+        self._thread.start()
+        if self.ping_path:
+            self._ping_thread = threading.Thread(target=self._ping_loop, name="realtime-ping", daemon=True)
+            self._ping_thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.abort()
+        for thread in (self._thread, self._ping_thread):
+            if thread is not None:
+                thread.join(timeout=self.timeout + 1)
+        self._thread = self._ping_thread = None
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    # -- connection loop (background thread) --
+
+    def _run(self):
+        delay = self.backoff_min
+        while not self._stop.is_set():
+            ws = WebSocketConnection(self.url, timeout=self.timeout, ssl_context=self.ssl_context)
+            opened = False
+            try:
+                ws.connect()
+                opened = True
+                self._ws = ws
+                self.connected = True
+                self.connects += 1
+                logger.info(f"Subscribed to {self.url}")
+                self._serve(ws)
+            except (OSError, WebSocketError) as e:
+                if not self._stop.is_set():
+                    self.failures += 1
+                    # an unreachable server would otherwise log on every retry
+                    log = logger.warning if opened or self.failures == 1 else logger.debug
+                    log(f"WebSocket {self.url} failed: {e}")
+            finally:
+                self.connected = False
+                self._ws = None
+                ws.close()
+            delay = self.backoff_min if opened else min(delay * 2, self.backoff_max)
+            self._stop.wait(random.uniform(0.5, 1.0) * delay)
+
+    def _serve(self, ws: WebSocketConnection):
+        next_keepalive = time.monotonic() + self.keepalive
+        awaiting_pong = False
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_keepalive:
+                if awaiting_pong:
+                    raise WebSocketError(f"no pong within {self.keepalive}s")
+                ws.send(OP_PING)
+                awaiting_pong = True
+                next_keepalive = now + self.keepalive
+            frames = ws.recv(max(0.01, min(next_keepalive - time.monotonic(), 1.0)))
+            arrived = time.time()
+            for opcode, payload in frames:
+                if opcode == OP_TEXT:
+                    self._on_event(payload, arrived)
+                elif opcode == OP_PONG:
+                    awaiting_pong = False
+                elif opcode == OP_CLOSE:
+                    code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else 1005
+                    raise WebSocketError(f"closed by server ({code})")
+
+    def _ping_loop(self):
+        while not self._stop.is_set():
+            self._ping_api()
+            self._stop.wait(self.ping_interval)
+
+    def _ping_api(self):
+        started = time.perf_counter()
+        try:
+            if self._http is None:
+                if self._http_secure:
+                    self._http = http.client.HTTPSConnection(self._http_host, self._http_port, timeout=self.timeout,
+                                                             context=self.ssl_context)
+                else:
+                    self._http = http.client.HTTPConnection(self._http_host, self._http_port, timeout=self.timeout)
+            self._http.request("GET", self.ping_path)
+            response = self._http.getresponse()
+            response.read()
+            status = float(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            logger.debug(f"Ping {self.ping_path} on {self.url} failed: {e}")
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+            status = 0.0
+        elapsed = time.perf_counter() - started
+        now = time.time()
+        tags = dict(self._tags, path=self.ping_path)
+        self._push([Metric(name="ims_ping_seconds", value=elapsed, timestamp=now, tags=tags),
+                    Metric(name="ims_ping_status", value=status, timestamp=now, tags=dict(tags))])
+
+    def _on_event(self, payload: bytes, received: float):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            logger.debug(f"Ignoring non-JSON-object message from {self.url}")
+            return
+        kind = str(event.get("type") or "unknown")
+        with self._lock:
+            total = self._event_totals[kind] = self._event_totals.get(kind, 0) + 1
+            self._events_seen += 1
+        tags = self._tags
+        metrics = [Metric(name="ims_ws_events_total", value=float(total), timestamp=received,
+                          tags=dict(tags, type=kind), metric_type=MetricType.COUNTER)]
+        sent = event.get("ts")
+        if isinstance(sent, (int, float)) and not isinstance(sent, bool):
+            metrics.append(Metric(name="ims_ws_broadcast_lag_seconds", value=received - sent / 1000.0,
+                                  timestamp=received, tags=dict(tags)))
+        if kind == "docs_updated":
+            if isinstance(event.get("docsCount"), (int, float)):
+                metrics.append(Metric(name="ims_docs_total", value=float(event["docsCount"]),
+                                      timestamp=received, tags=dict(tags)))
+            counts = event.get("counts")
+            if isinstance(counts, dict):
+                for status, count in counts.items():
+                    if isinstance(count, (int, float)):
+                        metrics.append(Metric(name="ims_docs_admin", value=float(count), timestamp=received,
+                                              tags=dict(tags, status=str(status))))
+        self._push(metrics)
+
+    def _push(self, metrics: List[Metric]):
+        with self._lock:
+            self._pending.extend(metrics)
+            overflow = len(self._pending) - self.max_pending
+            for _ in range(max(overflow, 0)):
+                self._pending.popleft()
+            self.dropped += max(overflow, 0)
+
+    # -- engine side --
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def collect(self) -> List[Metric]:
+        now = time.monotonic()
+        with self._lock:
+            metrics, self._pending = list(self._pending), deque()
+            seen = self._events_seen
+        since, seen_before = self._rate_mark
+        self._rate_mark = (now, seen)
+        if now > since:
+            metrics.append(Metric(name="ims_ws_events_per_sec", value=(seen - seen_before) / (now - since),
+                                  tags=dict(self._tags)))
+        return metrics
+
+    def metrics(self) -> List[Metric]:
+        """Subscription health, for engine instrumentation."""
+        now = time.time()
+        tags = self._tags
+        return [
+            Metric(name="ims_ws_connected", value=1.0 if self.connected else 0.0, timestamp=now, tags=dict(tags)),
+            Metric(name="ims_ws_connects_total", value=float(self.connects), timestamp=now, tags=dict(tags),
+                   metric_type=MetricType.COUNTER),
+            Metric(name="ims_ws_failures_total", value=float(self.failures), timestamp=now, tags=dict(tags),
+                   metric_type=MetricType.COUNTER),
+            Metric(name="ims_ws_pending", value=float(self.pending), timestamp=now, tags=dict(tags)),
+            Metric(name="ims_ws_dropped_total", value=float(self.dropped), timestamp=now, tags=dict(tags),
+                   metric_type=MetricType.COUNTER),
+        ]
+
+    # -- checkpoint state --
+
+    def get_state(self) -> Dict[str, object]:
+        """Event totals per type, so the counters survive a restart."""
+        with self._lock:
+            return {"events": dict(self._event_totals)}
+
+    def set_state(self, state: Dict[str, object]):
+        with self._lock:
+            for kind, total in state.get("events", {}).items():
+                self._event_totals[kind] = self._event_totals.get(kind, 0) + int(total)
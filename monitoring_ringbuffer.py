@@ -0,0 +1,155 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from monitoring_system_v3 import IStorage, Metric, MetricType
+
+# --- Recent Data Store ---
+
+class CompactMetric:
+    """Slot-based sample referencing an interned series instead of carrying its own tags dict."""
+    __slots__ = ("series_id", "value", "timestamp")
+
+    def __init__(self, series_id: int, value: float, timestamp: float):
+        self.series_id = series_id
+        self.value = value
+        self.timestamp = timestamp
+
+class SeriesRing:
+    """
+    Fixed-capacity ring of (timestamp, value) pairs stored in two
+    array('d') columns. Appends are O(1) and overwrite the oldest sample
+    once full. Samples are expected in timestamp order.
+    """
+    __slots__ = ("capacity", "timestamps", "values", "_start", "_count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, value: float):
+        if self._count < self.capacity:
+            pos = self._start + self._count
+            if pos >= self.capacity:
+                pos -= self.capacity
+            self._count += 1
+        else:
+            pos = self._start
+            self._start = pos + 1 if pos + 1 < self.capacity else 0
+        self.timestamps[pos] = timestamp
+        self.values[pos] = value
+
+    def _physical(self, i: int) -> int:
+        pos = self._start + i
+        return pos - self.capacity if pos >= self.capacity else pos
+
+    def _bisect(self, timestamp: float) -> int:
+        """Logical index of the first sample with timestamp >= `timestamp`."""
+        lo, hi = 0, self._count
+        ts = self.timestamps
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[self._physical(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, since: float = float("-inf"), until: float = float("inf")) -> List[Tuple[memoryview, memoryview]]:
+        """
+        Samples with since <= timestamp < until as at most two
+        (timestamps, values) memoryview pairs over the underlying arrays;
+        two pairs are returned when the window wraps around the ring. The
+        views are not copies, so they change as new samples overwrite old ones.
+        """
+        first = self._bisect(since)
+        last = self._bisect(until)
+        if first >= last:
+            return []
+        a, b = self._physical(first), self._physical(last - 1) + 1
+        ts, vals = memoryview(self.timestamps), memoryview(self.values)
+        if a < b:
+            return [(ts[a:b], vals[a:b])]
+        return [(ts[a:], vals[a:]), (ts[:b], vals[:b])]
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        if not self._count:
+            return None
+        pos = self._physical(self._count - 1)
+        return self.timestamps[pos], self.values[pos]
+
+    def nbytes(self) -> int:
+        return (self.timestamps.itemsize * len(self.timestamps)
+                + self.values.itemsize * len(self.values))
+
+class RecentStore(IStorage):
+    """
+    In-memory store for the most recent `capacity` samples of every series.
+
+    Each distinct (name, tag set) is interned once to an integer series id
+    that owns a SeriesRing, so a retained sample costs 16 bytes instead of
+    a full Metric object with its own tags dict. Can be registered as a
+    storage backend to keep a live window for evaluation and dashboards.
+    """
+
+    def __init__(self, capacity: int = 3600):
+        self.capacity = capacity
+        self._ids: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self._series: List[Tuple[str, Dict[str, str], MetricType]] = []
+        self._rings: List[SeriesRing] = []
+
+    def series_id(self, name: str, tags: Dict[str, str], metric_type: MetricType = MetricType.GAUGE) -> int:
+        key = (name, tuple(sorted(tags.items())))
+        sid = self._ids.get(key)
+        if sid is None:
+            sid = self._ids[key] = len(self._series)
+            self._series.append((name, dict(tags), metric_type))
+            self._rings.append(SeriesRing(self.capacity))
+        return sid
+
+    def lookup(self, name: str, tags: Dict[str, str]) -> Optional[int]:
+        return self._ids.get((name, tuple(sorted(tags.items()))))
+
+    def describe(self, series_id: int) -> Tuple[str, Dict[str, str], MetricType]:
+        return self._series[series_id]
+
+    def save(self, metric: Metric):
+        self._rings[self.series_id(metric.name, metric.tags, metric.metric_type)].append(
+            metric.timestamp, metric.value)
+
+    def append(self, sample: CompactMetric):
+        self._rings[sample.series_id].append(sample.timestamp, sample.value)
+
+    def ring(self, series_id: int) -> SeriesRing:
+        return self._rings[series_id]
+
+    def window(self, name: str, tags: Dict[str, str], since: float = float("-inf"),
+               until: float = float("inf")) -> List[Tuple[memoryview, memoryview]]:
+        sid = self.lookup(name, tags)
+        return [] if sid is None else self._rings[sid].window(since, until)
+
+    def iter_window(self, name: str, tags: Dict[str, str], since: float = float("-inf"),
+                    until: float = float("inf")) -> Iterator[Tuple[float, float]]:
+        for timestamps, values in self.window(name, tags, since, until):
+            yield from zip(timestamps, values)
+
+    def latest(self, name: str, tags: Dict[str, str]) -> Optional[Metric]:
+        sid = self.lookup(name, tags)
+        point = None if sid is None else self._rings[sid].latest()
+        if point is None:
+            return None
+        _, series_tags, metric_type = self._series[sid]
+        return Metric(name=name, value=point[1], timestamp=point[0], tags=dict(series_tags),
+                      metric_type=metric_type)
+
+    def __len__(self) -> int:
+        return sum(len(ring) for ring in self._rings)
+
+    def nbytes(self) -> int:
+        """Bytes held by the sample columns (excluding the per-series registry)."""
+        return sum(ring.nbytes() for ring in self._rings)
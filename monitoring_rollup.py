@@ -0,0 +1,216 @@
+import time
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Rollup Tiers ---
+
+# (tier name, bucket width in seconds), finest first
+ROLLUP_TIERS: Tuple[Tuple[str, int], ...] = (("1m", 60), ("1h", 3600))
+
+# Seconds of data kept per tier; "raw" is the metrics table itself.
+DEFAULT_RETENTION: Dict[str, float] = {
+    "raw": 7 * 86400,
+    "1m": 30 * 86400,
+    "1h": 400 * 86400,
+}
+
+@dataclass
+class RollupPoint:
+    timestamp: float
+    min: float
+    max: float
+    avg: float
+    count: int
+    last: float
+    tags: Dict[str, str] = field(default_factory=dict)
+
+def tier_table(tier: str) -> str:
+    return f"metrics_{tier}"
+
+UPSERT_SQL = """
+    INSERT INTO {table} (name, tags, bucket, min, max, sum, count, last, last_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (name, tags, bucket) DO UPDATE SET
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max),
+        sum = sum + excluded.sum,
+        count = count + excluded.count,
+        last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,
+        last_ts = MAX(last_ts, excluded.last_ts)
+"""
+
+class RollupManager:
+    """
+    Incrementally aggregates raw rows of the metrics table into the
+    ROLLUP_TIERS tables and prunes every tier to its retention.
+
+    Progress is tracked by the highest raw row id already aggregated, so
+    each run only reads rows inserted since the previous one (including
+    late samples with old timestamps). Raw rows are only pruned once they
+    have been rolled up, in id order from the last id pruned, so no run
+    scans the rows it keeps. All work happens in small transactions so
+    concurrent writers are never blocked for long.
+    """
+
+    def __init__(self, db_path: str = "metrics.db", retention: Optional[Dict[str, float]] = None,
+                 batch_size: int = 50000, prune_batch_size: int = 5000):
+        self.db_path = db_path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.batch_size = batch_size
+        self.prune_batch_size = prune_batch_size
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._init_db()
+
+    def _init_db(self):
+        with self._conn:
+            for tier, _ in ROLLUP_TIERS:
+                table = tier_table(tier)
+                self._conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        name TEXT NOT NULL,
+                        tags TEXT NOT NULL,
+                        bucket REAL NOT NULL,
+                        min REAL,
+                        max REAL,
+                        sum REAL,
+                        count INTEGER,
+                        last REAL,
+                        last_ts REAL,
+                        PRIMARY KEY (name, tags, bucket)
+                    )
+                """)
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER
+                )
+            """)
+
+    def _state(self, key: str) -> int:
+        row = self._conn.execute("SELECT value FROM rollup_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    @property
+    def watermark(self) -> int:
+        return self._state("raw_id")
+
+    def rollup(self) -> int:
+        """Aggregates all raw rows added since the last call. Returns the number of rows consumed."""
+        consumed = 0
+        while True:
+            last_id = self.watermark
+            rows = self._conn.execute(
+                "SELECT m.id, m.timestamp, s.name, m.value, s.tags FROM metrics m "
+                "JOIN series s ON s.id = m.series_id WHERE m.id > ? ORDER BY m.id LIMIT ?",
+                (last_id, self.batch_size)).fetchall()
+            if not rows:
+                return consumed
+            buckets = {tier: {} for tier, _ in ROLLUP_TIERS}
+            for _, ts, name, value, tags in rows:
+                if value is None:
+                    continue
+                for tier, width in ROLLUP_TIERS:
+                    key = (name, tags or "{}", ts - ts % width)
+                    agg = buckets[tier].get(key)
+                    if agg is None:
+                        buckets[tier][key] = [value, value, value, 1, value, ts]
+                    else:
+                        if value < agg[0]:
+                            agg[0] = value
+                        if value > agg[1]:
+                            agg[1] = value
+                        agg[2] += value
+                        agg[3] += 1
+                        if ts >= agg[5]:
+                            agg[4] = value
+                            agg[5] = ts
+            with self._conn:
+                for tier, _ in ROLLUP_TIERS:
+                    self._conn.executemany(
+                        UPSERT_SQL.format(table=tier_table(tier)),
+                        [key + tuple(agg) for key, agg in buckets[tier].items()])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rollup_state (key, value) VALUES ('raw_id', ?)", (rows[-1][0],))
+            consumed += len(rows)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Deletes rows older than each tier's retention, a small batch per transaction."""
+        now = time.time() if now is None else now
+        deleted = self._prune_raw(now - self.retention["raw"])
+        for tier, _ in ROLLUP_TIERS:
+            table = tier_table(tier)
+            deleted += self._delete_in_batches(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE bucket < ? LIMIT ?)",
+                (now - self.retention[tier],))
+        return deleted
+
+    def _prune_raw(self, cutoff: float) -> int:
+        """
+        Deletes rolled-up raw rows older than `cutoff` one id range at a
+        time, starting after the last id pruned. Stops at the first range
+        that keeps a row and resumes from that row next time.
+        """
+        deleted = 0
+        last_id = self._state("prune_id")
+        watermark = self.watermark
+        while not self._stop.is_set():
+            first = self._conn.execute("SELECT MIN(id) FROM metrics WHERE id > ?", (last_id,)).fetchone()[0]
+            if first is None or first > watermark:
+                break
+            end = min(first + self.prune_batch_size - 1, watermark)
+            with self._conn:
+                count = self._conn.execute("DELETE FROM metrics WHERE id >= ? AND id <= ? AND timestamp < ?",
+                                           (first, end, cutoff)).rowcount
+                kept = self._conn.execute("SELECT MIN(id) FROM metrics WHERE id >= ? AND id <= ?",
+                                          (first, end)).fetchone()[0]
+                last_id = end if kept is None else kept - 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rollup_state (key, value) VALUES ('prune_id', ?)", (last_id,))
+            deleted += count
+            if kept is not None:
+                break
+            time.sleep(0)  # let writers in between batches
+        return deleted
+
+    def _delete_in_batches(self, sql: str, params: tuple) -> int:
+        deleted = 0
+        while not self._stop.is_set():
+            with self._conn:
+                count = self._conn.execute(sql, params + (self.prune_batch_size,)).rowcount
+            deleted += count
+            if count < self.prune_batch_size:
+                break
+            time.sleep(0)  # let writers in between batches
+        return deleted
+
+    def run_once(self):
+        try:
+            self.rollup()
+            self.prune()
+        except Exception as e:
+            logger.error(f"Rollup failed: {e}")
+
+    def start(self, interval: float = 30.0):
+        """Runs rollup and pruning every `interval` seconds on a background thread."""
+        def loop():
+            while not self._stop.wait(interval):
+                self.run_once()
+
+        self._thread = threading.Thread(target=loop, name="rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._conn.close()
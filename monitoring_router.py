@@ -0,0 +1,374 @@
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from monitoring_system_v3 import IStorage, Metric
+from monitoring_codec import encode_batch, read_frames, write_frame
+
+logger = logging.getLogger(__name__)
+
+# --- Storage Routing ---
+
+class _SpillFile:
+    """
+    Append-only overflow file of codec frames for one backend. Frames are
+    replayed oldest first; once everything was replayed the file is
+    truncated. A torn frame left by a crash is cut off when the file is
+    opened.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._read_offset = 0
+        self._size = self._recover()
+        self._file = open(path, "ab")
+
+    def _recover(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "r+b") as f:
+            end = 0
+            for _ in read_frames(f):
+                end = f.tell()
+            f.truncate(end)
+        return end
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._size - self._read_offset
+
+    def append(self, metrics: List[Metric]):
+        with self._lock:
+            write_frame(self._file, metrics)
+            self._file.flush()
+            self._size = self._file.tell()
+
+    def peek(self):
+        """Returns (metrics, next_offset) for the oldest unreplayed frame, or None."""
+        with self._lock:
+            if self._size <= self._read_offset:
+                return None
+            with open(self.path, "rb") as f:
+                f.seek(self._read_offset)
+                for metrics in read_frames(f):
+                    return metrics, f.tell()
+            return None
+
+    def advance(self, offset: int):
+        """Marks everything before `offset` as replayed."""
+        with self._lock:
+            self._read_offset = offset
+            if offset >= self._size:
+                self._file.truncate(0)
+                self._read_offset = self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class _BackendWriter:
+    """Queue, writer thread, spill file and counters for one wrapped backend."""
+
+    def __init__(self, backend: IStorage, router: "StorageRouter", index: int, name: str):
+        self.backend = backend
+        self.name = name
+        self.router = router
+        self.queue: queue.Queue = queue.Queue(maxsize=router.max_queue)
+        self.spill: Optional[_SpillFile] = None
+        if router.spill_dir is not None:
+            safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.name)
+            self.spill = _SpillFile(os.path.join(router.spill_dir, f"{index:02d}-{safe}.spill"))
+        self.delivered = 0
+        self.batches = 0
+        self.failed = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.lag = 0.0
+        self._overflow: List[Metric] = []
+        self._overflow_lock = threading.Lock()
+        self._retry_at = 0.0
+        self._backoff = router.retry_backoff
+        self.thread = threading.Thread(target=self._run, name=f"storage-{self.name}", daemon=True)
+        self.thread.start()
+
+    def overflow(self, metric: Metric):
+        """Called from the collection path when the queue is full."""
+        if self.spill is None:
+            self.dropped += 1
+            return
+        with self._overflow_lock:
+            self._overflow.append(metric)
+            if len(self._overflow) < self.router.batch_size:
+                return
+            batch, self._overflow = self._overflow, []
+        self._to_spill(batch)
+
+    def _run(self):
+        r = self.router
+        while True:
+            batch = self._take_batch()
+            try:
+                if batch:
+                    if time.monotonic() < self._retry_at or (self.spill is not None and self.spill.pending_bytes):
+                        # Backend is down or still catching up; keep the order by
+                        # queueing behind what was already spilled.
+                        self._to_spill(batch)
+                    else:
+                        rest = self._deliver(batch)
+                        if rest:
+                            self._to_spill(rest)
+                self._spill_overflow()
+                if self.spill is not None and time.monotonic() >= self._retry_at:
+                    self._replay()
+            except Exception as e:
+                # never let one bad batch stop the writer and stall everything behind it
+                self.dropped += len(batch)
+                logger.error(f"Storage writer {self.name} dropped {len(batch)} metrics: {e!r}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if not batch and r._closing.is_set():
+                return
+
+    def _take_batch(self) -> List[Metric]:
+        r = self.router
+        try:
+            first = self.queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + r.batch_wait
+        while len(batch) < r.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Metric]) -> Optional[Exception]:
+        """Hands `batch` to the backend; returns the error if it failed."""
+        r = self.router
+        try:
+            self.backend.save_batch(batch)
+        except Exception as e:
+            self.failed += 1
+            self._retry_at = time.monotonic() + self._backoff
+            logger.error(f"Storage backend {self.name} failed to write {len(batch)} metrics "
+                         f"(retrying in {self._backoff:.1f}s): {e}")
+            self._backoff = min(self._backoff * 2, r.max_backoff)
+            return e
+        self._backoff = r.retry_backoff
+        self.delivered += len(batch)
+        self.batches += 1
+        self.lag = max(0.0, time.time() - min(m.timestamp for m in batch))
+        return None
+
+    def _deliver(self, batch: List[Metric]) -> List[Metric]:
+        """
+        Writes `batch`, returning the metrics to retry later. A batch the
+        backend rejects for a reason other than an OSError may hold one
+        bad metric: it is then written metric by metric, and metrics the
+        backend refuses while it takes the others are dropped.
+        """
+        error = self._write(batch)
+        if error is None:
+            return []
+        if isinstance(error, OSError) or len(batch) == 1:
+            return batch
+        written, refused = 0, []
+        for i, metric in enumerate(batch):
+            try:
+                self.backend.save_batch([metric])
+            except OSError:
+                if not written:
+                    return batch
+                return batch[i:]  # went down meanwhile; the refused ones stay dropped
+            except Exception:
+                refused.append(metric)
+            else:
+                written += 1
+        if not written:
+            return batch  # refuses everything: treat it as down
+        self._retry_at = 0.0
+        self._backoff = self.router.retry_backoff
+        self.delivered += written
+        self.batches += 1
+        self.dropped += len(refused)
+        logger.error(f"Storage backend {self.name} refused {len(refused)} metrics; dropped them")
+        return []
+
+    @staticmethod
+    def _encodable(metric: Metric) -> bool:
+        try:
+            encode_batch([metric])
+        except Exception:
+            return False
+        return True
+
+    def _to_spill(self, batch: List[Metric]):
+        if self.spill is None:
+            self.dropped += len(batch)
+            return
+        try:
+            self.spill.append(batch)
+            self.spilled += len(batch)
+            return
+        except OSError as e:
+            self.dropped += len(batch)
+            logger.error(f"Could not spill {len(batch)} metrics for {self.name}: {e}")
+            return
+        except Exception as e:
+            error = e
+        # a metric the codec cannot encode (e.g. a non-string tag): spill the rest
+        good = [m for m in batch if self._encodable(m)]
+        self.dropped += len(batch) - len(good)
+        logger.error(f"Dropped {len(batch) - len(good)} unencodable metrics for {self.name}: {error!r}")
+        if not good:
+            return
+        try:
+            self.spill.append(good)
+            self.spilled += len(good)
+        except Exception as e:
+            self.dropped += len(good)
+            logger.error(f"Could not spill {len(good)} metrics for {self.name}: {e!r}")
+
+    def _spill_overflow(self):
+        with self._overflow_lock:
+            batch, self._overflow = self._overflow, []
+        if batch:
+            self._to_spill(batch)
+
+    def _replay(self):
+        while True:
+            frame = self.spill.peek()
+            if frame is None:
+                return
+            batch, offset = frame
+            if self._deliver(batch):
+                return  # down again; the frame is replayed later (at-least-once)
+            self.spill.advance(offset)
+            self.replayed += len(batch)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "failed": self.failed,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "spill_bytes": self.spill.pending_bytes if self.spill is not None else 0,
+            "lag": self.lag,
+        }
+
+class StorageRouter(IStorage):
+    """
+    Fans metrics out to several storage backends without making collection
+    wait for them.
+
+    Register it with MonitoringEngine.register_storage() in place of the
+    backends it wraps. save() only enqueues; each backend has its own
+    bounded queue and writer thread that hands it batches of up to
+    `batch_size` metrics through save_batch(). When a write fails the
+    backend is retried with exponential backoff, and in the meantime its
+    batches (and anything that overflows a full queue) are appended to a
+    spill file under `spill_dir` (a relative path is resolved once, here,
+    so a later chdir does not split the spill over two directories).
+    Spilled data is replayed, oldest first, once the backend accepts
+    writes again, including after a restart. Delivery from the spill file
+    is at-least-once. Without `spill_dir`, failed and overflowing batches
+    are dropped and counted. So are single metrics a backend refuses
+    while taking the rest of their batch, or that cannot be encoded for
+    the spill file; they never hold up the metrics behind them.
+    """
+
+    def __init__(self, backends: Optional[List[IStorage]] = None, spill_dir: Optional[str] = "spill",
+                 max_queue: int = 10000, batch_size: int = 500, batch_wait: float = 0.2,
+                 retry_backoff: float = 0.5, max_backoff: float = 30.0):
+        self.spill_dir = os.path.abspath(spill_dir) if spill_dir is not None else None
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        if self.spill_dir is not None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        self._closing = threading.Event()
+        self._writers: List[_BackendWriter] = []
+        for backend in backends or []:
+            self.add_backend(backend)
+
+    def add_backend(self, backend: IStorage):
+        index = len(self._writers)
+        name = backend.name
+        if any(w.name == name for w in self._writers):
+            name = f"{name}#{index}"  # keep stats and metric tags distinct
+        self._writers.append(_BackendWriter(backend, self, index, name))
+
+    def save(self, metric: Metric):
+        for writer in self._writers:
+            try:
+                writer.queue.put_nowait(metric)
+            except queue.Full:
+                writer.overflow(metric)
+
+    def save_batch(self, metrics: List[Metric]):
+        for metric in metrics:
+            self.save(metric)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {w.name: w.stats() for w in self._writers}
+
+    def metrics(self) -> List[Metric]:
+        """Per-backend lag and back-pressure figures, plus the backends' own metrics."""
+        metrics = []
+        now = time.time()
+        for writer in self._writers:
+            stats = writer.stats()
+            tags = {"backend": writer.name}
+            metrics.append(Metric(name="storage_lag_seconds", value=stats["lag"], timestamp=now, tags=tags))
+            metrics.append(Metric(name="storage_writer_queue_depth", value=float(stats["queue_depth"]),
+                                  timestamp=now, tags=dict(tags)))
+            metrics.append(Metric(name="storage_spill_bytes", value=float(stats["spill_bytes"]),
+                                  timestamp=now, tags=dict(tags)))
+            for key in ("delivered", "spilled", "dropped"):
+                metrics.append(Metric(name=f"storage_{key}_total", value=float(stats[key]),
+                                      timestamp=now, tags=dict(tags)))
+            backend_metrics = getattr(writer.backend, "metrics", None)
+            if backend_metrics is not None:
+                metrics.extend(backend_metrics())
+        return metrics
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every queued metric was written or spilled. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for writer in self._writers:
+            while writer.queue.unfinished_tasks:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        self._closing.set()
+        for writer in self._writers:
+            writer.thread.join(timeout)
+            if writer.thread.is_alive():
+                logger.warning(f"Storage writer for {writer.name} did not stop within {timeout}s")
+            else:
+                writer._spill_overflow()
+                if writer.spill is not None:
+                    writer.spill.close()
+            try:
+                writer.backend.close()
+            except Exception as e:
+                logger.error(f"Error closing storage backend {writer.name}: {e}")
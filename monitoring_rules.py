@@ -0,0 +1,336 @@
+import json
+import base64
+import struct
+import operator
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from monitoring_system_v3 import Metric
+
+# --- Rules ---
+
+_OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# Direction in which a value has to move to clear an alert, per operator
+_CLEAR_OPERATORS = {
+    ">": operator.le,
+    ">=": operator.lt,
+    "<": operator.ge,
+    "<=": operator.gt,
+}
+
+@dataclass
+class AlertRule:
+    """
+    A condition on one metric name.
+
+    `aggregation` is "value" (each sample), "avg" (mean over the last
+    `window` seconds) or "rate" (change per second over `window`). The
+    condition must hold for `for_duration` seconds before the rule fires.
+    Once firing it only resolves when the aggregated value crosses
+    `clear_threshold` (defaults to `threshold`), which gives hysteresis.
+    `matchers` restricts the rule to series whose tags contain those pairs.
+    """
+    name: str
+    metric: str
+    threshold: float
+    op: str = ">"
+    matchers: Dict[str, str] = field(default_factory=dict)
+    aggregation: str = "value"
+    window: float = 0.0
+    for_duration: float = 0.0
+    clear_threshold: Optional[float] = None
+    severity: str = "critical"
+
+@dataclass
+class AlertEvent:
+    rule: AlertRule
+    state: str  # "firing" or "resolved"
+    value: float
+    tags: Dict[str, str]
+    timestamp: float
+
+    @property
+    def severity(self) -> str:
+        return self.rule.severity if self.state == "firing" else "info"
+
+    @property
+    def message(self) -> str:
+        where = ",".join(f"{k}={v}" for k, v in sorted(self.tags.items()))
+        subject = f"{self.rule.metric}{{{where}}}" if where else self.rule.metric
+        if self.state == "firing":
+            return (f"{self.rule.name}: {subject} {self.rule.aggregation} is {self.value:.2f} "
+                    f"(Threshold: {self.rule.op} {self.rule.threshold})")
+        return f"{self.rule.name}: {subject} resolved at {self.value:.2f}"
+
+class _CompiledRule:
+    __slots__ = ("rule", "seq", "matchers", "check", "clear", "clear_threshold", "states")
+
+    def __init__(self, rule: AlertRule, seq: int):
+        if rule.op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator {rule.op!r} in rule {rule.name}")
+        if rule.aggregation not in ("value", "avg", "rate"):
+            raise ValueError(f"Unsupported aggregation {rule.aggregation!r} in rule {rule.name}")
+        if rule.aggregation != "value" and rule.window <= 0:
+            raise ValueError(f"Rule {rule.name} needs a window for {rule.aggregation}")
+        self.rule = rule
+        self.seq = seq  # registration order, which evaluate() keeps
+        self.matchers = tuple(sorted(rule.matchers.items()))
+        self.check = _OPERATORS[rule.op]
+        self.clear = _CLEAR_OPERATORS[rule.op]
+        self.clear_threshold = rule.threshold if rule.clear_threshold is None else rule.clear_threshold
+        self.states: Dict[Tuple, "_SeriesState"] = {}
+
+    def matches(self, tags: Dict[str, str]) -> bool:
+        for key, value in self.matchers:
+            if tags.get(key) != value:
+                return False
+        return True
+
+class _MetricRules:
+    """
+    The rules of one metric name. Rules with matchers are indexed under
+    their least common (key, value) pair, so a sample only looks at the
+    rules one of its own tags can satisfy. The index is rebuilt lazily
+    after rules change.
+    """
+    __slots__ = ("rules", "unconditional", "by_matcher", "dirty")
+
+    def __init__(self):
+        self.rules: List[_CompiledRule] = []
+        self.unconditional: List[_CompiledRule] = []
+        self.by_matcher: Dict[Tuple[str, str], List[_CompiledRule]] = {}
+        self.dirty = False
+
+    def add(self, compiled: _CompiledRule):
+        self.rules.append(compiled)
+        self.dirty = True
+
+    def _build(self):
+        counts = Counter(pair for compiled in self.rules for pair in compiled.matchers)
+        self.unconditional, self.by_matcher = [], {}
+        for compiled in self.rules:
+            if compiled.matchers:
+                pair = min(compiled.matchers, key=lambda p: (counts[p], p))
+                self.by_matcher.setdefault(pair, []).append(compiled)
+            else:
+                self.unconditional.append(compiled)
+        self.dirty = False
+
+    def candidates(self, tags: Dict[str, str]) -> List[_CompiledRule]:
+        if self.dirty:
+            self._build()
+        if not self.by_matcher:
+            return self.unconditional
+        found = list(self.unconditional)
+        for item in tags.items():
+            indexed = self.by_matcher.get(item)
+            if indexed:
+                found.extend(indexed)
+        if len(found) > 1:
+            found.sort(key=lambda c: c.seq)
+        return found
+
+class _SeriesState:
+    __slots__ = ("window", "total", "pending_since", "firing", "last_seen")
+
+    def __init__(self):
+        self.window: deque = deque()
+        self.total = 0.0
+        self.pending_since: Optional[float] = None
+        self.firing = False
+        self.last_seen = 0.0
+
+def _series_id(series_key: Tuple) -> str:
+    return json.dumps(series_key)
+
+def _pack_window(window: deque) -> str:
+    """(timestamp, value) pairs as base64 little-endian doubles; far cheaper to load than nested JSON lists."""
+    points = [x for point in window for x in point]
+    return base64.b64encode(struct.pack(f"<{len(points)}d", *points)).decode("ascii")
+
+def _unpack_window(packed: str) -> Tuple[float, ...]:
+    raw = base64.b64decode(packed)
+    return struct.unpack(f"<{len(raw) // 8}d", raw)
+
+class RuleEngine:
+    """
+    Evaluates AlertRules against a stream of metrics.
+
+    Rules are indexed by metric name and by one of their matchers, so
+    each sample only touches the rules that can apply to it. State is
+    kept per (rule, tag set); an alert is emitted once when a series
+    starts firing and once when it resolves, never for every breaching
+    sample. The state of a series that is not firing is dropped once it
+    has not been seen for `stale_after` seconds (by metric timestamps),
+    so series that come and go do not accumulate.
+    """
+
+    def __init__(self, rules: Optional[List[AlertRule]] = None, stale_after: Optional[float] = 3600.0):
+        self._index: Dict[str, _MetricRules] = {}
+        self._seq = 0
+        self.stale_after = stale_after
+        self._next_sweep: Optional[float] = None
+        # State from a checkpoint, per rule name and series id; series are
+        # rebuilt from it the first time they are seen again.
+        self._restored: Optional[Mapping[str, Dict[str, list]]] = None
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RuleEngine":
+        """Builds rules from config["rules"] (dicts of AlertRule fields) and legacy config["thresholds"]."""
+        rules = [AlertRule(**spec) for spec in config.get("rules", [])]
+        for metric, threshold in config.get("thresholds", {}).items():
+            rules.append(AlertRule(name=f"{metric}_high", metric=metric, threshold=threshold))
+        return cls(rules)
+
+    def add_rule(self, rule: AlertRule):
+        compiled = _CompiledRule(rule, self._seq)
+        self._seq += 1
+        metric_rules = self._index.get(rule.metric)
+        if metric_rules is None:
+            metric_rules = self._index[rule.metric] = _MetricRules()
+        metric_rules.add(compiled)
+
+    def remove_rule(self, name: str):
+        for metric, metric_rules in list(self._index.items()):
+            kept = [c for c in metric_rules.rules if c.rule.name != name]
+            if len(kept) == len(metric_rules.rules):
+                continue
+            if kept:
+                metric_rules.rules = kept
+                metric_rules.dirty = True
+            else:
+                del self._index[metric]
+
+    def _compiled(self) -> List[_CompiledRule]:
+        return [c for metric_rules in self._index.values() for c in metric_rules.rules]
+
+    @property
+    def rules(self) -> List[AlertRule]:
+        return [c.rule for c in self._compiled()]
+
+    def firing(self) -> List[Tuple[str, Tuple]]:
+        """Returns (rule name, series key) for every series currently firing."""
+        return [(c.rule.name, key) for c in self._compiled() for key, state in c.states.items() if state.firing]
+
+    def evaluate(self, metric: Metric) -> List[AlertEvent]:
+        metric_rules = self._index.get(metric.name)
+        if metric_rules is None:
+            return []
+        now = metric.timestamp
+        if self.stale_after is not None:
+            if self._next_sweep is None:
+                self._next_sweep = now + self.stale_after
+            elif now >= self._next_sweep:
+                self._evict_stale(now)
+        events = []
+        series_key = None
+        for compiled in metric_rules.candidates(metric.tags):
+            if compiled.matchers and not compiled.matches(metric.tags):
+                continue
+            if series_key is None:
+                series_key = tuple(sorted(metric.tags.items()))
+            state = compiled.states.get(series_key)
+            if state is None:
+                state = compiled.states[series_key] = self._initial_state(compiled, series_key)
+            state.last_seen = now
+            event = self._step(compiled, state, metric)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _evict_stale(self, now: float):
+        """Drops series not seen for stale_after seconds, unless they are firing."""
+        horizon = now - self.stale_after
+        for compiled in self._compiled():
+            stale = [key for key, state in compiled.states.items() if state.last_seen < horizon and not state.firing]
+            for key in stale:
+                del compiled.states[key]
+        if self._restored is not None:
+            # restored series not seen again since the restart are stale by now
+            self._restored = {name: {sid: entry for sid, entry in (series or {}).items() if entry[2]}
+                              for name, series in self._restored.items()}
+        self._next_sweep = now + self.stale_after / 2
+
+    def _initial_state(self, compiled: _CompiledRule, series_key: Tuple) -> _SeriesState:
+        state = _SeriesState()
+        if self._restored is None:
+            return state
+        saved = self._restored.get(compiled.rule.name)
+        entry = saved.pop(_series_id(series_key), None) if saved else None
+        if entry is not None:
+            window, state.pending_since, state.firing = entry
+            points = _unpack_window(window)
+            state.window.extend(zip(points[0::2], points[1::2]))
+            state.total = sum(points[1::2])
+        return state
+
+    def get_state(self) -> Dict[str, Dict[str, list]]:
+        """
+        Window and alert state of every series, per rule name, as
+        JSON-compatible data for checkpoints. Restored series that have not
+        been seen again yet are carried over.
+        """
+        state: Dict[str, Dict[str, list]] = {}
+        for compiled in self._compiled():
+            name = compiled.rule.name
+            series = state[name] = {}
+            if self._restored is not None:
+                series.update(self._restored.get(name) or {})
+            for key, s in compiled.states.items():
+                series[_series_id(key)] = [_pack_window(s.window), s.pending_since, s.firing]
+        return state
+
+    def set_state(self, state: Mapping[str, Dict[str, list]]):
+        """
+        Restores state saved by get_state(). Nothing is decoded up front:
+        each series picks up its saved window and firing flag when its next
+        sample arrives, so a firing alert is not announced again after a
+        restart and windowed aggregations continue where they left off.
+        """
+        self._restored = state
+
+    def _step(self, compiled: _CompiledRule, state: _SeriesState, metric: Metric) -> Optional[AlertEvent]:
+        rule = compiled.rule
+        now = metric.timestamp
+        if rule.aggregation == "value":
+            value = metric.value
+        else:
+            window = state.window
+            window.append((now, metric.value))
+            state.total += metric.value
+            horizon = now - rule.window
+            while window and window[0][0] < horizon:
+                state.total -= window.popleft()[1]
+            if rule.aggregation == "avg":
+                value = state.total / len(window)
+            else:
+                first_ts, first_value = window[0]
+                if now <= first_ts:
+                    return None
+                value = (metric.value - first_value) / (now - first_ts)
+
+        if state.firing:
+            if compiled.clear(value, compiled.clear_threshold):
+                state.firing = False
+                state.pending_since = None
+                return AlertEvent(rule, "resolved", value, metric.tags, now)
+            return None
+
+        if not compiled.check(value, rule.threshold):
+            state.pending_since = None
+            return None
+        if state.pending_since is None:
+            state.pending_since = now
+        if now - state.pending_since >= rule.for_duration:
+            state.firing = True
+            return AlertEvent(rule, "firing", value, metric.tags, now)
+        return None
@@ -0,0 +1,449 @@
+import re
+import json
+import time
+import heapq
+import logging
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# --- IMS Record Search ---
+
+@dataclass(frozen=True)
+class Dataset:
+    """How app.js's global search indexes and presents one localStorage array."""
+    key: str                    # localStorage key
+    type: str                   # result type shown in the search dropdown
+    fields: Tuple[str, ...]     # searchable fields, most important first
+    title: str
+    subtitle: str
+    meta: Callable[[Dict[str, Any]], str]
+    link: Callable[[Dict[str, Any]], str]
+
+def _text(record: Dict[str, Any], name: str) -> str:
+    value = record.get(name)
+    return "" if value is None else str(value)
+
+def _variance(record: Dict[str, Any]) -> str:
+    try:
+        return f"Var: {float(record.get('physical')) - float(record.get('system')):g}"
+    except (TypeError, ValueError):
+        return "Var: NaN"
+
+DATASETS = {d.key: d for d in (
+    Dataset("dms_docs_v1", "Document", ("controlNumber", "title"), "title", "controlNumber",
+            lambda r: _text(r, "status"), lambda r: f"document.html?control={quote(_text(r, 'controlNumber'))}"),
+    Dataset("ims_ir_records_v1", "Incident Report", ("id", "description"), "id", "description",
+            lambda r: _text(r, "status"), lambda r: f"ir_monitoring.html?search={quote(_text(r, 'id'))}"),
+    Dataset("ims_cycle_count_v1", "Cycle Count", ("itemCode", "location"), "itemCode", "location",
+            _variance, lambda r: f"cycle_count.html?search={quote(_text(r, 'itemCode'))}"),
+    Dataset("ims_daily_attendance_v1", "Attendance", ("name", "userId"), "name", "userId",
+            lambda r: _text(r, "role"), lambda r: "all_ic_attendance.html"),
+    Dataset("ims_daily_counters_v1", "Daily Counter", ("date", "shift"), "date", "shift",
+            lambda r: f"Req: {_text(r, 'required')}", lambda r: "daily_cycle_count.html"),
+    Dataset("ims_validation_tasks_v1", "Validation Task", ("sku", "validator"), "sku", "validator",
+            lambda r: _text(r, "status"), lambda r: "all_ic_attendance.html"),
+)}
+# db.json keeps the document register under "docs"
+ALIASES = {"docs": "dms_docs_v1"}
+
+SEP = "\x00"
+RESULT_FIELDS = ("type", "title", "subtitle", "meta", "link")
+
+GRAM = 3
+EDGE = 6            # field prefixes up to this length are indexed for ranking
+BULK_RANK = 2000    # beyond this many matches a single term is ranked with set operations
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+def _normalize(value: str) -> str:
+    return value.casefold().strip()
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+def _edges(text: str, primary: bool) -> Set[str]:
+    """
+    Keys of the edge index for one field: short prefixes of the field and
+    of each word in it (candidates for terms under GRAM characters), and
+    tier keys "\0=field" and "\0^prefix" (doubled for the primary field)
+    used to rank large result sets without looking at each record.
+    """
+    keys = set()
+    for token in [text] + _TOKEN_SPLIT.split(text):
+        for n in range(1, min(GRAM, len(token) + 1)):
+            keys.add(token[:n])
+    tiers = ("\x00=", "\x00==") if primary else ("\x00=",)
+    for tier in tiers:
+        keys.add(tier + text)
+        caret = tier.replace("=", "^")
+        for n in range(1, min(EDGE, len(text)) + 1):
+            keys.add(caret + text[:n])
+    return keys
+
+class _Doc:
+    # `text` holds the normalized fields as "\0field1\0field2\0", so one
+    # substring test covers all fields and "\0term" finds a field prefix
+    __slots__ = ("key", "text", "result")
+
+    def __init__(self, key: str, text: str, result: Tuple[str, ...]):
+        self.key = key
+        self.text = text
+        self.result = result
+
+    @property
+    def fields(self) -> List[str]:
+        return self.text[1:-1].split(SEP)
+
+class SearchIndex:
+    """
+    Inverted index over the IMS localStorage datasets for the global search.
+
+    Every searchable field is broken into 3-character grams (never across
+    fields); a query term of three or more characters is answered by
+    intersecting the posting sets of its grams, smallest first, and
+    checking the few remaining candidates for the whole term, which
+    gives the same substring semantics as app.js's includes() scan.
+    Shorter terms match the start of a field or of a word in it through
+    a separate edge index. Terms are ANDed.
+
+    Results are ranked by how well a field matches (equal, prefix, word
+    prefix, substring), the record's primary field (control number, SKU,
+    item code, name) ahead of the others, and carry the type, title,
+    subtitle, meta and link the search dropdown renders. A single term
+    matching thousands of records is ranked with set operations on the
+    edge index rather than record by record. Records are upserted or
+    removed one at a time, or a whole dataset is synced to a fresh export;
+    either way only changed records touch the postings.
+    """
+
+    def __init__(self):
+        self._docs: Dict[int, _Doc] = {}
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._grams: Dict[str, Any] = {}
+        self._edges: Dict[str, Any] = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # -- ingest --
+
+    def load(self, path: str):
+        """Indexes an exported JSON file: a localStorage dump or db.json."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for name, records in data.items():
+            dataset = ALIASES.get(name, name)
+            if dataset in DATASETS and isinstance(records, list):
+                self.sync(dataset, records)
+
+    def sync(self, dataset: str, records: Iterable[Dict[str, Any]]):
+        """Replaces a dataset with `records`; unchanged records are left alone."""
+        with self._lock:
+            seen = set()
+            for record in records:
+                seen.add(self._upsert(dataset, record))
+            stale = [key for (name, key) in self._ids if name == dataset and key not in seen]
+            for key in stale:
+                self._remove(dataset, key)
+
+    def upsert(self, dataset: str, records: Iterable[Dict[str, Any]]) -> int:
+        with self._lock:
+            count = 0
+            for record in records:
+                self._upsert(dataset, record)
+                count += 1
+            return count
+
+    def remove(self, dataset: str, key: str) -> bool:
+        with self._lock:
+            return self._remove(dataset, key)
+
+    def _record_key(self, spec: Dataset, record: Dict[str, Any]) -> str:
+        return _text(record, "id") or _text(record, spec.fields[0])
+
+    def _upsert(self, dataset: str, record: Dict[str, Any]) -> str:
+        spec = DATASETS.get(dataset)
+        if spec is None:
+            raise ValueError(f"unknown dataset {dataset!r}")
+        key = self._record_key(spec, record)
+        text = SEP + SEP.join(_normalize(_text(record, name)).replace(SEP, " ") for name in spec.fields) + SEP
+        result = (spec.type, _text(record, spec.title), _text(record, spec.subtitle), spec.meta(record),
+                  spec.link(record))
+        doc_id = self._ids.get((dataset, key))
+        if doc_id is not None:
+            doc = self._docs[doc_id]
+            if doc.text == text and doc.result == result:
+                return key
+            self._remove(dataset, key)
+        doc_id = self._next_id
+        self._next_id += 1
+        doc = self._docs[doc_id] = _Doc(key, text, result)
+        self._ids[(dataset, key)] = doc_id
+        self._post(doc_id, doc.fields, add=True)
+        return key
+
+    def _remove(self, dataset: str, key: str) -> bool:
+        doc_id = self._ids.pop((dataset, key), None)
+        if doc_id is None:
+            return False
+        doc = self._docs.pop(doc_id)
+        self._post(doc_id, doc.fields, add=False)
+        return True
+
+    def _post(self, doc_id: int, fields: List[str], add: bool):
+        grams: Set[str] = set()
+        edges: Set[str] = set()
+        for position, text in enumerate(fields):
+            if text:
+                grams |= _grams(text)
+                edges |= _edges(text, position == 0)
+        # A key held by a single record (an exact control number, a long
+        # prefix) maps to the bare id; a set is only created for the second
+        for index, keys in ((self._grams, grams), (self._edges, edges)):
+            for key in keys:
+                postings = index.get(key)
+                if add:
+                    if postings is None:
+                        index[key] = doc_id
+                    elif type(postings) is int:
+                        index[key] = {postings, doc_id}
+                    else:
+                        postings.add(doc_id)
+                elif type(postings) is int:
+                    if postings == doc_id:
+                        del index[key]
+                elif postings is not None:
+                    postings.discard(doc_id)
+                    if len(postings) == 1:
+                        index[key] = postings.pop()
+
+    @staticmethod
+    def _get(index: Dict[str, Any], key: str) -> Set[int]:
+        postings = index.get(key)
+        if postings is None:
+            return set()
+        return {postings} if type(postings) is int else postings
+
+    # -- query --
+
+    def _candidates(self, term: str) -> Set[int]:
+        if len(term) < GRAM:
+            return self._get(self._edges, term)
+        postings = []
+        for gram in _grams(term):
+            found = self._get(self._grams, gram)
+            if not found:
+                return set()
+            postings.append(found)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:]) if len(postings) > 1 else set(postings[0])
+        if len(term) > GRAM:
+            docs = self._docs
+            candidates = {d for d in candidates if term in docs[d].text}
+        return candidates
+
+    @staticmethod
+    def _rank(text: str, terms: List[str]) -> int:
+        """0 is best: per term, exact primary field, exact field, primary prefix, field prefix, word prefix, substring."""
+        rank = 0
+        for term in terms:
+            edge = SEP + term
+            if edge + SEP in text:
+                rank += 0 if text.startswith(edge + SEP) else 1
+            elif text.startswith(edge):
+                rank += 2
+            elif edge in text:
+                rank += 3
+            elif " " + term in text or "-" + term in text:
+                rank += 4
+            else:
+                rank += 5
+        return rank
+
+    def _bulk_rank(self, term: str, matches: Set[int], limit: int) -> List[int]:
+        """Same order as _rank() for one term, taking whole tiers from the edge index."""
+        ranked: List[int] = []
+        taken: Set[int] = set()
+        tiers = ["\x00==" + term, "\x00=" + term]
+        if len(term) <= EDGE:
+            tiers += ["\x00^^" + term, "\x00^" + term]
+        for key in tiers:
+            tier = (self._get(self._edges, key) & matches) - taken
+            ranked.extend(heapq.nsmallest(limit - len(ranked), tier))
+            if len(ranked) >= limit:
+                return ranked
+            taken |= tier
+        rest = matches - taken
+        if len(rest) > BULK_RANK:
+            ranked.extend(heapq.nsmallest(limit - len(ranked), rest))  # word prefix and substring matches, by age
+            return ranked
+        docs = self._docs
+        rank = self._rank
+        terms = [term]
+        return ranked + [d for _, d in heapq.nsmallest(limit - len(ranked), ((rank(docs[d].text, terms), d) for d in rest))]
+
+    def search(self, query: str, limit: int = 20, types: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Ranked matches for `query`, at most `limit`, optionally only of the given result types."""
+        start = time.perf_counter()
+        terms = [t for t in _normalize(query).split() if t]
+        with self._lock:
+            matches: Optional[Set[int]] = None
+            for term in sorted(terms, key=len, reverse=True):  # longest term is usually the most selective
+                found = self._candidates(term)
+                matches = found if matches is None else matches & found
+                if not matches:
+                    break
+            matches = matches or set()
+            docs = self._docs
+            if types:
+                matches = {d for d in matches if docs[d].result[0] in types}
+            if len(terms) == 1 and len(matches) > BULK_RANK:
+                ranked = self._bulk_rank(terms[0], matches, limit)
+            else:
+                rank = self._rank
+                ranked = [d for _, d in heapq.nsmallest(limit, ((rank(docs[d].text, terms), d) for d in matches))]
+            results = [dict(zip(RESULT_FIELDS, docs[d].result)) for d in ranked]
+        return {"query": query, "total": len(matches), "results": results,
+                "took_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            per_dataset: Dict[str, int] = {}
+            for dataset, _ in self._ids:
+                per_dataset[dataset] = per_dataset.get(dataset, 0) + 1
+            return {"records": len(self._docs), "grams": len(self._grams), "edges": len(self._edges),
+                    **per_dataset}
+
+# --- HTTP ---
+
+class _SearchHandler(BaseHTTPRequestHandler):
+    index: SearchIndex = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        if parts.path == "/search":
+            try:
+                limit = int(params.get("limit", ["20"])[-1])
+            except ValueError:
+                return self._reply(400, {"error": "limit must be an integer"})
+            types = set(params["type"]) if "type" in params else None
+            return self._reply(200, self.index.search(params.get("q", [""])[-1], max(1, min(limit, 500)), types))
+        if parts.path == "/health":
+            return self._reply(200, self.index.stats())
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        # POST /records/<dataset>            upsert the records in the body
+        # POST /records/<dataset>?replace=1  replace the whole dataset
+        parts = urlsplit(self.path)
+        dataset = parts.path[len("/records/"):] if parts.path.startswith("/records/") else None
+        dataset = ALIASES.get(dataset, dataset)
+        if dataset not in DATASETS:
+            return self._reply(404, {"error": "unknown dataset"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) would wait for the client to close the connection
+            return self._reply(400, {"error": "bad Content-Length"})
+        try:
+            records = json.loads(self.rfile.read(length))
+            if isinstance(records, dict):
+                records = [records]
+            if parse_qs(parts.query).get("replace", ["0"])[-1] == "1":
+                self.index.sync(dataset, records)
+            else:
+                self.index.upsert(dataset, records)
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(200, {"updated": len(records)})
+
+    def do_DELETE(self):
+        path = urlsplit(self.path).path
+        _, _, rest = path.partition("/records/")
+        dataset, _, key = rest.partition("/")
+        dataset = ALIASES.get(dataset, dataset)
+        if not path.startswith("/records/") or dataset not in DATASETS or not key:
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, {"removed": self.index.remove(dataset, unquote(key))})
+
+    def _reply(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("search %s - %s", self.address_string(), format % args)
+
+class SearchServer:
+    """
+    Local HTTP front end for SearchIndex:
+
+      GET    /search?q=...&limit=20&type=Document   ranked results
+      GET    /health                                 index size per dataset
+      POST   /records/<dataset>[?replace=1]          upsert records (or replace the dataset)
+      DELETE /records/<dataset>/<key>                remove one record
+    """
+
+    def __init__(self, index: SearchIndex, host: str = "127.0.0.1", port: int = 9111):
+        self.index = index
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server is not None else (self.host, self.port)
+
+    def start(self):
+        handler = type("SearchHandler", (_SearchHandler,), {"index": self.index})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="search-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a search index over the IMS record datasets.")
+    parser.add_argument("data", nargs="*", default=["db.json"], help="exported JSON (localStorage dump or db.json)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9111)
+    args = parser.parse_args(argv)
+
+    index = SearchIndex()
+    for path in args.data:
+        index.load(path)
+    server = SearchServer(index, args.host, args.port).start()
+    print(f"Indexed {len(index)} records; serving on http://{server.address[0]}:{server.address[1]}/search")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
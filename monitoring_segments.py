@@ -0,0 +1,455 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import heapq
+import struct
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from monitoring_system_v3 import IStorage, Metric, tags_key
+from monitoring_codec import CodecError, decode_records, decode_tables, encode_batch, iter_records
+
+logger = logging.getLogger(__name__)
+
+# --- Segment Files ---
+#
+# A segment is a sequence of blocks:
+#
+#   "SBLK" u32 payload length, u32 crc32(payload), payload
+#
+# where the payload is a monitoring_codec batch whose records are sorted by
+# series. The sidecar <segment>.idx (JSON) maps each series to the runs of
+# records it owns: [block offset, first record, count, min ts, max ts].
+
+_BLOCK = struct.Struct("<4sII")
+_BLOCK_MAGIC = b"SBLK"
+_SEP = "\x1f"
+
+def series_key(name: str, tags: Dict[str, str]) -> str:
+    return name + _SEP + tags_key(tags)
+
+class _Segment:
+    def __init__(self, path: str, window: float):
+        self.path = path
+        self.window = window
+        self.index: Dict[str, List[list]] = {}
+        self.min_ts = float("inf")
+        self.max_ts = float("-inf")
+        self.size = 0
+        self.sealed = False
+        self.replaces: List[str] = []
+        self._writer = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    @property
+    def index_path(self) -> str:
+        return self.path + ".idx"
+
+    def append_block(self, metrics: List[Metric], keys: List[str], fsync: bool):
+        """Writes metrics (already sorted by series key) as one block."""
+        payload = encode_batch(metrics)
+        if self._writer is None:
+            self._writer = open(self.path, "ab")
+        offset = self.size
+        self._writer.write(_BLOCK.pack(_BLOCK_MAGIC, len(payload), zlib.crc32(payload)))
+        self._writer.write(payload)
+        self._writer.flush()
+        if fsync:
+            os.fsync(self._writer.fileno())
+        self.size += _BLOCK.size + len(payload)
+
+        run_start = 0
+        for i in range(1, len(keys) + 1):
+            if i == len(keys) or keys[i] != keys[run_start]:
+                timestamps = [m.timestamp for m in metrics[run_start:i]]
+                self._add_run(keys[run_start], offset, run_start, i - run_start, min(timestamps), max(timestamps))
+                run_start = i
+
+    def _add_run(self, key, offset, first, count, min_ts, max_ts):
+        self.index.setdefault(key, []).append([offset, first, count, min_ts, max_ts])
+        if min_ts < self.min_ts:
+            self.min_ts = min_ts
+        if max_ts > self.max_ts:
+            self.max_ts = max_ts
+
+    def seal(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.write_index()
+        self.sealed = True
+
+    def write_index(self):
+        data = {
+            "window": self.window, "size": self.size, "min_ts": self.min_ts, "max_ts": self.max_ts,
+            "replaces": self.replaces, "series": self.index,
+        }
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self.index_path)
+
+    def load_index(self) -> bool:
+        """Loads the sidecar index if it matches the segment file. Returns False if it must be rebuilt."""
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("size") != os.path.getsize(self.path):
+            return False
+        self.index = data["series"]
+        self.min_ts, self.max_ts, self.size = data["min_ts"], data["max_ts"], data["size"]
+        self.replaces = data.get("replaces", [])
+        self.sealed = True
+        return True
+
+    def recover(self):
+        """
+        Rebuilds the index by scanning blocks and truncates the file at the
+        first torn or corrupt block (a crash mid-write).
+        """
+        self.index = {}
+        self.min_ts, self.max_ts = float("inf"), float("-inf")
+        good = 0
+        with open(self.path, "rb") as f:
+            data = f.read()
+        view = memoryview(data)
+        while good + _BLOCK.size <= len(data):
+            magic, length, crc = _BLOCK.unpack_from(view, good)
+            end = good + _BLOCK.size + length
+            if magic != _BLOCK_MAGIC or end > len(data) or zlib.crc32(view[good + _BLOCK.size:end]) != crc:
+                break
+            try:
+                self._index_block(view[good + _BLOCK.size:end], good)
+            except CodecError:
+                break
+            good = end
+        view.release()
+        if good != len(data):
+            logger.warning(f"Truncating torn tail of {self.path} at byte {good} (was {len(data)})")
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+        self.size = good
+
+    def _index_block(self, payload: memoryview, offset: int):
+        strings, tagsets, rec_offset, count = decode_tables(payload)
+        keys: Dict[Tuple[int, int], str] = {}
+        run_key, run_first, run_min, run_max = None, 0, 0.0, 0.0
+        for i, (name_id, tagset_id, _, ts, _) in enumerate(iter_records(payload, rec_offset, 0, count)):
+            key = keys.get((name_id, tagset_id))
+            if key is None:
+                key = keys[(name_id, tagset_id)] = series_key(strings[name_id], tagsets[tagset_id])
+            if key != run_key:
+                if run_key is not None:
+                    self._add_run(run_key, offset, run_first, i - run_first, run_min, run_max)
+                run_key, run_first, run_min, run_max = key, i, ts, ts
+            else:
+                run_min, run_max = min(run_min, ts), max(run_max, ts)
+        if run_key is not None:
+            self._add_run(run_key, offset, run_first, count - run_first, run_min, run_max)
+
+    def view(self) -> Optional[memoryview]:
+        """Read-only memoryview over the mapped file; the mapping is cached once sealed."""
+        if self.size == 0:
+            return None
+        if self._mmap is not None:
+            return memoryview(self._mmap)
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.sealed:
+            self._mmap = mapped
+        return memoryview(mapped)[:self.size]
+
+    def blocks(self, view: memoryview, size: Optional[int] = None) -> Iterator[Tuple[int, memoryview]]:
+        """Blocks in the first `size` bytes (default: the whole segment)."""
+        size = self.size if size is None else size
+        offset = 0
+        while offset < size:
+            _, length, _ = _BLOCK.unpack_from(view, offset)
+            yield offset, view[offset + _BLOCK.size:offset + _BLOCK.size + length]
+            offset += _BLOCK.size + length
+
+    def payload(self, view: memoryview, offset: int) -> memoryview:
+        _, length, _ = _BLOCK.unpack_from(view, offset)
+        return view[offset + _BLOCK.size:offset + _BLOCK.size + length]
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # a reader still holds a view; the mapping goes away with it
+            self._mmap = None
+
+class SegmentStorage(IStorage):
+    """
+    Append-only storage in segment files, one series of segments per
+    `segment_window` seconds of metric time.
+
+    save() buffers metrics; every `batch_size` metrics (or `flush_interval`
+    seconds, checked by a background flusher so a quiet period does not
+    leave them buffered) they are sorted by series and appended to the
+    segment of their window as one checksummed block. A segment is sealed (its index
+    written next to it) when it reaches `max_segment_bytes` or when its
+    window is two windows behind the newest one. Reads go through mmap and
+    decode only the record runs of the requested series. On open, any
+    segment without a valid index is rescanned and a torn tail truncated.
+    compact() merges sealed segments of older periods into one file each.
+    """
+
+    def __init__(self, directory: str = "segments", segment_window: float = 3600.0,
+                 max_segment_bytes: int = 64 * 1024 * 1024, batch_size: int = 5000,
+                 flush_interval: float = 1.0, fsync: bool = False):
+        self.directory = directory
+        self.segment_window = segment_window
+        self.max_segment_bytes = max_segment_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._pending: List[Metric] = []
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._segments: List[_Segment] = []
+        self._active: Dict[float, _Segment] = {}
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open_existing()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="segment-flusher", daemon=True)
+        self._flusher.start()
+
+    # -- lifecycle --
+
+    def _open_existing(self):
+        existing = set(os.listdir(self.directory))
+        for name in existing:
+            # leftovers of an interrupted compaction or index write
+            if name.endswith(".tmp") or (name.endswith(".idx") and name[:-4] not in existing):
+                os.remove(os.path.join(self.directory, name))
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".seg"))
+        segments = []
+        for name in names:
+            window = float(name.split("-", 1)[0])
+            self._seq = max(self._seq, int(name[:-4].rsplit("-", 1)[1]) + 1)
+            segment = _Segment(os.path.join(self.directory, name), window)
+            if not segment.load_index():
+                segment.recover()
+                segment.seal()
+            segments.append(segment)
+        # Finish compactions interrupted after the merged segment was published
+        replaced = {r for s in segments for r in s.replaces}
+        for segment in segments:
+            if os.path.basename(segment.path) in replaced:
+                self._remove_files(segment)
+        self._segments = [s for s in segments if os.path.basename(s.path) not in replaced]
+
+    def _allocate_segment(self, window: float) -> _Segment:
+        name = f"{int(window):012d}-{self._seq:06d}.seg"
+        self._seq += 1
+        return _Segment(os.path.join(self.directory, name), window)
+
+    def _new_segment(self, window: float) -> _Segment:
+        segment = self._allocate_segment(window)
+        self._segments.append(segment)
+        return segment
+
+    @staticmethod
+    def _remove_files(segment: _Segment):
+        segment.close()
+        for path in (segment.path, segment.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval / 2):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error(f"Error flushing segments in {self.directory}: {e}")
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self.flush()
+            for segment in self._active.values():
+                segment.seal()
+            self._active.clear()
+            for segment in self._segments:
+                segment.close()
+
+    # -- writes --
+
+    def save(self, metric: Metric):
+        with self._lock:
+            self._pending.append(metric)
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            by_window: Dict[float, List[Tuple[str, Metric]]] = {}
+            key_cache: Dict[Tuple, str] = {}
+            for metric in pending:
+                cache_key = (metric.name, tuple(metric.tags.items()))
+                key = key_cache.get(cache_key)
+                if key is None:
+                    key = key_cache[cache_key] = series_key(metric.name, metric.tags)
+                window = metric.timestamp - metric.timestamp % self.segment_window
+                by_window.setdefault(window, []).append((key, metric))
+            for window, items in by_window.items():
+                items.sort(key=lambda item: item[0])
+                segment = self._active.get(window)
+                if segment is None or segment.size >= self.max_segment_bytes:
+                    if segment is not None:
+                        segment.seal()
+                    segment = self._active[window] = self._new_segment(window)
+                segment.append_block([m for _, m in items], [k for k, _ in items], self.fsync)
+            newest = max(self._active)
+            for window in [w for w in self._active if w < newest - self.segment_window]:
+                self._active.pop(window).seal()
+
+    # -- reads --
+
+    def segments(self) -> List[_Segment]:
+        with self._lock:
+            return list(self._segments)
+
+    def scan(self, start: float = float("-inf"), end: float = float("inf")) -> Iterator[Metric]:
+        """Yields every stored metric with start <= timestamp < end, segment by segment."""
+        self.flush()
+        # flush() keeps appending to active segments; read only what was there now
+        with self._lock:
+            snapshot = [(s, s.size) for s in self._segments if not (s.max_ts < start or s.min_ts >= end)]
+        for segment, size in snapshot:
+            view = segment.view()
+            if view is None:
+                continue
+            for _, payload in segment.blocks(view, size):
+                strings, tagsets, offset, count = decode_tables(payload)
+                for metric in decode_records(payload, strings, tagsets, offset, 0, count):
+                    if start <= metric.timestamp < end:
+                        yield metric
+
+    def range(self, name: str, start: float = float("-inf"), end: float = float("inf"),
+              tags: Optional[Dict[str, str]] = None) -> Iterator[Metric]:
+        """
+        Yields samples of `name` whose tags contain `tags`, reading only the
+        record runs indexed for the matching series. Output is in
+        timestamp order as long as each series was written in order.
+        """
+        self.flush()
+        prefix = name + _SEP
+        # Copy the runs under the lock: flush() appends to the index of active segments
+        series: Dict[str, List[Tuple[_Segment, List[list]]]] = {}
+        with self._lock:
+            for segment in self._segments:
+                for key, runs in segment.index.items():
+                    if key.startswith(prefix):
+                        series.setdefault(key, []).append((segment, list(runs)))
+        streams = []
+        for key in sorted(series):
+            if tags:
+                series_tags = json.loads(key[len(prefix):])
+                if any(series_tags.get(k) != v for k, v in tags.items()):
+                    continue
+            streams.append(self._series_range(series[key], start, end))
+        yield from heapq.merge(*streams, key=lambda m: m.timestamp)
+
+    @staticmethod
+    def _series_range(segment_runs: List[Tuple[_Segment, List[list]]], start: float, end: float) -> Iterator[Metric]:
+        for segment, runs in segment_runs:
+            view = segment.view()
+            for offset, first, count, min_ts, max_ts in runs:
+                if max_ts < start or min_ts >= end:
+                    continue
+                payload = segment.payload(view, offset)
+                strings, tagsets, rec_offset, _ = decode_tables(payload)
+                for metric in decode_records(payload, strings, tagsets, rec_offset, first, first + count):
+                    if start <= metric.timestamp < end:
+                        yield metric
+
+    # -- maintenance --
+
+    def compact(self, before: float, period: float = 86400.0, block_records: int = 50000) -> int:
+        """
+        Merges sealed segments whose data is older than `before` into one
+        segment per `period`, rewritten sorted by series and time. The
+        merged file is written without holding the storage lock, so saves
+        and reads go on meanwhile. Returns the number of segments removed.
+        """
+        with self._compact_lock:
+            with self._lock:
+                self.flush()
+                groups: Dict[float, List[_Segment]] = {}
+                active = set(id(s) for s in self._active.values())
+                for segment in self._segments:
+                    if id(segment) in active or not segment.sealed or segment.max_ts >= before or not segment.size:
+                        continue
+                    groups.setdefault(segment.min_ts - segment.min_ts % period, []).append(segment)
+                merges = [(self._allocate_segment(period_start), group)
+                          for period_start, group in groups.items() if len(group) > 1]
+
+            removed = 0
+            for merged, group in merges:
+                self._write_merged(merged, group, block_records)
+                with self._lock:
+                    for segment in group:
+                        self._remove_files(segment)
+                        self._segments.remove(segment)
+                    self._segments.append(merged)
+                    self._segments.sort(key=lambda s: os.path.basename(s.path))
+                removed += len(group)
+            return removed
+
+    @staticmethod
+    def _write_merged(merged: _Segment, group: List[_Segment], block_records: int):
+        """
+        Writes the records of `group` into `merged` one series at a time,
+        decoding only that series' runs, and publishes it next to them.
+        """
+        final_path = merged.path
+        merged.path = final_path + ".tmp"
+        views = [(segment, segment.view()) for segment in group]
+        tables: Dict[Tuple[int, int], tuple] = {}
+        block: List[Metric] = []
+        keys: List[str] = []
+        for key in sorted({key for segment in group for key in segment.index}):
+            series: List[Metric] = []
+            for i, (segment, view) in enumerate(views):
+                for offset, first, count, _, _ in segment.index.get(key, ()):
+                    decoded = tables.get((i, offset))
+                    if decoded is None:
+                        payload = segment.payload(view, offset)
+                        decoded = tables[(i, offset)] = (payload,) + decode_tables(payload)[:3]
+                    series.extend(decode_records(*decoded, first, first + count))
+            series.sort(key=lambda m: m.timestamp)
+            for metric in series:
+                block.append(metric)
+                keys.append(key)
+                if len(block) == block_records:
+                    merged.append_block(block, keys, fsync=True)
+                    block, keys = [], []
+        if block:
+            merged.append_block(block, keys, fsync=True)
+        merged.seal()
+        os.remove(merged.index_path)
+        # Publish the index (naming the segments it replaces) before the
+        # data, so a crash in between never leaves duplicate data live.
+        merged.path = final_path
+        merged.replaces = [os.path.basename(s.path) for s in group]
+        merged.write_index()
+        os.replace(final_path + ".tmp", final_path)
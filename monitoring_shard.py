@@ -0,0 +1,267 @@
+import time
+import zlib
+import logging
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Dict, List, Optional, Tuple
+
+from monitoring_system_v3 import ICollector, Metric
+from monitoring_codec import decode_batch, encode_batch
+
+logger = logging.getLogger(__name__)
+
+# --- Sharded Collection ---
+
+def shard_for(collector: ICollector, shards: int) -> int:
+    """Stable shard assignment by collector identity (its name)."""
+    return zlib.crc32(collector.name.encode("utf-8")) % shards
+
+def _shard_main(conn, collectors: List[Tuple[int, ICollector]]):
+    """
+    Worker process loop. On ("collect", cycle, wanted) it runs its
+    collectors (only those whose index is in `wanted`, unless it is None)
+    and replies with (cycle, [(index, payload, elapsed, error), ...]) where
+    payload is a binary-encoded metric batch.
+    """
+    try:
+        while True:
+            try:
+                command, cycle, wanted = conn.recv()
+            except EOFError:
+                return
+            if command == "stop":
+                return
+            results = []
+            for index, collector in collectors:
+                if wanted is not None and index not in wanted:
+                    continue
+                start = time.perf_counter()
+                try:
+                    payload = encode_batch(collector.collect())
+                    error = None
+                except Exception as e:
+                    payload, error = None, f"{e!r}"
+                results.append((index, payload, time.perf_counter() - start, error))
+            conn.send((cycle, results))
+    except KeyboardInterrupt:
+        return
+    finally:
+        for _, collector in collectors:
+            try:
+                collector.close()
+            except Exception:
+                logger.error(f"Error closing collector {collector.name}:\n{traceback.format_exc()}")
+
+class _Shard:
+    def __init__(self, shard_id: int, collectors: List[Tuple[int, ICollector]]):
+        self.shard_id = shard_id
+        self.collectors = collectors
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self.cycles = 0
+        self.samples = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.last_latency = 0.0
+        # perf_counter() time of the request still unanswered, if any
+        self.outstanding: Optional[float] = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "collectors": len(self.collectors),
+            "alive": bool(self.process is not None and self.process.is_alive()),
+            "busy": self.outstanding is not None,
+            "restarts": self.restarts,
+            "cycles": self.cycles,
+            "samples": self.samples,
+            "bytes": self.bytes,
+            "last_latency": self.last_latency,
+            "samples_per_sec": self.samples / self.busy if self.busy else 0.0,
+        }
+
+class ShardPool:
+    """
+    Runs collectors in `shards` worker processes so collection is not
+    bound to one core by the GIL.
+
+    Collectors are assigned to shards by a hash of their name, so the same
+    collector always lands on the same worker. Given no `collectors`, the
+    pool takes the engine's registered ones in set_shard_pool(); collectors
+    it does not own (registered later, or ones that must stay in this
+    process) are collected by the engine itself. Workers ship each cycle's
+    metrics back over a pipe as binary batches; evaluation and storage
+    stay in the coordinator.
+
+    Workers are started through `start_method` ("forkserver" by default),
+    not forked from the multi-threaded coordinator, so collectors are
+    pickled into them and must be picklable. A worker that dies is
+    restarted on the next cycle; one that has not answered a request for
+    `hang_timeout` seconds is killed and restarted. Until then its
+    collectors are reported as overruns without queueing more requests.
+    """
+
+    def __init__(self, collectors: Optional[List[ICollector]] = None, shards: int = 2,
+                 hang_timeout: float = 60.0, start_method: str = "forkserver"):
+        self.shards_count = max(1, shards)
+        self.hang_timeout = hang_timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._cycle = 0
+        self._started = False
+        self.assign(collectors or [])
+
+    def assign(self, collectors: List[ICollector]):
+        """Spreads `collectors` over the shards; must be called before start()."""
+        if self._started:
+            raise RuntimeError("ShardPool collectors cannot change once started")
+        self.collectors = list(collectors)
+        self._owned = {id(c) for c in self.collectors}
+        assigned: Dict[int, List[Tuple[int, ICollector]]] = {i: [] for i in range(self.shards_count)}
+        for index, collector in enumerate(self.collectors):
+            assigned[shard_for(collector, self.shards_count)].append((index, collector))
+        self.shards = [_Shard(i, assigned[i]) for i in range(self.shards_count)]
+
+    def owns(self, collector: ICollector) -> bool:
+        return id(collector) in self._owned
+
+    def start(self):
+        if self._started or not self.collectors:
+            return self  # nothing assigned yet: set_shard_pool() hands over the engine's
+        self._started = True
+        for shard in self.shards:
+            if shard.collectors:
+                self._spawn(shard)
+        return self
+
+    def _spawn(self, shard: _Shard):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_shard_main, args=(child, shard.collectors), name=f"collector-shard-{shard.shard_id}", daemon=True)
+        process.start()
+        child.close()
+        shard.process, shard.conn = process, parent
+        shard.outstanding = None
+
+    def _ensure_alive(self, shard: _Shard):
+        if shard.process is not None and shard.process.is_alive():
+            if shard.outstanding is None or time.perf_counter() - shard.outstanding < self.hang_timeout:
+                return
+            logger.warning(f"Collector shard {shard.shard_id} has not answered for {self.hang_timeout}s; restarting")
+            shard.process.kill()
+            shard.process.join(1.0)
+        elif shard.process is not None:
+            logger.warning(f"Collector shard {shard.shard_id} died (exit code {shard.process.exitcode}); restarting")
+        if shard.process is not None:
+            shard.restarts += 1
+            shard.conn.close()
+        self._spawn(shard)
+
+    @staticmethod
+    def _drain_late(shard: _Shard):
+        """Discards the reply to a request that already timed out, if it has arrived."""
+        try:
+            while shard.outstanding is not None and shard.conn.poll():
+                shard.conn.recv()
+                shard.outstanding = None
+        except (EOFError, OSError):
+            shard.process.join(1.0)  # died; _ensure_alive restarts it
+
+    def collect_all(self, timeout: float = 10.0, collectors: Optional[List[ICollector]] = None):
+        """
+        Runs one collection cycle on every shard, restricted to `collectors`
+        when given (e.g. the ones a scheduler found due). Returns
+        (results, overruns): results is a list of
+        (collector, metrics, elapsed, error) in registration order, and
+        overruns lists collectors whose shard did not answer in time or
+        is still busy with an earlier cycle. Collectors the pool does not
+        own are ignored.
+        """
+        self.start()
+        self._cycle += 1
+        cycle = self._cycle
+        wanted = None
+        if collectors is not None:
+            ids = {id(c) for c in collectors}
+            wanted = {i for i, c in enumerate(self.collectors) if id(c) in ids}
+        waiting = {}
+        for shard in self.shards:
+            if not any(wanted is None or i in wanted for i, _ in shard.collectors):
+                continue
+            self._drain_late(shard)
+            self._ensure_alive(shard)
+            if shard.outstanding is not None:
+                continue  # still busy; its collectors are overruns
+            try:
+                shard.conn.send(("collect", cycle, wanted))
+                shard.outstanding = time.perf_counter()
+                waiting[shard.conn] = shard
+            except (BrokenPipeError, OSError):
+                shard.process.kill()
+
+        replies: Dict[int, Tuple[Optional[List[Metric]], float, Optional[str]]] = {}
+        deadline = time.monotonic() + timeout
+        while waiting:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for conn in wait(list(waiting), timeout=remaining):
+                shard = waiting.pop(conn)
+                try:
+                    _, results = conn.recv()
+                except (EOFError, OSError):
+                    # Worker crashed mid-cycle; reap it so the next cycle restarts it.
+                    shard.process.join(1.0)
+                    continue
+                sent, shard.outstanding = shard.outstanding, None
+                shard.cycles += 1
+                shard.last_latency = time.perf_counter() - sent
+                shard.busy += shard.last_latency
+                for index, payload, elapsed, error in results:
+                    metrics = decode_batch(payload) if payload is not None else None
+                    if metrics is not None:
+                        shard.samples += len(metrics)
+                        shard.bytes += len(payload)
+                    replies[index] = (metrics, elapsed, error)
+
+        results = []
+        overruns = []
+        for index, collector in enumerate(self.collectors):
+            if wanted is not None and index not in wanted:
+                continue
+            if index in replies:
+                metrics, elapsed, error = replies[index]
+                results.append((collector, metrics, elapsed, error))
+            else:
+                overruns.append(collector)
+        return results, overruns
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        return {shard.shard_id: shard.stats() for shard in self.shards}
+
+    def metrics(self) -> List[Metric]:
+        now = time.time()
+        metrics = []
+        for shard_id, stats in self.stats().items():
+            tags = {"shard": str(shard_id)}
+            for key in ("samples_per_sec", "last_latency", "restarts"):
+                metrics.append(Metric(name=f"shard_{key}", value=float(stats[key]), timestamp=now, tags=dict(tags)))
+        return metrics
+
+    def close(self, timeout: float = 5.0):
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            try:
+                shard.conn.send(("stop", 0, None))
+            except (BrokenPipeError, OSError):
+                pass
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
+                shard.process.join(timeout)
+            shard.conn.close()
+            shard.process = None
@@ -1,12 +1,20 @@
+import os
 import time
 import json
+import math
+import heapq
 import random
 import logging
 import sqlite3
+import bisect
+import itertools
+import threading
+import queue
 import urllib.request
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor, wait
 from dataclasses import dataclass, field
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 from enum import Enum
 from abc import ABC, abstractmethod
 
@@ -29,7 +37,8 @@ class Metric:
     metric_type: MetricType = MetricType.GAUGE
 
     def to_json(self) -> str:
-        return json.dumps(self.__dict__, default=str)
+        fields = dict(self.__dict__, metric_type=self.metric_type.value)
+        return json.dumps(fields, default=str)
 
 # --- Interfaces ---
 
@@ -38,16 +47,48 @@ class ICollector(ABC):
     def collect(self) -> List[Metric]:
         pass
 
+    @property
+    def name(self) -> str:
+        """Identifies the collector in logs and engine statistics."""
+        return type(self).__name__
+
+    def close(self):
+        """Release resources held by the collector."""
+
 class IAlertChannel(ABC):
     @abstractmethod
     def send_alert(self, message: str, severity: str):
         pass
 
+    def close(self):
+        """Deliver anything still pending and release resources."""
+
 class IStorage(ABC):
     @abstractmethod
     def save(self, metric: Metric):
         pass
 
+    def save_batch(self, metrics: List[Metric]):
+        """
+        Saves several metrics at once. Unlike save(), failures are raised so
+        the caller can retry or spill the batch; backends that can write a
+        batch in one go override this.
+        """
+        for metric in metrics:
+            self.save(metric)
+
+    @property
+    def name(self) -> str:
+        """Identifies the backend in logs and engine statistics."""
+        return type(self).__name__
+
+    def flush(self):
+        """Persist any buffered metrics. Unbuffered backends have nothing to do."""
+
+    def close(self):
+        """Release resources held by the backend."""
+        self.flush()
+
 # --- Implementations ---
 
 class SystemResourceCollector(ICollector):
@@ -73,6 +114,10 @@ class WebsiteStatusCollector(ICollector):
     def __init__(self, url: str):
         self.url = url
 
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}({self.url})"
+
     def collect(self) -> List[Metric]:
         metrics = []
         try:
@@ -103,9 +148,111 @@ class ConsoleAlertChannel(IAlertChannel):
         prefix = "[INFO]" if severity == "info" else "[CRITICAL]"
         print(f"{prefix} ALERT: {message}")
 
+def tags_key(tags: Dict[str, str]) -> str:
+    """Canonical JSON form of a tag set, so equal tag sets compare equal in SQL."""
+    return json.dumps(tags, sort_keys=True)
+
+class SeriesRegistry:
+    """
+    Interns (name, tag set) pairs as the integer ids of the `series` table.
+
+    Known series are found with one dict lookup keyed by the name and the
+    tag items, without building JSON; the canonical tags_key() form is
+    computed once when a series is first seen. With
+    `max_series_per_metric` set, samples that would add another series
+    to a name already at the limit are refused and counted per name, so a
+    runaway tag (a request id, a timestamp) cannot flood the database.
+    """
+
+    MAX_REFUSED = 100000
+
+    def __init__(self, max_series_per_metric: Optional[int] = None):
+        self.max_series_per_metric = max_series_per_metric
+        self._ids: Dict[tuple, int] = {}
+        self._refused: set = set()
+        self.counts: Dict[str, int] = {}
+        self.dropped: Dict[str, int] = {}
+
+    def load(self, conn: sqlite3.Connection):
+        """Reads per-name series counts, so limits hold across restarts."""
+        self.counts = dict(conn.execute("SELECT name, COUNT(*) FROM series GROUP BY name"))
+
+    def resolve(self, conn: sqlite3.Connection, metrics: List[Metric]) -> List[Optional[int]]:
+        """
+        Returns the series id of every metric, registering new series
+        (committed right away); None marks a sample refused by the limit.
+        """
+        ids = []
+        lookup = self._ids.get
+        added = []
+        try:
+            for metric in metrics:
+                key = (metric.name, tuple(metric.tags.items()))
+                series_id = lookup(key)
+                if series_id is None:
+                    series_id = self._register(conn, key, metric, added)
+                ids.append(series_id)
+            if added:
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            for key in added:
+                del self._ids[key]
+                self.counts[key[0]] -= 1
+            raise
+        return ids
+
+    def _register(self, conn, key, metric: Metric, added: list) -> Optional[int]:
+        name = metric.name
+        if key in self._refused:
+            self.dropped[name] = self.dropped.get(name, 0) + 1
+            return None
+        tags = tags_key(metric.tags)
+        row = conn.execute("SELECT id FROM series WHERE name = ? AND tags = ?", (name, tags)).fetchone()
+        if row is not None:
+            self._ids[key] = row[0]
+            return row[0]
+        limit = self.max_series_per_metric
+        if limit is not None and self.counts.get(name, 0) >= limit:
+            if len(self._refused) >= self.MAX_REFUSED:
+                self._refused.clear()
+            self._refused.add(key)
+            self.dropped[name] = self.dropped.get(name, 0) + 1
+            return None
+        series_id = conn.execute("INSERT INTO series (name, tags) VALUES (?, ?)", (name, tags)).lastrowid
+        self._ids[key] = series_id
+        self.counts[name] = self.counts.get(name, 0) + 1
+        added.append(key)
+        return series_id
+
+    def top_offenders(self, n: int = 10) -> List[Tuple[str, int, int]]:
+        """(name, series count, dropped samples) for the names with the most drops, then most series."""
+        names = set(self.counts) | set(self.dropped)
+        ranked = sorted(names, key=lambda name: (self.dropped.get(name, 0), self.counts.get(name, 0)), reverse=True)
+        return [(name, self.counts.get(name, 0), self.dropped.get(name, 0)) for name in ranked[:n]]
+
+    def metrics(self, n: int = 10) -> List[Metric]:
+        now = time.time()
+        metrics = []
+        for name, count, dropped in self.top_offenders(n):
+            tags = {"metric": name}
+            metrics.append(Metric(name="series_cardinality", value=float(count), timestamp=now, tags=tags))
+            metrics.append(Metric(name="series_dropped_total", value=float(dropped), timestamp=now,
+                                  tags=dict(tags), metric_type=MetricType.COUNTER))
+        return metrics
+
 class SQLiteStorage(IStorage):
-    def __init__(self, db_path: str = "metrics.db"):
+    """
+    Stores samples as (timestamp, value, series_id) rows. Names and tag
+    sets live once in the `series` table; see SeriesRegistry for the id
+    cache and the per-name cardinality limit.
+    """
+
+    INSERT_SQL = "INSERT INTO metrics (timestamp, value, series_id) VALUES (?, ?, ?)"
+
+    def __init__(self, db_path: str = "metrics.db", max_series_per_metric: Optional[int] = None):
         self.db_path = db_path
+        self.registry = SeriesRegistry(max_series_per_metric)
         self._init_db()
 
     def _init_db(self):
@@ -116,25 +263,332 @@ class SQLiteStorage(IStorage):
                     timestamp REAL,
                     name TEXT,
                     value REAL,
-                    tags TEXT
+                    tags TEXT,
+                    series_id INTEGER
                 )
             """)
+            # One row per distinct (name, tag set); samples refer to it by id.
+            has_series = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'series'").fetchone()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS series (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    UNIQUE (name, tags)
+                )
+            """)
+            if not has_series:
+                conn.execute("INSERT OR IGNORE INTO series (name, tags) "
+                             "SELECT DISTINCT name, COALESCE(tags, '{}') FROM metrics WHERE name IS NOT NULL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(metrics)")]
+            if "series_id" not in columns:
+                # Databases from before series ids: point old rows at their
+                # series once; their name/tags text is left in place.
+                conn.execute("ALTER TABLE metrics ADD COLUMN series_id INTEGER")
+                conn.execute("""
+                    UPDATE metrics SET series_id = (
+                        SELECT s.id FROM series s
+                        WHERE s.name = metrics.name AND s.tags = COALESCE(metrics.tags, '{}'))
+                """)
+            conn.execute("DROP INDEX IF EXISTS idx_metrics_name_ts")
+            conn.execute("DROP INDEX IF EXISTS idx_metrics_series_ts")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_series_id_ts ON metrics (series_id, timestamp)")
+            self.registry.load(conn)
+
+    def _rows(self, conn: sqlite3.Connection, metrics: List[Metric]) -> List[tuple]:
+        ids = self.registry.resolve(conn, metrics)
+        return [(m.timestamp, m.value, series_id) for m, series_id in zip(metrics, ids) if series_id is not None]
 
     def save(self, metric: Metric):
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    "INSERT INTO metrics (timestamp, name, value, tags) VALUES (?, ?, ?, ?)",
-                    (
-                        metric.timestamp,
-                        metric.name,
-                        metric.value,
-                        json.dumps(metric.tags)
-                    )
-                )
+            self.save_batch([metric])
         except Exception as e:
             logger.error(f"Error saving to SQLite: {e}")
 
+    def save_batch(self, metrics: List[Metric]):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = self._rows(conn, metrics)
+            with conn:
+                conn.executemany(self.INSERT_SQL, rows)
+        finally:
+            conn.close()
+
+    def metrics(self) -> List[Metric]:
+        """Cardinality of the names with the most series or refused samples."""
+        return self.registry.metrics()
+
+class BufferedSQLiteStorage(SQLiteStorage):
+    """
+    SQLite backend tuned for high write rates.
+
+    Keeps a single long-lived connection in WAL mode and buffers samples in
+    memory, writing them with one executemany() per batch. A batch is
+    flushed when it reaches `batch_size` rows or when `flush_interval`
+    seconds have passed since the last flush. Once `max_pending` rows are
+    waiting, save() flushes inline so the buffer stays bounded.
+    """
+
+    def __init__(self, db_path: str = "metrics.db", batch_size: int = 1000,
+                 flush_interval: float = 1.0, max_pending: int = 100000,
+                 synchronous: str = "NORMAL", max_series_per_metric: Optional[int] = None):
+        super().__init__(db_path, max_series_per_metric)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self._pending: List[Metric] = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._last_flush = time.monotonic()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="sqlite-flusher", daemon=True)
+        self._flusher.start()
+
+    def save(self, metric: Metric):
+        with self._lock:
+            if self._conn is None:
+                raise RuntimeError("BufferedSQLiteStorage is closed")
+            self._pending.append(metric)
+            pending = len(self._pending)
+        if pending >= self.batch_size or pending >= self.max_pending:
+            self.flush()
+
+    def save_batch(self, metrics: List[Metric]):
+        """Writes `metrics`, and anything already buffered, in one transaction."""
+        with self._lock:
+            if self._conn is None:
+                raise RuntimeError("BufferedSQLiteStorage is closed")
+            buffered, self._pending = self._pending, []
+            try:
+                self._write_locked(buffered + list(metrics))
+            except Exception:
+                self._pending[:0] = buffered
+                raise
+            self._last_flush = time.monotonic()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending or self._conn is None:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            self._write_locked(pending)
+        except Exception as e:
+            logger.error(f"Error flushing {len(pending)} metrics to SQLite: {e}")
+
+    def _write_locked(self, metrics: List[Metric]):
+        rows = self._rows(self._conn, metrics)
+        with self._conn:
+            self._conn.executemany(self.INSERT_SQL, rows)
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval / 2):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def metrics(self) -> List[Metric]:
+        return [Metric(name="storage_queue_depth", value=float(self.pending), tags={"backend": self.name})] + super().metrics()
+
+# --- Instrumentation ---
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram. Bucket bounds double from 1 µs to
+    ~67 s, so observe() is one bisect and two additions.
+    """
+    BOUNDS = [1e-6 * 2 ** i for i in range(27)]
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+class EngineInstrumentation:
+    """
+    Timings and counters for MonitoringEngine's hot paths.
+
+    Latencies are recorded per call (one collect(), one batch of saves to
+    a backend, one evaluation pass, one cycle), never per sample; per
+    sample the engine only bumps a counter. Metrics from components with a
+    metrics() method (queue depths and the like) are included in the
+    emitted self-metrics.
+    """
+
+    def __init__(self):
+        self.timings: Dict[tuple, LatencyHistogram] = {}
+        self.counters: Dict[str, float] = {
+            "cycles": 0, "samples": 0, "overruns": 0, "errors": 0, "skipped": 0,
+        }
+        self.last_cycle_samples = 0
+        self.sources: List[Any] = []
+
+    def observe(self, kind: str, name: str, seconds: float):
+        key = (kind, name)
+        histogram = self.timings.get(key)
+        if histogram is None:
+            histogram = self.timings[key] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"counters": dict(self.counters)}
+
+    def set_state(self, state: Dict[str, Any]):
+        """Continues the monitoring_*_total counters from a checkpoint instead of restarting at 0."""
+        for name, value in state.get("counters", {}).items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_source(self, component):
+        if callable(getattr(component, "metrics", None)):
+            self.sources.append(component)
+
+    def snapshot(self) -> Dict[str, Any]:
+        timings: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (kind, name), histogram in self.timings.items():
+            timings.setdefault(kind, {})[name] = histogram.snapshot()
+        return {
+            "counters": dict(self.counters),
+            "last_cycle_samples": self.last_cycle_samples,
+            "timings": timings,
+        }
+
+    def to_metrics(self) -> List[Metric]:
+        now = time.time()
+        metrics = [
+            Metric(name=f"monitoring_{name}_total", value=float(value), timestamp=now,
+                   metric_type=MetricType.COUNTER)
+            for name, value in self.counters.items()
+        ]
+        metrics.append(Metric(name="monitoring_samples_per_cycle", value=float(self.last_cycle_samples),
+                              timestamp=now))
+        for (kind, name), histogram in self.timings.items():
+            snap = histogram.snapshot()
+            for stat in ("p50", "p99", "max"):
+                metrics.append(Metric(name=f"monitoring_{kind}_seconds", value=snap[stat], timestamp=now,
+                                      tags={kind: name, "stat": stat}))
+        for source in self.sources:
+            try:
+                metrics.extend(source.metrics())
+            except Exception as e:
+                logger.error(f"Error reading self-metrics from {type(source).__name__}: {e}")
+        return metrics
+
+# --- Scheduling ---
+
+class CollectorScheduler:
+    """
+    Decides which collectors are due, on a monotonic clock.
+
+    Each entry keeps its own interval and is rescheduled on a fixed grid
+    (previous due time + interval), so cycle time does not accumulate as
+    drift. `jitter` spreads first runs over that fraction of the interval
+    so collectors registered together do not all fire at once. When a run
+    is late by more than an interval, policy "skip" drops the missed runs
+    and resumes on the next grid slot; "catch_up" runs them back to back,
+    up to `max_catch_up` of them, before skipping the rest.
+    """
+
+    POLICIES = ("skip", "catch_up")
+
+    def __init__(self, policy: str = "skip", max_catch_up: int = 3, clock=time.monotonic):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy!r}; expected one of {self.POLICIES}")
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.skipped = 0
+        self._heap: List[list] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, key, interval: float, jitter: float = 0.0, now: Optional[float] = None):
+        if interval <= 0:
+            raise ValueError(f"Interval must be positive, got {interval}")
+        now = self.clock() if now is None else now
+        due = now + random.uniform(0.0, jitter * interval) if jitter > 0 else now
+        heapq.heappush(self._heap, [due, next(self._seq), key, interval, 0, len(self._heap)])
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> list:
+        """
+        Returns the keys due at `now`, in the order they were added, and
+        schedules their next run.
+        """
+        now = self.clock() if now is None else now
+        due = []
+        rescheduled = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            due_at, _, key, interval, behind, rank = entry
+            due.append((rank, key))
+            next_at = due_at + interval
+            if next_at > now:
+                behind = 0
+            elif self.policy == "catch_up" and behind < self.max_catch_up:
+                behind += 1
+            else:
+                missed = math.floor((now - due_at) / interval)
+                self.skipped += missed
+                next_at = due_at + (missed + 1) * interval
+                behind = 0
+            entry[0], entry[1], entry[4] = next_at, next(self._seq), behind
+            rescheduled.append(entry)
+        for entry in rescheduled:
+            heapq.heappush(self._heap, entry)
+        return [key for _, key in sorted(due, key=lambda item: item[0])]
+
 # --- Engine ---
 
 class MonitoringEngine:
@@ -143,18 +597,72 @@ class MonitoringEngine:
         self.collectors: List[ICollector] = []
         self.alert_channels: List[IAlertChannel] = []
         self.storage_backends: List[IStorage] = []
+        # Optional rule engine (see monitoring_rules.RuleEngine). When set it
+        # replaces the flat config["thresholds"] lookup in _evaluate.
+        self.rule_engine = None
+        # Optional monitoring_shard.ShardPool; when set, collectors run in
+        # worker processes instead of this one.
+        self.shard_pool = None
+        # Optional monitoring_checkpoint.Checkpointer for warm restarts
+        self.checkpointer = None
         self._running = False
+        self._stopped = False
+        self._stop_event = threading.Event()
+        self._loop_done = threading.Event()
+        self._loop_thread: Optional[threading.Thread] = None
+        self._finished = None
+        self._shard_lock = threading.Lock()
+        self._executor_lock = threading.Lock()
+        # Per-collector intervals (by id) for start()'s scheduler; collectors
+        # without one use config["interval"].
+        self.intervals: Dict[int, float] = {}
+        self.scheduler: Optional[CollectorScheduler] = None
+        # Concurrent mode bookkeeping
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[int, Any] = {}
+        self.overruns: Dict[str, int] = {}
+        self.last_overruns: List[str] = []
+        self.instrumentation = EngineInstrumentation()
 
-    def register_collector(self, collector: ICollector):
+    def register_collector(self, collector: ICollector, interval: Optional[float] = None):
         self.collectors.append(collector)
+        self.instrumentation.add_source(collector)
+        if interval is not None:
+            self.intervals[id(collector)] = interval
 
     def register_alerter(self, channel: IAlertChannel):
         self.alert_channels.append(channel)
+        self.instrumentation.add_source(channel)
 
     def register_storage(self, storage: IStorage):
         self.storage_backends.append(storage)
+        self.instrumentation.add_source(storage)
+
+    def set_rule_engine(self, rule_engine):
+        self.rule_engine = rule_engine
+
+    def set_shard_pool(self, shard_pool):
+        """
+        Runs collectors in `shard_pool`'s worker processes. A pool created
+        without collectors takes the ones registered so far; collectors it
+        does not own keep running in this process.
+        """
+        if not shard_pool.collectors:
+            shard_pool.assign(self.collectors)
+        self.shard_pool = shard_pool
+        self.instrumentation.add_source(shard_pool)
+
+    def set_checkpointer(self, checkpointer):
+        """Attaches a checkpointer and restores the last snapshot into registered components."""
+        self.checkpointer = checkpointer
+        self.instrumentation.add_source(checkpointer)
+        checkpointer.restore(self)
 
     def _evaluate(self, metric: Metric):
+        if self.rule_engine is not None:
+            for event in self.rule_engine.evaluate(metric):
+                self._trigger_alert(event.message, severity=event.severity)
+            return
         threshold = self.config["thresholds"].get(metric.name)
         if threshold and metric.value > threshold:
             msg = f"{metric.name} is high: {metric.value:.2f} (Threshold: {threshold})"
@@ -166,28 +674,282 @@ class MonitoringEngine:
         for channel in self.alert_channels:
             channel.send_alert(message, severity)
 
-    def run_once(self):
+    def _process(self, metrics: List[Metric], count_samples: bool = True):
+        instrumentation = self.instrumentation
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        for metric in metrics:
+            self._evaluate(metric)
+        instrumentation.observe("evaluate", "engine", perf_counter() - start)
+        for storage in self.storage_backends:
+            start = perf_counter()
+            for metric in metrics:
+                storage.save(metric)
+            instrumentation.observe("storage", storage.name, perf_counter() - start)
+        if count_samples:
+            instrumentation.counters["samples"] += len(metrics)
+            instrumentation.last_cycle_samples += len(metrics)
+
+    @staticmethod
+    def _timed_collect(collector: ICollector):
+        start = time.perf_counter()
+        metrics = collector.collect()
+        return metrics, time.perf_counter() - start
+
+    def run_once(self, collectors: Optional[List[ICollector]] = None):
+        """Runs one cycle over `collectors` (default: all registered ones)."""
+        if collectors is None:
+            collectors = self.collectors
+        self._finish_cycle(*self._collect_cycle(collectors))
+
+    def _collect_cycle(self, collectors: List[ICollector]):
+        """
+        Collection half of a cycle: returns (results, overran, started),
+        results being (collector, metrics, elapsed, error) in registration
+        order. Evaluation, storage and instrumentation are left to
+        _finish_cycle, so start() can collect several due groups at once
+        while processing stays on its own thread.
+        """
         logger.info("Starting collection cycle...")
-        for collector in self.collectors:
+        started = time.perf_counter()
+        pool = self.shard_pool
+        if pool is None:
+            results, overran = self._collect_locally(collectors)
+            return results, overran, started
+        local = [c for c in collectors if not pool.owns(c)]
+        with self._shard_lock:
+            results, overran = pool.collect_all(self.config.get("collector_timeout", 10.0),
+                                                [c for c in collectors if pool.owns(c)])
+        if local:
+            local_results, local_overran = self._collect_locally(local)
+            order = {id(c): i for i, c in enumerate(collectors)}
+            results = sorted(results + local_results, key=lambda result: order[id(result[0])])
+            overran = overran + local_overran
+        return results, overran, started
+
+    def _collect_locally(self, collectors: List[ICollector]):
+        if self.config.get("max_workers", 1) > 1:
+            return self._collect_concurrently(collectors)
+        return [self._collect_one(collector) for collector in collectors], []
+
+    @classmethod
+    def _collect_one(cls, collector: ICollector):
+        start = time.perf_counter()
+        try:
+            metrics, elapsed = cls._timed_collect(collector)
+            return collector, metrics, elapsed, None
+        except Exception as e:
+            return collector, None, time.perf_counter() - start, e
+
+    def _finish_cycle(self, results: list, overran: List[ICollector], started: float):
+        instrumentation = self.instrumentation
+        instrumentation.last_cycle_samples = 0
+        self.last_overruns = []
+        for collector in overran:
+            self._record_overrun(collector)
+        for collector, metrics, elapsed, error in results:
+            instrumentation.observe("collector", collector.name, elapsed)
+            if error is not None:
+                instrumentation.counters["errors"] += 1
+                logger.error(f"Error collecting metrics from {collector.name}: {error}")
+                continue
+            try:
+                self._process(metrics)
+            except Exception as e:
+                instrumentation.counters["errors"] += 1
+                logger.error(f"Error processing metrics from {collector.name}: {e}")
+        instrumentation.counters["cycles"] += 1
+        instrumentation.observe("cycle", "engine", time.perf_counter() - started)
+        if self.config.get("self_metrics", True):
+            try:
+                self._process(instrumentation.to_metrics(), count_samples=False)
+            except Exception as e:
+                logger.error(f"Error processing self-metrics: {e}")
+        if self.checkpointer is not None:
+            self.checkpointer.maybe_checkpoint(self)
+
+    def _collect_concurrently(self, collectors: List[ICollector]):
+        """
+        Fans collectors out over a thread pool and waits at most
+        `collector_timeout` seconds for them. Results come back in
+        registration order; collectors that miss the deadline are returned
+        as overruns and their late results are discarded. A collector
+        still running from an earlier cycle is not resubmitted.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config["max_workers"], thread_name_prefix="collector")
+        submitted = []
+        for collector in collectors:
+            future = self._in_flight.get(id(collector))
+            if future is None or future.done():
+                future = self._executor.submit(self._timed_collect, collector)
+                self._in_flight[id(collector)] = future
+            submitted.append((collector, future))
+
+        done, _ = wait([f for _, f in submitted], timeout=self.config.get("collector_timeout", 10.0))
+
+        results = []
+        overran = []
+        for collector, future in submitted:
+            if future not in done:
+                overran.append(collector)
+                continue
             try:
-                metrics = collector.collect()
-                for metric in metrics:
-                    self._evaluate(metric)
-                    for storage in self.storage_backends:
-                        storage.save(metric)
+                metrics, elapsed = future.result()
+                results.append((collector, metrics, elapsed, None))
             except Exception as e:
-                logger.error(f"Error collecting metrics: {e}")
+                results.append((collector, None, 0.0, e))
+        return results, overran
+
+    def _record_overrun(self, collector: ICollector):
+        self.last_overruns.append(collector.name)
+        self.overruns[collector.name] = self.overruns.get(collector.name, 0) + 1
+        self.instrumentation.counters["overruns"] += 1
+        logger.warning(f"Collector {collector.name} overran its deadline")
+
+    def _build_scheduler(self) -> CollectorScheduler:
+        scheduler = CollectorScheduler(
+            policy=self.config.get("overrun_policy", "skip"),
+            max_catch_up=self.config.get("max_catch_up", 3))
+        now = scheduler.clock()
+        for collector in self.collectors:
+            interval = self.intervals.get(id(collector), self.config["interval"])
+            scheduler.add(collector, interval, jitter=self.config.get("jitter", 0.0), now=now)
+        return scheduler
 
     def start(self):
+        """
+        Runs collectors on their own intervals until stop(). Collectors with
+        the same interval that come due together are collected as one
+        cycle. Cycles are collected on up to config["max_cycles"] threads,
+        so a slow group does not hold back the others; their results are
+        evaluated and stored on this thread as they finish. A collector
+        whose previous run is still going misses that slot: with policy
+        "skip" it is skipped, with "catch_up" up to max_catch_up missed
+        slots are run back to back once the collector is free.
+        """
         self._running = True
+        self._stopped = False
+        self._stop_event.clear()
+        self._loop_done.clear()
+        self._loop_thread = threading.current_thread()
+        self.scheduler = scheduler = self._build_scheduler()
+        finished: "queue.Queue" = queue.Queue()
+        self._finished = finished
+        pool = ThreadPoolExecutor(max_workers=self.config.get("max_cycles", 4), thread_name_prefix="cycle")
+        busy: set = set()
+        # missed slots of busy collectors, by id, still to run ("catch_up")
+        owed: Dict[int, int] = {}
+        catch_up = scheduler.policy == "catch_up"
+        interrupted = False
         logger.info("Monitoring System v3 Started.")
         try:
-            while self._running:
-                self.run_once()
-                time.sleep(self.config["interval"])
+            while self._running and len(scheduler):
+                delay = scheduler.next_due() - scheduler.clock()
+                if delay > 0:
+                    try:
+                        item = finished.get(timeout=delay)
+                    except queue.Empty:
+                        item = None
+                    if item is not None:
+                        self._finish_group(item, busy)
+                        replay = [c for c in item[0] if owed.get(id(c))]
+                        for collector in replay:
+                            owed[id(collector)] -= 1
+                        if replay and self._running:
+                            self._dispatch(replay, busy, pool, finished)
+                        continue
+                    if self._stop_event.is_set():
+                        break
+                skipped = scheduler.skipped
+                due = scheduler.pop_due()
+                ready = []
+                missed = 0
+                for collector in due:
+                    if id(collector) not in busy:
+                        ready.append(collector)
+                    elif catch_up and owed.get(id(collector), 0) < scheduler.max_catch_up:
+                        owed[id(collector)] = owed.get(id(collector), 0) + 1
+                    else:
+                        missed += 1
+                self.instrumentation.counters["skipped"] += scheduler.skipped - skipped + missed
+                self._dispatch(ready, busy, pool, finished)
         except KeyboardInterrupt:
+            interrupted = True
+            self._running = False
+        finally:
+            # let running groups finish so their samples are stored before stop() closes storage
+            pool.shutdown(wait=True)
+            while busy:
+                item = finished.get()
+                if item is not None:
+                    self._finish_group(item, busy)
+            self._loop_done.set()
+        if interrupted:
             self.stop()
 
+    def _dispatch(self, collectors: List[ICollector], busy: set, pool: ThreadPoolExecutor,
+                  finished: "queue.Queue"):
+        """Submits `collectors` as one cycle per interval and marks them busy."""
+        groups: Dict[float, List[ICollector]] = {}
+        for collector in collectors:
+            groups.setdefault(self.intervals.get(id(collector), self.config["interval"]), []).append(collector)
+        for group in groups.values():
+            if not self._running:
+                break
+            busy.update(id(c) for c in group)
+            pool.submit(self._collect_group, group, finished)
+
+    def _collect_group(self, group: List[ICollector], finished: "queue.Queue"):
+        try:
+            finished.put((group, self._collect_cycle(group)))
+        except Exception as e:
+            logger.error(f"Error collecting cycle: {e}")
+            finished.put((group, None))
+
+    def _finish_group(self, item, busy: set):
+        group, cycle = item
+        busy.difference_update(id(c) for c in group)
+        if cycle is not None:
+            self._finish_cycle(*cycle)
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._running = False
+        self._stop_event.set()
+        if self._finished is not None:
+            self._finished.put(None)  # wake the scheduler loop
+        if self._loop_thread is not None and self._loop_thread is not threading.current_thread():
+            self._loop_done.wait(self.config.get("collector_timeout", 10.0) + 5.0)
+        self._stopped = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.checkpointer is not None:
+            self.checkpointer.checkpoint(self)
+            self.checkpointer.close()
+        if self.shard_pool is not None:
+            self.shard_pool.close()
+        for collector in self.collectors:
+            try:
+                collector.close()
+            except Exception as e:
+                logger.error(f"Error closing collector {collector.name}: {e}")
+        for channel in self.alert_channels:
+            try:
+                channel.close()
+            except Exception as e:
+                logger.error(f"Error closing alert channel: {e}")
+        for storage in self.storage_backends:
+            try:
+                storage.close()
+            except Exception as e:
+                logger.error(f"Error closing storage backend: {e}")
+        logger.info("Monitoring System v3 Stopped.")
+
 # --- Configuration & Entry Point ---
 
 CONFIG = {
@@ -195,15 +957,57 @@ CONFIG = {
         "cpu_usage": 80.0,
         "memory_usage": 75.0
     },
-    "interval": 2
+    "interval": 2,
+    # Seconds between runs for collectors registered without their own
+    # interval. First runs are spread over `jitter` of the interval; late
+    # runs are skipped ("skip") or replayed up to max_catch_up ("catch_up").
+    "jitter": 0.1,
+    "overrun_policy": "skip",
+    "max_catch_up": 3,
+    # Collectors run in parallel when max_workers > 1; each cycle waits at
+    # most collector_timeout seconds for them.
+    "max_workers": 8,
+    "collector_timeout": 10.0,
+    # New series per metric name beyond this are refused by SQLite storage
+    "max_series_per_metric": 10000,
+    # StorageRouter spill files for batches a backend could not take yet;
+    # replayed after a restart, so keep it out of temporary directories
+    "spill_dir": os.path.join(os.path.dirname(os.path.abspath(__file__)), "spill"),
+    # Emit the engine's own timings and counters as monitoring_* metrics
+    "self_metrics": True
 }
 
 if __name__ == "__main__":
+    from monitoring_probes import HttpProbeCollector
+    from monitoring_rollup import RollupManager
+    from monitoring_rules import RuleEngine
+    from monitoring_alerts import AlertDispatcher
+    from monitoring_proc import ProcResourceCollector
+    from monitoring_router import StorageRouter
+    from monitoring_ingest import IngestServer
+    from monitoring_checkpoint import Checkpointer
+    from monitoring_accesslog import AccessLogCollector
+    from monitoring_realtime import RealtimeCollector
+
     engine = MonitoringEngine(CONFIG)
-    engine.register_collector(SystemResourceCollector())
-    engine.register_collector(WebsiteStatusCollector("http://example.com"))
-    engine.register_alerter(ConsoleAlertChannel())
-    engine.register_storage(SQLiteStorage("history.db"))
+    engine.set_rule_engine(RuleEngine.from_config(CONFIG))
+    if os.path.exists("/proc/stat"):
+        engine.register_collector(ProcResourceCollector(), interval=1)
+    else:
+        engine.register_collector(SystemResourceCollector())
+    engine.register_collector(HttpProbeCollector(["http://example.com"]), interval=60)
+    engine.register_alerter(AlertDispatcher([ConsoleAlertChannel()]))
+    engine.register_storage(StorageRouter([BufferedSQLiteStorage("history.db", max_series_per_metric=CONFIG["max_series_per_metric"])],
+                                          spill_dir=CONFIG["spill_dir"]))
+    engine.register_collector(IngestServer().start(), interval=1)
+    if os.path.exists("http_server.log"):
+        engine.register_collector(AccessLogCollector(["http_server.log"]), interval=10)
+    # Event feed of server.js (PORT defaults to 3000); reconnects with backoff until it is up
+    engine.register_collector(RealtimeCollector(f"ws://localhost:{os.environ.get('PORT', 3000)}/ws").start(), interval=1)
+    engine.set_checkpointer(Checkpointer("engine.state"))
+    rollups = RollupManager("history.db")
+    rollups.start()
     
     print("Press Ctrl+C to stop the monitoring system.")
-    engine.start()
\ No newline at end of file
+    engine.start()
+    rollups.stop()
\ No newline at end of file
@@ -0,0 +1,284 @@
+import os
+import re
+import sys
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Shared engine behind the fix_*.py scripts. A patch names an anchor (an
+# exact snippet of the page) and the text to put there; the engine finds
+# every anchor of a file in one regex scan, applies all edits in a single
+# rebuild, and records what it replaced in a small journal next to the
+# file instead of copying the whole page.
+
+REPLACE = "replace"                       # anchor -> text
+INSERT_BEFORE = "insert_before"           # text + anchor
+INSERT_AFTER_LINE = "insert_after_line"   # line containing anchor, then text
+
+JOURNAL_SUFFIX = ".patchlog"
+PATCH_MODULES = ("fix_hourly_chart", "fix_layout")
+SKIP_DIRS = {"node_modules", ".git", "__pycache__"}
+
+@dataclass(frozen=True)
+class Patch:
+    name: str
+    anchor: str
+    text: str
+    mode: str = REPLACE
+    marker: Optional[str] = None  # present once applied; defaults to `text`
+    files: str = "*.html"         # glob matched against the relative path or the file name
+    group: str = ""               # patches of one group are applied all or nothing
+
+    @property
+    def applied_marker(self) -> str:
+        return self.marker or self.text
+
+@dataclass
+class PatchResult:
+    path: str
+    applied: List[str] = field(default_factory=list)
+    already_applied: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    held_back: List[str] = field(default_factory=list)  # applicable, but their group was incomplete
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.missing
+
+@lru_cache(maxsize=64)
+def _needle_pattern(needles: Tuple[str, ...]):
+    # Longest first, so a snippet wins over a shorter one starting at the same place
+    return re.compile("|".join(re.escape(n) for n in sorted(needles, key=len, reverse=True)))
+
+def find_all(content: str, needles: Tuple[str, ...]) -> Dict[str, int]:
+    """Offset of the first occurrence of each needle, found in one scan."""
+    found: Dict[str, int] = {}
+    for match in _needle_pattern(needles).finditer(content):
+        found.setdefault(match.group(), match.start())
+        if len(found) == len(needles):
+            break
+    for needle in needles:
+        if needle not in found:
+            # A needle overlapping an earlier match is skipped by the scan
+            pos = content.find(needle)
+            if pos != -1:
+                found[needle] = pos
+    return found
+
+def plan(content: str, patches: List[Patch], result: PatchResult) -> List[Tuple[int, int, str]]:
+    """Edits (start, end, text) for the patches not applied yet, ordered by position."""
+    needles = tuple(sorted({p.anchor for p in patches} | {p.applied_marker for p in patches}))
+    found = find_all(content, needles)
+    edits = []
+    for patch in patches:
+        if patch.applied_marker in found:
+            result.already_applied.append(patch.name)
+            continue
+        pos = found.get(patch.anchor)
+        if pos is None:
+            result.missing.append(patch.name)
+            continue
+        if patch.mode == REPLACE:
+            edits.append((pos, pos + len(patch.anchor), patch.text, patch.name))
+        elif patch.mode == INSERT_BEFORE:
+            edits.append((pos, pos, patch.text, patch.name))
+        elif patch.mode == INSERT_AFTER_LINE:
+            eol = content.find("\n", pos)
+            at = len(content) if eol == -1 else eol + 1
+            edits.append((at, at, patch.text, patch.name))
+        else:
+            raise ValueError(f"unknown patch mode {patch.mode!r} in {patch.name}")
+    edits.sort(key=lambda e: e[:2])
+    accepted = []
+    end = -1
+    for start, stop, text, name in edits:
+        if start < end:
+            result.missing.append(name)  # overlaps an earlier patch
+            continue
+        accepted.append((start, stop, text))
+        result.applied.append(name)
+        end = stop
+    return accepted
+
+def rebuild(content: str, edits: List[Tuple[int, int, str]]) -> Tuple[str, List[list]]:
+    """
+    Applies ordered, non-overlapping edits in one pass. Returns the new
+    content and the reverse delta: [offset in new content, new length,
+    original text] per edit.
+    """
+    parts = []
+    delta = []
+    pos = 0
+    shift = 0
+    for start, stop, text in edits:
+        parts.append(content[pos:start])
+        parts.append(text)
+        original = content[start:stop]
+        # Journal only the part that differs: replacements mostly keep their edges
+        limit = min(len(original), len(text))
+        head = len(os.path.commonprefix([original, text]))
+        tail = 0
+        while tail < limit - head and original[-1 - tail] == text[-1 - tail]:
+            tail += 1
+        delta.append([start + shift + head, len(text) - head - tail, original[head:len(original) - tail]])
+        shift += len(text) - (stop - start)
+        pos = stop
+    parts.append(content[pos:])
+    return "".join(parts), delta
+
+def with_newline(patches: List[Patch], newline: str) -> List[Patch]:
+    """
+    Patches are written with "\n"; rewrites anchors, texts and markers
+    to `newline` so they match a CRLF page and keep its line endings.
+    """
+    if newline == "\n":
+        return patches
+    def convert(text):
+        return text.replace("\r\n", "\n").replace("\n", newline) if text is not None else None
+    return [replace(p, anchor=convert(p.anchor), text=convert(p.text), marker=convert(p.marker)) for p in patches]
+
+def _sha1(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def _read(path: str) -> str:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+def _write(path: str, content: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def patch_file(path: str, patches: List[Patch], dry_run: bool = False) -> PatchResult:
+    """
+    Applies `patches` to one file and journals the replaced text for
+    undo(). All or nothing per group: if any patch of a group is missing
+    its anchor, none of that group are written and its applicable ones
+    are reported as held back; the other groups still apply.
+    """
+    start = time.perf_counter()
+    result = PatchResult(path)
+    try:
+        content = _read(path)
+        newline = "\r\n" if "\r\n" in content else "\n"
+        patches = with_newline(patches, newline)
+        edits = plan(content, patches, result)
+        if result.missing:
+            broken = {p.group for p in patches if p.name in result.missing}
+            kept = PatchResult(path)
+            edits = plan(content, [p for p in patches if p.group not in broken], kept)
+            result.held_back = [name for name in result.applied if name not in kept.applied]
+            result.applied = kept.applied
+        if edits and not dry_run:
+            new_content, delta = rebuild(content, edits)
+            entry = {"time": time.time(), "patches": result.applied, "before": _sha1(content),
+                     "after": _sha1(new_content), "edits": delta}
+            with open(path + JOURNAL_SUFFIX, "a", encoding="utf-8") as journal:
+                journal.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            _write(path, new_content)
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        result.error = str(e)
+    result.seconds = time.perf_counter() - start
+    return result
+
+def undo(path: str) -> List[str]:
+    """Reverts the last journaled run on `path`; returns the names of the patches it removed."""
+    journal_path = path + JOURNAL_SUFFIX
+    with open(journal_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    if not lines:
+        return []
+    entry = json.loads(lines[-1])
+    content = _read(path)
+    if _sha1(content) != entry["after"]:
+        raise ValueError(f"{path} changed since it was patched; refusing to undo")
+    parts = []
+    pos = 0
+    for start, length, original in entry["edits"]:
+        parts.append(content[pos:start])
+        parts.append(original)
+        pos = start + length
+    parts.append(content[pos:])
+    restored = "".join(parts)
+    if _sha1(restored) != entry["before"]:
+        raise ValueError(f"journal for {path} does not match its contents")
+    _write(path, restored)
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:-1])
+    return entry["patches"]
+
+def html_files(root: str) -> List[str]:
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        files.extend(os.path.join(dirpath, name) for name in filenames if name.endswith(".html"))
+    return sorted(files)
+
+def apply(patches: List[Patch], root: str = ".", files: Optional[List[str]] = None,
+          workers: int = 8, dry_run: bool = False) -> List[PatchResult]:
+    """
+    Applies a declarative list of patches to every file they match under
+    `root` (or to `files`), one file per worker. Files no patch targets
+    are not read.
+    """
+    targets: Dict[str, List[Patch]] = {}
+    for path in (files if files is not None else html_files(root)):
+        relative = os.path.relpath(path, root).replace(os.sep, "/")
+        name = os.path.basename(path)
+        matching = [p for p in patches if fnmatch.fnmatch(relative, p.files) or fnmatch.fnmatch(name, p.files)]
+        if matching:
+            targets[path] = matching
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(targets))) as pool:
+        return list(pool.map(lambda item: patch_file(item[0], item[1], dry_run), targets.items()))
+
+def print_results(results: List[PatchResult]):
+    for result in results:
+        if result.error:
+            print(f"❌ {result.path}: {result.error}")
+            continue
+        for name in result.applied:
+            print(f"✅ {result.path}: {name}")
+        for name in result.already_applied:
+            print(f"✔️  {result.path}: {name} (already applied)")
+        for name in result.missing:
+            print(f"❌ {result.path}: {name} - anchor not found, the HTML structure may have changed")
+        for name in result.held_back:
+            print(f"⏸️  {result.path}: {name} - not applied, another patch of its group is missing")
+
+def load_patches(modules=PATCH_MODULES) -> List[Patch]:
+    """PATCHES of each fixer module, grouped by module so one stale fixer does not hold back the others."""
+    return [replace(p, group=module) for module in modules for p in importlib.import_module(module).PATCHES]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply all fix_*.py patches to the UI tree in one pass.")
+    parser.add_argument("root", nargs="?", default=".")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--undo", metavar="FILE", help="revert the last patch run on FILE")
+    args = parser.parse_args(argv)
+
+    if args.undo:
+        removed = undo(args.undo)
+        print(f"✅ Reverted {', '.join(removed) or 'nothing'} in {args.undo}")
+        return 0
+
+    patches = load_patches()
+    start = time.perf_counter()
+    results = apply(patches, args.root, dry_run=args.dry_run)
+    print_results(results)
+    print(f"\n{len(results)} files checked in {time.perf_counter() - start:.3f}s")
+    return 0 if all(r.ok for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -198,7 +198,7 @@ async function ensureDB(){
     db.docs = docs;
     await writeDB(db);
     // broadcast to websocket clients that docs changed
-    try{ broadcast({ type: 'docs_updated', docsCount: (db.docs || []).length, counts: computeAdminCounts(db.docs || []) }); }catch(e){}
+    try{ broadcast({ type: 'docs_updated', docsCount: (db.docs || []).length, counts: computeAdminCounts(db.docs || []), ts: Date.now() }); }catch(e){}
     return res.json({ ok:true });
   });
 
@@ -218,7 +218,7 @@ async function ensureDB(){
     if(idx === -1) return res.status(404).json({ error: 'not found' });
     db.docs[idx] = Object.assign({}, db.docs[idx], payload);
     await writeDB(db);
-    try{ broadcast({ type: 'docs_updated', docsCount: (db.docs || []).length, counts: computeAdminCounts(db.docs || []) }); }catch(e){}
+    try{ broadcast({ type: 'docs_updated', docsCount: (db.docs || []).length, counts: computeAdminCounts(db.docs || []), ts: Date.now() }); }catch(e){}
     return res.json({ ok:true, doc: db.docs[idx] });
   });
 
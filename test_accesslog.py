@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from monitoring_accesslog import AccessLogCollector
+
+PING = '127.0.0.1 - - [01/Jan/2026 02:53:44] "GET /api/ping HTTP/1.1" 404 -\n'
+NOT_FOUND = '127.0.0.1 - - [01/Jan/2026 02:53:44] code 404, message File not found\n'
+PAGE = '127.0.0.1 - - [01/Jan/2026 02:53:44] "GET /index.html?v=2 HTTP/1.1" 200 -\n'
+COMBINED = '10.0.0.1 - bob [10/Oct/2025:13:55:36 +0000] "POST /api/users/42 HTTP/1.1" 500 12 "-" "curl"\n'
+
+def _totals(metrics, name="http_requests_total"):
+    return {(m.tags.get("path"), m.tags.get("status")): m.value for m in metrics if m.name == name}
+
+class TestAccessLogCollector(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "http_server.log")
+        self._append(PAGE)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _append(self, text):
+        with open(self.path, "a") as f:
+            f.write(text)
+
+    def test_counts_only_new_lines(self):
+        collector = AccessLogCollector([self.path])
+        self.assertEqual(_totals(collector.collect()), {})  # starts at the end without saved state
+
+        self._append(NOT_FOUND + PING + NOT_FOUND + PING + COMBINED)
+        metrics = collector.collect()
+        self.assertEqual(_totals(metrics), {("/api/ping", "404"): 2.0, ("/api/users/:id", "500"): 1.0})
+        self.assertEqual(_totals(metrics, "http_request_errors_total"),
+                         {("/api/ping", None): 2.0, ("/api/users/:id", None): 1.0})
+
+        self._append(PING)
+        metrics = collector.collect()
+        self.assertEqual(_totals(metrics)[("/api/ping", "404")], 3.0)
+        self.assertEqual([m.value for m in metrics if m.name == "http_error_ratio"], [1.0])
+        collector.close()
+
+    def test_partial_line_waits_for_newline(self):
+        collector = AccessLogCollector([self.path], from_start=True)
+        self._append(PING[:30])
+        self.assertEqual(_totals(collector.collect()), {("/index.html", "200"): 1.0})
+        self._append(PING[30:])
+        self.assertEqual(_totals(collector.collect())[("/api/ping", "404")], 1.0)
+        collector.close()
+
+    def test_rotation_and_truncation(self):
+        collector = AccessLogCollector([self.path], from_start=True)
+        collector.collect()
+
+        self._append(PING)
+        os.rename(self.path, self.path + ".1")
+        self._append(PING + PING)
+        metrics = collector.collect()
+        self.assertEqual(_totals(metrics)[("/api/ping", "404")], 3.0)
+        self.assertEqual({m.name: m.value for m in collector.metrics()}["access_log_rotations_total"], 1.0)
+
+        with open(self.path, "w") as f:
+            f.write(PING)
+        self.assertEqual(_totals(collector.collect())[("/api/ping", "404")], 4.0)
+        collector.close()
+
+    def test_resumes_from_saved_state(self):
+        collector = AccessLogCollector([self.path], from_start=True)
+        collector.collect()
+        self._append(PING)
+        collector.collect()
+        state = collector.get_state()
+        collector.close()
+
+        self._append(PING)
+        restarted = AccessLogCollector([self.path])
+        restarted.set_state(state)
+        totals = _totals(restarted.collect())
+        self.assertEqual(totals, {("/index.html", "200"): 1.0, ("/api/ping", "404"): 2.0})
+        restarted.close()
+
+    def test_caps_distinct_paths(self):
+        collector = AccessLogCollector([self.path], max_paths=2, from_start=True)
+        self._append("".join(f'x - - [t] "GET /page{i}.html HTTP/1.1" 200 -\n' for i in range(5)))
+        totals = _totals(collector.collect())
+        self.assertEqual(len(totals), 3)
+        self.assertEqual(totals[("other", "200")], 4.0)
+        collector.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import time
+import unittest
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from monitoring_system_v3 import IAlertChannel
+from monitoring_alerts import AlertDispatcher, WebhookAlertChannel
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        ReceiverHandler.received.append(json.loads(body))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class SlowChannel(IAlertChannel):
+    def __init__(self, delay: float, failures: int = 0, fail_after: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.fail_after = fail_after  # successful sends before the failures start
+        self.messages = []
+        self.closed = False
+
+    def send_alert(self, message: str, severity: str):
+        time.sleep(self.delay)
+        if self.failures and len(self.messages) >= self.fail_after:
+            self.failures -= 1
+            raise ConnectionError("channel unavailable")
+        self.messages.append(message)
+
+    def close(self):
+        self.closed = True
+
+class TestAlertDispatcher(unittest.TestCase):
+    def test_send_does_not_block_on_slow_channel(self):
+        channel = SlowChannel(delay=0.2)
+        dispatcher = AlertDispatcher([channel], batch_wait=0.0)
+
+        start = time.monotonic()
+        for i in range(5):
+            dispatcher.send_alert(f"alert {i}", "critical")
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.close()
+        self.assertEqual(channel.messages, [f"alert {i}" for i in range(5)])
+
+    def test_drops_when_queue_full(self):
+        channel = SlowChannel(delay=0.2)
+        dispatcher = AlertDispatcher([channel], max_queue=2, batch_size=1, batch_wait=0.0)
+
+        for i in range(10):
+            dispatcher.send_alert(f"alert {i}", "critical")
+        stats = dispatcher.stats()["SlowChannel"]
+        dispatcher.close(timeout=0)
+
+        self.assertGreaterEqual(stats["dropped"], 7)
+        depth = [m for m in dispatcher.metrics() if m.name == "alert_queue_depth"]
+        self.assertEqual(depth[0].tags, {"channel": "SlowChannel"})
+
+    def test_retries_with_backoff(self):
+        channel = SlowChannel(delay=0.0, failures=2)
+        dispatcher = AlertDispatcher([channel], retry_backoff=0.01, batch_wait=0.0)
+
+        dispatcher.send_alert("flaky", "critical")
+        dispatcher.flush(timeout=5)
+        dispatcher.close()
+
+        self.assertEqual(channel.messages, ["flaky"])
+        self.assertEqual(dispatcher.stats()["SlowChannel"]["retries"], 2)
+
+    def test_retry_after_partial_batch_does_not_resend(self):
+        channel = SlowChannel(delay=0.0, failures=1, fail_after=2)
+        dispatcher = AlertDispatcher([channel], retry_backoff=0.01, batch_wait=0.2)
+
+        for i in range(4):
+            dispatcher.send_alert(f"alert {i}", "critical")
+        dispatcher.flush(timeout=5)
+        dispatcher.close()
+
+        self.assertEqual(channel.messages, [f"alert {i}" for i in range(4)])
+        self.assertEqual(dispatcher.stats()["SlowChannel"]["sent"], 4)
+        self.assertTrue(channel.closed)
+
+    def test_webhook_receives_batches(self):
+        ReceiverHandler.received = []
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ReceiverHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/alerts"
+            dispatcher = AlertDispatcher([WebhookAlertChannel(url)], batch_size=10, batch_wait=0.2)
+            for i in range(10):
+                dispatcher.send_alert(f"alert {i}", "critical")
+            dispatcher.flush(timeout=5)
+            dispatcher.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(len(ReceiverHandler.received), 1)
+        self.assertEqual([a["message"] for a in ReceiverHandler.received[0]["alerts"]],
+                         [f"alert {i}" for i in range(10)])
+
+if __name__ == "__main__":
+    unittest.main()
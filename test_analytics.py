@@ -0,0 +1,164 @@
+import os
+import json
+import tempfile
+import unittest
+import http.client
+from monitoring_analytics import AnalyticsServer, CycleCountAnalytics, HOUR_LABELS
+
+FIRST = "1st Shift-(6am-2pm)"
+SECOND = "2nd Shift-(2pm-10pm)"
+
+def _counter(id, date, shift, rate=10, actuals=None, targets=None, **extra):
+    record = {"id": id, "date": date, "shift": shift, "standardRate": rate, "targetOutput": 0,
+              "hourlyActuals": actuals or {}}
+    if targets is not None:
+        record["hourlyTargets"] = targets
+    record.update(extra)
+    return record
+
+def _attendance(id, date, shift, status="Present"):
+    return {"id": id, "date": date, "shift": shift, "userId": id, "name": id, "status": status}
+
+class TestCycleCountAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.analytics = CycleCountAnalytics()
+        self.analytics.sync(
+            counters=[
+                _counter("c1", "2024-05-01", FIRST, rate=20, actuals={"6:00 - 7:00": 5, "7:00 - 8:00": "7"}),
+                _counter("c2", "2024-05-01", SECOND, actuals={"14:00 - 15:00": 3},
+                         targets={"14:00 - 15:00": 4, "15:00 - 16:00": 6}),
+                _counter("c3", "2024-05-02", FIRST, rate=0, targetOutput=80, actuals={"8:00 - 9:00": 9}),
+            ],
+            attendance=[
+                _attendance("a1", "2024-05-01", FIRST),
+                _attendance("a2", "2024-05-01", FIRST),
+                _attendance("a3", "2024-05-01", FIRST, status="Temporary slide to Other task"),
+            ])
+
+    def test_hourly_payload_matches_chart_arithmetic(self):
+        payload = self.analytics.hourly("2024-05-01")
+        self.assertEqual(payload["labels"], HOUR_LABELS)
+        output = dict(zip(HOUR_LABELS, payload["output"]))
+        target = dict(zip(HOUR_LABELS, payload["target"]))
+
+        self.assertEqual(output["6:00 - 7:00"], 5.0)
+        self.assertEqual(output["7:00 - 8:00"], 7.0)
+        self.assertEqual(payload["cumulative"][-1], 15.0)
+        # 3 people * 20/shift spread over 8 hours, rounded like Math.round
+        self.assertEqual(target["6:00 - 7:00"], 8)
+        self.assertEqual(target["13:00 - 14:00"], 8)
+        self.assertEqual(target["14:00 - 15:00"], 4.0)
+        self.assertEqual(target["16:00 - 17:00"], 0.0)
+
+    def test_daily_totals_exclude_temporary_slides(self):
+        daily = self.analytics.daily()
+        self.assertEqual(daily["dates"], ["2024-05-01", "2024-05-02"])
+        self.assertEqual(daily["output"], [15.0, 9.0])
+        self.assertEqual(daily["target"], [2 * 20 + 10.0, 80.0])
+        self.assertEqual(self.analytics.shifts("2024-05-01")["shifts"][FIRST]["headcount"], 2)
+        self.assertEqual(self.analytics.daily(start="2024-05-02")["dates"], ["2024-05-02"])
+
+    def test_changes_only_invalidate_affected_dates(self):
+        self.analytics.day("2024-05-01")
+        day2 = self.analytics.day("2024-05-02")
+        version = self.analytics.version("2024-05-01")
+
+        self.analytics.upsert_attendance([_attendance("a4", "2024-05-01", FIRST)])
+        self.assertIs(self.analytics.day("2024-05-02"), day2)
+        self.assertGreater(self.analytics.version("2024-05-01"), version)
+        self.assertEqual(self.analytics.day("2024-05-01")["target"], 3 * 20 + 10.0)
+
+        # moving a counter to another date invalidates both
+        self.analytics.upsert_counters([_counter("c3", "2024-05-03", FIRST, rate=0, targetOutput=80)])
+        self.assertEqual(self.analytics.dates(), ["2024-05-01", "2024-05-03"])
+
+        version = self.analytics.version("2024-05-01")
+        self.analytics.upsert_counters([self.analytics._counters["c1"]])
+        self.assertEqual(self.analytics.version("2024-05-01"), version)
+
+    def test_in_place_edits_are_picked_up_on_upsert(self):
+        record = _counter("c4", "2024-05-04", FIRST, actuals={"6:00 - 7:00": 1})
+        self.analytics.upsert_counters([record])
+        self.assertEqual(self.analytics.day("2024-05-04")["output"], 1.0)
+
+        record["hourlyActuals"]["7:00 - 8:00"] = 2
+        self.assertEqual(self.analytics.day("2024-05-04")["output"], 1.0)
+        self.analytics.upsert_counters([record])
+        self.assertEqual(self.analytics.day("2024-05-04")["output"], 3.0)
+
+    def test_sync_removes_missing_records_and_loads_exports(self):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            with open(path, "w") as f:
+                json.dump({"users": [], "ims_daily_counters_v1": [_counter("c9", "2024-06-01", FIRST, rate=0)]}, f)
+            self.analytics.load(path)
+            self.assertEqual(self.analytics.dates(), ["2024-06-01"])
+
+            with open(path, "w") as f:
+                json.dump({"users": [], "docs": []}, f)
+            self.analytics.load(path)
+            self.assertEqual(self.analytics.dates(), ["2024-06-01"])
+        finally:
+            os.remove(path)
+
+class TestAnalyticsServer(unittest.TestCase):
+    def setUp(self):
+        analytics = CycleCountAnalytics()
+        analytics.upsert_counters([_counter("c1", "2024-05-01", FIRST, actuals={"9:00 - 10:00": 4})])
+        self.server = AnalyticsServer(analytics, port=0).start()
+        self.conn = http.client.HTTPConnection(*self.server.address, timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.close()
+
+    def _request(self, method, path, body=None, headers=None):
+        self.conn.request(method, path, body=body, headers=headers or {})
+        response = self.conn.getresponse()
+        data = response.read()
+        return response, json.loads(data) if data else None
+
+    def test_serves_payloads_with_etag(self):
+        response, payload = self._request("GET", "/analytics/hourly?date=2024-05-01")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(sum(payload["output"]), 4.0)
+        etag = response.getheader("ETag")
+
+        response, _ = self._request("GET", "/analytics/hourly?date=2024-05-01", headers={"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+
+        body = json.dumps([_counter("c2", "2024-05-01", SECOND, actuals={"15:00 - 16:00": 6})])
+        response, _ = self._request("POST", "/analytics/counters", body=body,
+                                    headers={"Content-Type": "application/json"})
+        self.assertEqual(response.status, 200)
+        response, payload = self._request("GET", "/analytics/hourly?date=2024-05-01", headers={"If-None-Match": etag})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(sum(payload["output"]), 10.0)
+
+        # a restarted server starts its versions over but must not match old tags
+        restarted = CycleCountAnalytics()
+        restarted.upsert_counters([_counter("c1", "2024-05-01", FIRST, actuals={"9:00 - 10:00": 4})])
+        self.assertEqual(restarted.version("2024-05-01"), 1)
+        self.assertNotEqual(restarted.etag("2024-05-01"), etag)
+
+        self.assertEqual(self._request("GET", "/analytics/hourly")[0].status, 400)
+        self.assertEqual(self._request("GET", "/analytics/daily")[1]["output"], [10.0])
+
+    def test_rejects_missing_or_bad_content_length(self):
+        for length in (None, "-1", "ten"):
+            conn = http.client.HTTPConnection(*self.server.address, timeout=5)
+            try:
+                conn.putrequest("POST", "/analytics/counters")
+                conn.putheader("Content-Type", "application/json")
+                if length is not None:
+                    conn.putheader("Content-Length", length)
+                conn.endheaders()
+                response = conn.getresponse()
+                self.assertEqual(response.status, 400)
+                self.assertEqual(json.loads(response.read()), {"error": "bad Content-Length"})
+            finally:
+                conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
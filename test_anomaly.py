@@ -0,0 +1,116 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from monitoring_system_v3 import IAlertChannel, Metric, SQLiteStorage
+
+try:
+    import numpy as np
+    from monitoring_anomaly import AnomalyDetector, score_grid
+except ImportError:
+    np = None
+
+NOW = 1_700_000_000.0
+
+class ListChannel(IAlertChannel):
+    def __init__(self):
+        self.alerts = []
+
+    def send_alert(self, message: str, severity: str):
+        self.alerts.append((severity, message))
+
+@unittest.skipIf(np is None, "requires numpy")
+class TestScoreGrid(unittest.TestCase):
+    def test_scores_latest_sample_against_baselines(self):
+        rng = np.random.default_rng(1)
+        grid = 50 + rng.normal(0, 1, size=(3, 120))
+        grid[1, -1] = 80.0        # spike
+        grid[2, 1::2] = np.nan    # sparse series, latest sample one step back
+        current, zscore, ewma, seasonal = score_grid(grid, [50, 50, 50], [1, 1, 1], alpha=0.1, z_window=30)
+
+        self.assertEqual(current[2], grid[2, -2])
+        self.assertLess(abs(zscore[0]), 4)
+        self.assertGreater(zscore[1], 10)
+        self.assertGreater(ewma[1], 10)
+        self.assertAlmostEqual(seasonal[1], 30.0)
+        self.assertLess(abs(ewma[2]), 5)
+
+    def test_flat_series_and_missing_history(self):
+        grid = np.full((2, 10), 5.0)
+        grid[0, -1] = 5.01
+        grid[1, :] = np.nan
+        _, zscore, ewma, seasonal = score_grid(grid, [np.nan, np.nan], [np.nan, np.nan], z_window=5)
+        self.assertLess(abs(zscore[0]), 1)   # std floored, tiny change stays small
+        self.assertTrue(np.isnan(seasonal[0]))
+        self.assertTrue(np.isnan(ewma[1]))
+
+@unittest.skipIf(np is None, "requires numpy")
+class TestAnomalyDetector(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.dir, "metrics.db")
+        storage = SQLiteStorage(self.db)
+        rng = random.Random(7)
+        metrics = []
+        for host in ("a", "b", "c"):
+            for ts in list(range(-86400 - 3600, -86400, 10)) + list(range(-3600, 0, 10)):
+                value = 40 + rng.gauss(0, 1)
+                if host == "b" and ts == -10:
+                    value = 95.0  # spike on the latest sample
+                if host == "c" and ts > -86400:
+                    value += 10   # shifted since yesterday
+                metrics.append(Metric(name="cpu_usage", value=value, timestamp=NOW + ts, tags={"host": host}))
+        storage.save_batch(metrics)
+        storage.close()
+        self.channel = ListChannel()
+        self.detector = AnomalyDetector(self.db, channels=[self.channel], names=["cpu_usage"])
+
+    def tearDown(self):
+        self.detector.close()
+        shutil.rmtree(self.dir)
+
+    def test_flags_spike_and_seasonal_shift(self):
+        scores = {m.tags["host"]: m.value for m in self.detector.evaluate(NOW)}
+        self.assertLess(scores["a"], 4)
+        self.assertGreater(scores["b"], 20)
+        self.assertGreater(scores["c"], 4)
+
+        hosts = sorted(message.split("host=")[1][0] for _, message in self.channel.alerts)
+        self.assertEqual(hosts, ["b", "c"])
+        self.assertEqual({severity for severity, _ in self.channel.alerts}, {"critical"})
+
+    def test_alerts_once_per_transition_and_restores_state(self):
+        self.detector.evaluate(NOW)
+        self.detector.evaluate(NOW)
+        self.assertEqual(len(self.channel.alerts), 2)
+
+        restarted = AnomalyDetector(self.db, channels=[self.channel], names=["cpu_usage"])
+        restarted.set_state(self.detector.get_state())
+        restarted.evaluate(NOW)
+        restarted.close()
+        self.assertEqual(len(self.channel.alerts), 2)
+
+        # ten seconds later b's spike has left the latest sample
+        self.detector.evaluate(NOW - 10)
+        resolved = [message for severity, message in self.channel.alerts if severity == "info"]
+        self.assertEqual(len(resolved), 1)
+        self.assertIn("host=b", resolved[0])
+
+    def test_incremental_refresh_matches_full_load(self):
+        self.detector.evaluate(NOW - 600)
+        storage = SQLiteStorage(self.db)
+        storage.save_batch([Metric(name="cpu_usage", value=40.0 + (ts % 30) / 10, timestamp=NOW + ts,
+                                   tags={"host": "d"}) for ts in range(-86400 - 3600, 0, 10)])
+        storage.close()
+
+        scores = {m.tags["host"]: m.value for m in self.detector.evaluate(NOW)}
+        fresh = AnomalyDetector(self.db, names=["cpu_usage"])
+        expected = {m.tags["host"]: m.value for m in fresh.evaluate(NOW)}
+        fresh.close()
+        self.assertEqual(sorted(scores), ["a", "b", "c", "d"])
+        for host, score in expected.items():
+            self.assertAlmostEqual(scores[host], score, places=6)
+
+if __name__ == "__main__":
+    unittest.main()
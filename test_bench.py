@@ -0,0 +1,40 @@
+import os
+import json
+import tempfile
+import unittest
+from monitoring_bench import SyntheticCollector, bench_pipeline, main
+
+class TestBenchmarks(unittest.TestCase):
+    def test_synthetic_collector_cardinality(self):
+        collector = SyntheticCollector(metrics=2, series=50, cardinality=5, tag_keys=("host",))
+        metrics = collector.collect()
+
+        self.assertEqual(len(metrics), 100)
+        self.assertEqual(len({(m.name, m.tags["host"]) for m in metrics}), 10)
+
+    def test_pipeline_reports_throughput_and_latency(self):
+        result = bench_pipeline("buffered", "concurrent", cycles=3, collectors=2, metrics=2, series=5)
+
+        self.assertEqual(result["samples"], 60)
+        self.assertGreater(result["samples_per_sec"], 0)
+        self.assertLessEqual(result["cycle_p50_ms"], result["cycle_p99_ms"])
+        self.assertGreater(result["db_bytes"], 0)
+        self.assertGreater(result["memory_peak_bytes"], 0)
+
+    def test_cli_writes_json(self):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            main(["--backends", "none,memory", "--modes", "sequential", "--cycles", "2",
+                  "--collectors", "1", "--no-memory", "--output", path])
+            with open(path) as f:
+                results = json.load(f)
+        finally:
+            os.remove(path)
+
+        self.assertEqual([(r["backend"], r["mode"]) for r in results["pipeline"]],
+                         [("none", "sequential"), ("memory", "sequential")])
+        self.assertIn("to_json_us_per_sample", results["serialize"])
+
+if __name__ == "__main__":
+    unittest.main()
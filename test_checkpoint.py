@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from typing import List
+from monitoring_system_v3 import MonitoringEngine, ICollector, IAlertChannel, Metric
+from monitoring_rules import AlertRule, RuleEngine
+from monitoring_checkpoint import Checkpointer, SnapshotError, read_snapshot, write_snapshot
+
+class SequenceCollector(ICollector):
+    def __init__(self, values: List[float], start: float):
+        self.values = list(values)
+        self.timestamp = start
+
+    def collect(self) -> List[Metric]:
+        self.timestamp += 1.0
+        return [Metric(name="queue_depth", value=self.values.pop(0), timestamp=self.timestamp)]
+
+class ListChannel(IAlertChannel):
+    def __init__(self):
+        self.alerts = []
+
+    def send_alert(self, message: str, severity: str):
+        self.alerts.append((severity, message))
+
+class TestSnapshotFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "engine.state")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_decodes_sections_lazily(self):
+        write_snapshot(self.path, {"a": {"x": [1, 2]}, "b": {"y": None}}, written_at=123.0)
+
+        written_at, sections = read_snapshot(self.path)
+
+        self.assertEqual(written_at, 123.0)
+        self.assertIsNone(sections["b"]._data)
+        self.assertEqual(dict(sections["a"]), {"x": [1, 2]})
+        self.assertIsNone(sections["b"]._data)
+        self.assertEqual(os.listdir(self.directory), ["engine.state"])
+
+    def test_truncated_snapshot_is_rejected(self):
+        write_snapshot(self.path, {"a": {"x": list(range(100))}})
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+
+        with self.assertRaises(SnapshotError):
+            read_snapshot(self.path)
+
+class TestWarmRestart(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "engine.state")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _engine(self, values, start):
+        channel = ListChannel()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 1, "self_metrics": False})
+        engine.set_rule_engine(RuleEngine([
+            AlertRule(name="queue_high", metric="queue_depth", threshold=10.0),
+            AlertRule(name="queue_avg", metric="queue_depth", threshold=50.0, aggregation="avg", window=10.0),
+        ]))
+        engine.register_collector(SequenceCollector(values, start))
+        engine.register_alerter(channel)
+        engine.set_checkpointer(Checkpointer(self.path, interval=3600))
+        return engine, channel
+
+    def test_firing_alert_and_window_survive_restart(self):
+        engine, channel = self._engine([20.0, 15.0], start=1000.0)
+        engine.run_once()
+        engine.run_once()
+        engine.stop()
+        self.assertEqual([m.split(":")[0] for _, m in channel.alerts], ["queue_high"])
+
+        # queue_high is still firing, so 70 must not announce it again, and
+        # with the restored window the average is 35, not 70.
+        engine, channel = self._engine([70.0, 0.0], start=1002.0)
+        engine.run_once()
+        self.assertEqual(channel.alerts, [])
+        engine.run_once()
+        engine.stop()
+
+        self.assertEqual(len(channel.alerts), 1)
+        self.assertEqual(channel.alerts[0][0], "info")
+        self.assertTrue(channel.alerts[0][1].startswith("queue_high: queue_depth resolved"))
+
+    def test_counters_continue_after_restart(self):
+        engine, _ = self._engine([1.0, 1.0], start=0.0)
+        engine.run_once()
+        engine.run_once()
+        engine.stop()
+
+        engine, _ = self._engine([1.0], start=2.0)
+        counters = engine.instrumentation.snapshot()["counters"]
+        engine.stop()
+
+        self.assertEqual(counters["cycles"], 2)
+        self.assertEqual(counters["samples"], 2)
+
+    def test_stale_snapshot_is_ignored(self):
+        write_snapshot(self.path, {"engine": {"counters": {"cycles": 5}}}, written_at=0.0)
+        engine, _ = self._engine([], start=0.0)
+
+        self.assertEqual(engine.instrumentation.counters["cycles"], 0)
+        engine.checkpointer.close()
+
+if __name__ == "__main__":
+    unittest.main()
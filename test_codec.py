@@ -0,0 +1,62 @@
+import io
+import json
+import unittest
+from monitoring_system_v3 import Metric, MetricType
+from monitoring_codec import (
+    CodecError, NDJSONEncoder, decode_batch, decode_ndjson, encode_batch, read_frames, write_frame,
+)
+
+def sample_metrics():
+    return [
+        Metric(name="cpu_usage", value=12.5, timestamp=1000.25, tags={"host": "a"}),
+        Metric(name="cpu_usage", value=13.5, timestamp=1001.25, tags={"host": "a"}),
+        Metric(name="net_rx_bytes_total", value=2.0 ** 40, timestamp=1001.5,
+               tags={"host": "b", "interface": "eth0"}, metric_type=MetricType.COUNTER),
+        Metric(name="héllo", value=-1.0, timestamp=0.0),
+    ]
+
+class TestBinaryCodec(unittest.TestCase):
+    def test_round_trip(self):
+        metrics = sample_metrics()
+
+        self.assertEqual(decode_batch(encode_batch(metrics)), metrics)
+        self.assertEqual(decode_batch(encode_batch([])), [])
+
+    def test_tag_sets_are_stored_once(self):
+        metrics = [Metric(name="cpu_usage", value=float(i), tags={"host": "a", "dc": "east"}) for i in range(100)]
+
+        single = len(encode_batch(metrics[:1]))
+        self.assertEqual(len(encode_batch(metrics)) - single, 99 * 25)
+
+    def test_rejects_corrupt_input(self):
+        data = encode_batch(sample_metrics())
+        with self.assertRaises(CodecError):
+            decode_batch(data[:-3])
+        with self.assertRaises(CodecError):
+            decode_batch(b"XXXX" + data[4:])
+
+    def test_frames(self):
+        stream = io.BytesIO()
+        write_frame(stream, sample_metrics()[:2])
+        write_frame(stream, sample_metrics()[2:])
+        stream.write(b"\x10\x00")  # torn tail
+        stream.seek(0)
+
+        self.assertEqual([len(batch) for batch in read_frames(stream)], [2, 2])
+
+class TestNDJSON(unittest.TestCase):
+    def test_matches_to_json_and_round_trips(self):
+        encoder = NDJSONEncoder()
+        metrics = sample_metrics()
+
+        text = encoder.encode_batch(metrics)
+        lines = text.splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [json.loads(m.to_json()) for m in metrics])
+        self.assertEqual(decode_ndjson(text), metrics)
+
+    def test_invalid_line(self):
+        with self.assertRaises(CodecError):
+            decode_ndjson('{"name": "x"}\n')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+import unittest
+import time
+import threading
+from typing import List
+from monitoring_system_v3 import MonitoringEngine, ICollector, IStorage, Metric, LatencyHistogram, CollectorScheduler
+
+class StaticCollector(ICollector):
+    def __init__(self, metric_name: str, delay: float = 0.0):
+        self.metric_name = metric_name
+        self.delay = delay
+
+    @property
+    def name(self) -> str:
+        return self.metric_name
+
+    def collect(self) -> List[Metric]:
+        time.sleep(self.delay)
+        return [Metric(name=self.metric_name, value=1.0)]
+
+class SlowFirstCollector(StaticCollector):
+    """Takes `delay` seconds on its first run only."""
+
+    def collect(self) -> List[Metric]:
+        delay, self.delay = self.delay, 0.0
+        time.sleep(delay)
+        return [Metric(name=self.metric_name, value=1.0)]
+
+class ListStorage(IStorage):
+    def __init__(self):
+        self.saved: List[Metric] = []
+
+    def save(self, metric: Metric):
+        self.saved.append(metric)
+
+class TestConcurrentEngine(unittest.TestCase):
+    def setUp(self):
+        self.storage = ListStorage()
+
+    def _engine(self, **config):
+        engine = MonitoringEngine({"thresholds": {}, "interval": 1, "self_metrics": False, **config})
+        engine.register_storage(self.storage)
+        return engine
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_cycle_time_bounded_by_slowest_collector(self):
+        self.engine = self._engine(max_workers=8)
+        for i in range(8):
+            self.engine.register_collector(StaticCollector(f"c{i}", delay=0.2))
+
+        start = time.monotonic()
+        self.engine.run_once()
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.2 * 4)
+        self.assertEqual([m.name for m in self.storage.saved], [f"c{i}" for i in range(8)])
+
+    def test_slow_collector_recorded_as_overrun(self):
+        self.engine = self._engine(max_workers=4, collector_timeout=0.1)
+        self.engine.register_collector(StaticCollector("fast"))
+        self.engine.register_collector(StaticCollector("slow", delay=0.5))
+        self.engine.register_collector(StaticCollector("also_fast"))
+
+        self.engine.run_once()
+
+        self.assertEqual([m.name for m in self.storage.saved], ["fast", "also_fast"])
+        self.assertEqual(self.engine.last_overruns, ["slow"])
+        self.assertEqual(self.engine.overruns, {"slow": 1})
+
+    def test_sequential_mode_is_default(self):
+        self.engine = self._engine()
+        self.engine.register_collector(StaticCollector("a"))
+        self.engine.register_collector(StaticCollector("b"))
+
+        self.engine.run_once()
+
+        self.assertEqual([m.name for m in self.storage.saved], ["a", "b"])
+        self.assertIsNone(self.engine._executor)
+
+class TestInstrumentation(unittest.TestCase):
+    def test_snapshot_and_self_metrics(self):
+        storage = ListStorage()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 1, "max_workers": 2, "collector_timeout": 0.1})
+        engine.register_storage(storage)
+        engine.register_collector(StaticCollector("fast"))
+        engine.register_collector(StaticCollector("slow", delay=0.3))
+
+        engine.run_once()
+        engine.stop()
+
+        snapshot = engine.instrumentation.snapshot()
+        self.assertEqual(snapshot["counters"]["cycles"], 1)
+        self.assertEqual(snapshot["counters"]["overruns"], 1)
+        self.assertEqual(snapshot["counters"]["samples"], 1)
+        self.assertEqual(set(snapshot["timings"]["collector"]), {"fast"})
+        # one batch for the collected sample, one for the self-metrics
+        self.assertEqual(snapshot["timings"]["storage"]["ListStorage"]["count"], 2)
+
+        names = {m.name for m in storage.saved}
+        self.assertIn("monitoring_cycle_seconds", names)
+        self.assertIn("monitoring_overruns_total", names)
+        collector_p99 = [m for m in storage.saved if m.name == "monitoring_collector_seconds"
+                         and m.tags == {"collector": "fast", "stat": "p99"}]
+        self.assertEqual(len(collector_p99), 1)
+
+    def test_histogram_quantiles(self):
+        histogram = LatencyHistogram()
+        for _ in range(99):
+            histogram.observe(0.0001)
+        histogram.observe(0.5)
+
+        self.assertLess(histogram.quantile(0.5), 0.001)
+        self.assertGreaterEqual(histogram.quantile(1.0), 0.5)
+        self.assertEqual(histogram.max, 0.5)
+
+class TestScheduler(unittest.TestCase):
+    def test_per_key_intervals_stay_on_grid(self):
+        scheduler = CollectorScheduler()
+        scheduler.add("fast", 1.0, now=0.0)
+        scheduler.add("slow", 3.0, now=0.0)
+
+        runs = [(t, scheduler.pop_due(now=t + 0.05 * (t % 2))) for t in range(7)]
+
+        self.assertEqual([keys for _, keys in runs],
+                         [["fast", "slow"], ["fast"], ["fast"], ["fast", "slow"], ["fast"], ["fast"], ["fast", "slow"]])
+        self.assertEqual(scheduler.next_due(), 7.0)
+
+    def test_skip_policy_drops_missed_runs(self):
+        scheduler = CollectorScheduler(policy="skip")
+        scheduler.add("c", 1.0, now=0.0)
+        scheduler.pop_due(now=0.0)
+
+        self.assertEqual(scheduler.pop_due(now=3.5), ["c"])
+        self.assertEqual(scheduler.skipped, 2)
+        self.assertEqual(scheduler.next_due(), 4.0)
+
+    def test_catch_up_policy_replays_bounded_runs(self):
+        scheduler = CollectorScheduler(policy="catch_up", max_catch_up=2)
+        scheduler.add("c", 1.0, now=0.0)
+        scheduler.pop_due(now=0.0)
+
+        runs = [len(scheduler.pop_due(now=5.5)) for _ in range(4)]
+
+        self.assertEqual(runs, [1, 1, 1, 0])
+        self.assertEqual(scheduler.next_due(), 6.0)
+        self.assertEqual(scheduler.skipped, 2)
+
+    def test_jitter_spreads_first_runs(self):
+        scheduler = CollectorScheduler()
+        for i in range(50):
+            scheduler.add(i, 10.0, jitter=0.5, now=100.0)
+
+        first = [scheduler.pop_due(now=100.0 + t) for t in range(6)]
+
+        self.assertEqual(sum(len(keys) for keys in first), 50)
+        self.assertLess(len(first[0]), 50)
+
+    def test_engine_runs_collectors_on_own_intervals(self):
+        storage = ListStorage()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 0.05, "self_metrics": False})
+        engine.register_collector(StaticCollector("fast"))
+        engine.register_collector(StaticCollector("slow"), interval=10.0)
+        engine.register_storage(storage)
+
+        thread = threading.Thread(target=engine.start)
+        thread.start()
+        time.sleep(0.3)
+        engine.stop()
+        thread.join(1.0)
+
+        self.assertFalse(thread.is_alive())
+        names = [m.name for m in storage.saved]
+        self.assertEqual(names.count("slow"), 1)
+        self.assertGreaterEqual(names.count("fast"), 4)
+
+    def test_slow_group_does_not_delay_fast_group(self):
+        storage = ListStorage()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 0.05, "self_metrics": False,
+                                   "collector_timeout": 5.0})
+        engine.register_collector(StaticCollector("fast"))
+        engine.register_collector(StaticCollector("slow", delay=0.5), interval=0.1)
+        engine.register_storage(storage)
+
+        thread = threading.Thread(target=engine.start)
+        thread.start()
+        time.sleep(0.45)
+        fast_runs = [m.name for m in storage.saved].count("fast")
+        engine.stop()
+        thread.join(2.0)
+
+        self.assertFalse(thread.is_alive())
+        self.assertGreaterEqual(fast_runs, 6)
+        names = [m.name for m in storage.saved]
+        self.assertEqual(names.count("slow"), 1)  # the run in flight at stop() is still stored
+        self.assertGreater(engine.instrumentation.counters["skipped"], 0)
+
+    def _run_slow_first(self, policy):
+        storage = ListStorage()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 0.1, "jitter": 0.0, "self_metrics": False,
+                                   "overrun_policy": policy, "max_catch_up": 3, "collector_timeout": 5.0})
+        engine.register_collector(SlowFirstCollector("probe", delay=0.45))
+        engine.register_storage(storage)
+        thread = threading.Thread(target=engine.start)
+        thread.start()
+        time.sleep(0.8)
+        engine.stop()
+        thread.join(2.0)
+        self.assertFalse(thread.is_alive())
+        return len(storage.saved), engine.instrumentation.counters["skipped"]
+
+    def test_catch_up_policy_replays_slots_missed_while_busy(self):
+        skip_runs, skip_skipped = self._run_slow_first("skip")
+        catch_up_runs, catch_up_skipped = self._run_slow_first("catch_up")
+
+        # four slots fall inside the 0.45 s run: dropped by "skip", three replayed by "catch_up"
+        self.assertEqual(skip_skipped, 4)
+        self.assertEqual(catch_up_skipped, 1)
+        self.assertGreaterEqual(catch_up_runs, skip_runs + 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import json
+import time
+import unittest
+import http.client
+from typing import List
+from monitoring_system_v3 import MonitoringEngine, IStorage, Metric, MetricType
+from monitoring_codec import CONTENT_TYPE, NDJSONEncoder, encode_batch
+from monitoring_ingest import IngestServer
+
+class ListStorage(IStorage):
+    def __init__(self):
+        self.saved: List[Metric] = []
+
+    def save(self, metric: Metric):
+        self.saved.append(metric)
+
+def _metrics(count: int) -> List[Metric]:
+    return [Metric(name="requests_total", value=float(i), timestamp=100.0 + i, tags={"service": "ims"},
+                   metric_type=MetricType.COUNTER) for i in range(count)]
+
+class TestIngestServer(unittest.TestCase):
+    def setUp(self):
+        self.server = IngestServer(port=0, max_pending=50).start()
+        self.conn = http.client.HTTPConnection(*self.server.address, timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.close()
+
+    def _post(self, body: bytes, content_type: str):
+        self.conn.request("POST", "/ingest", body=body, headers={"Content-Type": content_type})
+        response = self.conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_accepts_ndjson_and_binary_on_one_connection(self):
+        batch = _metrics(10)
+        status, body = self._post(NDJSONEncoder().encode_batch(batch).encode("utf-8"), "application/x-ndjson")
+        self.assertEqual((status, body), (202, {"accepted": 10}))
+        status, body = self._post(encode_batch(batch), CONTENT_TYPE)
+        self.assertEqual((status, body), (202, {"accepted": 10}))
+
+        self.assertEqual(self.server.collect(), batch + batch)
+        self.assertEqual(self.server.collect(), [])
+
+    def test_rejects_invalid_payloads(self):
+        self.assertEqual(self._post(b'{"name": "x"}\n', "application/x-ndjson")[0], 400)
+        self.assertEqual(self._post(b"IMSMgarbage", CONTENT_TYPE)[0], 400)
+        self.assertEqual(self._post(b"a,b", "text/csv")[0], 415)
+        self.assertEqual(self.server.stats()["bad_requests"], 2)
+
+    def test_rejects_non_string_tags(self):
+        line = {"name": "x", "value": 1.0, "timestamp": 100.0, "tags": {"port": 8080}}
+        status, body = self._post(json.dumps(line).encode("utf-8") + b"\n", "application/x-ndjson")
+        self.assertEqual(status, 400)
+        self.assertIn("port", body["error"])
+        self.assertEqual(self.server.collect(), [])
+
+    def test_back_pressure_when_queue_full(self):
+        self.assertEqual(self._post(encode_batch(_metrics(40)), CONTENT_TYPE)[0], 202)
+        self.conn.request("POST", "/ingest", body=encode_batch(_metrics(20)), headers={"Content-Type": CONTENT_TYPE})
+        response = self.conn.getresponse()
+        response.read()
+        self.assertEqual(response.status, 429)
+        self.assertEqual(response.getheader("Retry-After"), "1")
+
+        self.server.collect()
+        self.assertEqual(self._post(encode_batch(_metrics(20)), CONTENT_TYPE)[0], 202)
+        self.assertEqual(self.server.stats()["rejected_requests"], 1)
+
+    def test_rejects_negative_content_length_and_counts_415(self):
+        self.conn.putrequest("POST", "/ingest")
+        self.conn.putheader("Content-Type", CONTENT_TYPE)
+        self.conn.putheader("Content-Length", "-1")
+        self.conn.endheaders()
+        response = self.conn.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+
+        self.conn.close()
+        self.assertEqual(self._post(b"a,b", "text/csv")[0], 415)
+        self.assertEqual(self.server.stats()["rejected_requests"], 1)
+
+    def test_idle_keep_alive_connections_do_not_starve_new_clients(self):
+        server = IngestServer(port=0, workers=2, idle_timeout=15.0, max_waiting=1).start()
+        idle = [http.client.HTTPConnection(*server.address, timeout=5) for _ in range(2)]
+        try:
+            for conn in idle:
+                conn.request("GET", "/health")
+                conn.getresponse().read()  # both workers now hold an idle keep-alive connection
+
+            started = time.monotonic()
+            status, _ = self._post_to(server, encode_batch(_metrics(1)))
+            self.assertEqual(status, 202)
+            self.assertLess(time.monotonic() - started, 2.0)
+        finally:
+            for conn in idle:
+                conn.close()
+            server.close()
+
+    def _post_to(self, server, body):
+        conn = http.client.HTTPConnection(*server.address, timeout=5)
+        try:
+            conn.request("POST", "/ingest", body=body, headers={"Content-Type": CONTENT_TYPE})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def test_engine_processes_pushed_metrics(self):
+        storage = ListStorage()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 1, "self_metrics": False})
+        engine.register_collector(self.server)
+        engine.register_storage(storage)
+
+        self._post(encode_batch(_metrics(3)), CONTENT_TYPE)
+        engine.run_once()
+
+        self.assertEqual([m.value for m in storage.saved], [0.0, 1.0, 2.0])
+        self.conn.request("GET", "/health")
+        response = self.conn.getresponse()
+        self.assertEqual(json.loads(response.read())["accepted"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
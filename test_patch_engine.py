@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import unittest
+import fix_hourly_chart
+import fix_layout
+from unittest import mock
+from patch_engine import INSERT_AFTER_LINE, JOURNAL_SUFFIX, Patch, apply, load_patches, undo
+
+PATCHES = fix_hourly_chart.PATCHES + fix_layout.PATCHES
+
+UNPATCHED = "\n".join([
+    "<html><body>",
+    "<p>filler</p>" * 5000,
+    fix_layout.RIGHT_COLUMN_ANCHOR,
+    "<script>",
+    "        " + fix_hourly_chart.LISTENER_ANCHOR,
+    "        function renderTimestamps() {",
+    fix_hourly_chart.CALL_ANCHOR,
+    "        }",
+    fix_hourly_chart.FUNCTION_ANCHOR,
+    "        }",
+    "</script></body></html>",
+    "",
+])
+
+class TestPatchEngine(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.page = os.path.join(self.root, "daily_cycle_count.html")
+        with open(self.page, "w", encoding="utf-8") as f:
+            f.write(UNPATCHED)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _content(self):
+        with open(self.page, encoding="utf-8") as f:
+            return f.read()
+
+    def test_applies_all_patches_once(self):
+        results = apply(PATCHES, self.root)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(sorted(results[0].applied), sorted(p.name for p in PATCHES))
+        content = self._content()
+        self.assertIn(fix_layout.RIGHT_COLUMN_TEXT, content)
+        self.assertIn(fix_hourly_chart.CALL_TEXT, content)
+        self.assertLess(content.index("function renderTsHourlyChart"), content.index("renderInactiveUsersTable"))
+        self.assertIn(fix_hourly_chart.LISTENER_ANCHOR + "\n" + fix_hourly_chart.LISTENER_TEXT, content)
+
+        results = apply(PATCHES, self.root)
+        self.assertEqual(results[0].applied, [])
+        self.assertEqual(len(results[0].already_applied), len(PATCHES))
+        self.assertEqual(self._content(), content)
+
+    def test_undo_restores_from_journal(self):
+        apply(PATCHES, self.root)
+        journal_size = os.path.getsize(self.page + JOURNAL_SUFFIX)
+        self.assertLess(journal_size, len(UNPATCHED) // 10)
+
+        removed = undo(self.page)
+        self.assertEqual(sorted(removed), sorted(p.name for p in PATCHES))
+        self.assertEqual(self._content(), UNPATCHED)
+
+    def test_crlf_page_is_matched_and_keeps_its_line_endings(self):
+        crlf = UNPATCHED.replace("\n", "\r\n")
+        with open(self.page, "w", encoding="utf-8", newline="") as f:
+            f.write(crlf)
+
+        results = apply(PATCHES, self.root)
+        self.assertEqual(sorted(results[0].applied), sorted(p.name for p in PATCHES))
+        with open(self.page, encoding="utf-8", newline="") as f:
+            content = f.read()
+        self.assertNotIn("\n", content.replace("\r\n", ""))
+        self.assertIn(fix_layout.RIGHT_COLUMN_TEXT.replace("\n", "\r\n"), content)
+        self.assertEqual(apply(PATCHES, self.root)[0].applied, [])
+
+        undo(self.page)
+        with open(self.page, encoding="utf-8", newline="") as f:
+            self.assertEqual(f.read(), crlf)
+
+    def test_file_is_left_unchanged_unless_every_patch_applies(self):
+        with open(self.page, "w", encoding="utf-8") as f:
+            f.write(UNPATCHED.replace(fix_hourly_chart.CALL_ANCHOR, ""))
+
+        result = apply(PATCHES, self.root)[0]
+        self.assertEqual(result.missing, ["renderTsHourlyChart call"])
+        self.assertEqual(result.applied, [])
+        self.assertEqual(len(result.held_back), len(PATCHES) - 1)
+        self.assertEqual(self._content(), UNPATCHED.replace(fix_hourly_chart.CALL_ANCHOR, ""))
+        self.assertFalse(os.path.exists(self.page + JOURNAL_SUFFIX))
+
+    def test_stale_fixer_does_not_hold_back_the_others(self):
+        with open(self.page, "w", encoding="utf-8") as f:
+            f.write(UNPATCHED.replace(fix_layout.RIGHT_COLUMN_ANCHOR, ""))
+
+        result = apply(load_patches(), self.root)[0]
+        self.assertEqual(result.missing, ["Timestamp modal right column layout"])
+        self.assertEqual(sorted(result.applied), sorted(p.name for p in fix_hourly_chart.PATCHES))
+        self.assertEqual(result.held_back, [])
+        self.assertIn(fix_hourly_chart.CALL_TEXT, self._content())
+
+        with open(self.page, "w", encoding="utf-8") as f:
+            f.write(UNPATCHED.replace(fix_hourly_chart.CALL_ANCHOR, ""))
+        result = apply(load_patches(), self.root)[0]
+        self.assertEqual(result.applied, ["Timestamp modal right column layout"])
+        self.assertEqual(len(result.held_back), len(fix_hourly_chart.PATCHES) - 1)
+        self.assertNotIn("function renderTsHourlyChart", self._content())
+
+    def test_fixers_patch_an_explicitly_named_file(self):
+        other = os.path.join(self.root, "copy_of_cycle_count.html")
+        os.rename(self.page, other)
+        with mock.patch("builtins.print"):
+            self.assertTrue(fix_layout.LayoutFixer(html_file=other).run())
+            self.assertTrue(fix_hourly_chart.HourlyChartFixer(html_file=other).run())
+            self.assertFalse(fix_layout.LayoutFixer(html_file=self.page).run())  # missing file is reported
+        with open(other, encoding="utf-8") as f:
+            self.assertIn(fix_layout.RIGHT_COLUMN_TEXT, f.read())
+
+    def test_reports_missing_anchor_and_skips_unmatched_files(self):
+        other = os.path.join(self.root, "index.html")
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("<html></html>")
+        patches = [Patch("banner", "<body>", "<body>\n<div>banner</div>", files="index.html"),
+                   Patch("footer", "</body>", "<footer></footer>", mode=INSERT_AFTER_LINE, files="index.html")]
+
+        results = apply(patches, self.root)
+        self.assertEqual([r.path for r in results], [other])
+        self.assertEqual(results[0].missing, ["banner", "footer"])
+        self.assertFalse(results[0].ok)
+        self.assertFalse(os.path.exists(other + JOURNAL_SUFFIX))
+
+if __name__ == "__main__":
+    unittest.main()
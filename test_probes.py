@@ -0,0 +1,133 @@
+import gc
+import time
+import unittest
+import warnings
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from monitoring_probes import HttpProbeCollector
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    finished = 0
+
+    def setup(self):
+        super().setup()
+        StandInHandler.connections += 1
+
+    def finish(self):
+        super().finish()
+        StandInHandler.finished += 1
+
+    def do_GET(self):
+        if self.path in ("/moved", "/loop"):
+            self.send_response(301)
+            self.send_header("Location", "/" if self.path == "/moved" else "/loop")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/slow":
+            time.sleep(0.5)
+        if self.path == "/missing":
+            body = b"not found"
+            self.send_response(404)
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"5\r\nhello\r\n0\r\n\r\n")
+            return
+        else:
+            body = b"ok"
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHttpProbeCollector(unittest.TestCase):
+    def setUp(self):
+        StandInHandler.connections = 0
+        StandInHandler.finished = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _by_name(self, metrics, name):
+        return {m.tags["url"]: m.value for m in metrics if m.name == name}
+
+    def test_reports_status_and_latency_breakdown(self):
+        urls = [f"{self.base}/", f"{self.base}/missing", f"{self.base}/chunked"]
+        collector = HttpProbeCollector(urls, per_host=1)
+        try:
+            metrics = collector.collect()
+        finally:
+            collector.close()
+
+        self.assertEqual(self._by_name(metrics, "website_status"), {
+            urls[0]: 200.0, urls[1]: 404.0, urls[2]: 200.0})
+        totals = self._by_name(metrics, "website_total_seconds")
+        ttfbs = self._by_name(metrics, "website_ttfb_seconds")
+        for url in urls:
+            self.assertGreaterEqual(totals[url], ttfbs[url])
+
+    def test_reuses_connections_across_cycles(self):
+        urls = [f"{self.base}/page{i}" for i in range(20)]
+        collector = HttpProbeCollector(urls, per_host=2)
+        try:
+            for _ in range(3):
+                statuses = self._by_name(collector.collect(), "website_status")
+                self.assertEqual(set(statuses.values()), {200.0})
+        finally:
+            collector.close()
+
+        self.assertLessEqual(StandInHandler.connections, 2)
+
+    def test_follows_redirects(self):
+        urls = [f"{self.base}/moved", f"{self.base}/loop"]
+        collector = HttpProbeCollector(urls, max_redirects=3)
+        try:
+            metrics = collector.collect()
+        finally:
+            collector.close()
+
+        self.assertEqual(self._by_name(metrics, "website_status"), {urls[0]: 200.0, urls[1]: 0.0})
+        self.assertGreater(self._by_name(metrics, "website_total_seconds")[urls[0]], 0.0)
+
+    def test_timeout_on_pooled_connection_closes_it(self):
+        collector = HttpProbeCollector([f"{self.base}/"], timeout=0.2)
+        try:
+            collector.collect()
+            collector.urls = [f"{self.base}/slow"]
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", ResourceWarning)
+                statuses = self._by_name(collector.collect(), "website_status")
+                gc.collect()
+            self.assertEqual(list(statuses.values()), [0.0])
+            # closed by the probe, not left to the garbage collector
+            self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+            deadline = time.monotonic() + 3.0
+            while StandInHandler.finished < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(StandInHandler.finished, 1)
+        finally:
+            collector.close()
+
+    def test_connection_failure_reports_zero(self):
+        collector = HttpProbeCollector(["http://127.0.0.1:1/"], timeout=1.0)
+        try:
+            metrics = collector.collect()
+        finally:
+            collector.close()
+
+        self.assertEqual([(m.name, m.value) for m in metrics], [("website_status", 0.0)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from monitoring_system_v3 import MetricType
+from monitoring_proc import ProcResourceCollector
+
+STAT = """cpu  {busy} 0 0 {idle} 0 0 0 0 0 0
+cpu0 {busy} 0 0 {idle} 0 0 0 0 0 0
+ctxt 1000
+processes 50
+procs_running 2
+"""
+
+MEMINFO = """MemTotal:       1000 kB
+MemFree:         100 kB
+MemAvailable:    250 kB
+SwapTotal:         0 kB
+"""
+
+DISKSTATS = """   8       0 sda {reads} 0 {sectors} 0 0 0 {sectors} 0 0 0 0
+   7       0 loop0 1 0 1 0 0 0 1 0 0 0 0
+"""
+
+NETDEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+  eth0: {rx} 1 0 0 0 0 0 0 {tx} 1 0 0 0 0 0 0
+"""
+
+PID_STAT = "{pid} (my (odd) proc) S 1 1 1 0 -1 0 0 0 0 0 {utime} 0 0 0 20 0 1 0 100 1000 {rss} 0\n"
+
+class TestProcResourceCollector(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "net"))
+        self._write(busy=100, idle=100, sectors=0, reads=0, rx=0, tx=0)
+        self._write_pid(42, utime=0)
+        self.collector = ProcResourceCollector(proc_root=self.root, processes=True)
+
+    def tearDown(self):
+        self.collector.close()
+        shutil.rmtree(self.root)
+
+    def _write(self, busy, idle, sectors, reads, rx, tx):
+        files = {
+            "stat": STAT.format(busy=busy, idle=idle),
+            "meminfo": MEMINFO,
+            "diskstats": DISKSTATS.format(sectors=sectors, reads=reads),
+            "net/dev": NETDEV.format(rx=rx, tx=tx),
+        }
+        for name, content in files.items():
+            with open(os.path.join(self.root, name), "w") as f:
+                f.write(content)
+
+    def _write_pid(self, pid, utime):
+        os.makedirs(os.path.join(self.root, str(pid)), exist_ok=True)
+        with open(os.path.join(self.root, str(pid), "stat"), "w") as f:
+            f.write(PID_STAT.format(pid=pid, utime=utime, rss=3))
+
+    def _by_name(self, metrics):
+        return {m.name: m for m in metrics}
+
+    def test_first_cycle_emits_counters_and_gauges(self):
+        metrics = self._by_name(self.collector.collect())
+
+        self.assertNotIn("cpu_usage", metrics)
+        self.assertEqual(metrics["memory_usage"].value, 75.0)
+        self.assertEqual(metrics["context_switches_total"].metric_type, MetricType.COUNTER)
+        self.assertEqual(metrics["memory_usage"].metric_type, MetricType.GAUGE)
+        self.assertEqual(metrics["disk_read_bytes_total"].tags, {"device": "sda", "host": "localhost"})
+        self.assertEqual(metrics["process_count"].value, 1.0)
+
+    def test_second_cycle_computes_deltas(self):
+        self.collector.collect()
+        self._write(busy=130, idle=170, sectors=10, reads=1, rx=2048, tx=1024)
+        self._write_pid(42, utime=50)
+
+        metrics = self.collector.collect()
+        by_name = self._by_name(metrics)
+
+        self.assertAlmostEqual(by_name["cpu_usage"].value, 30.0)
+        self.assertEqual(by_name["cpu_core_usage"].tags["cpu"], "cpu0")
+        self.assertEqual(by_name["disk_read_bytes_total"].value, 5120.0)
+        self.assertGreater(by_name["net_rx_bytes_per_sec"].value, 0.0)
+        self.assertEqual(by_name["process_cpu_usage"].tags["comm"], "my (odd) proc")
+        self.assertEqual(by_name["process_rss_bytes"].value, 3.0 * os.sysconf("SC_PAGE_SIZE"))
+
+    def test_exited_processes_release_handles(self):
+        self.collector.collect()
+        shutil.rmtree(os.path.join(self.root, "42"))
+        self._write_pid(43, utime=0)
+
+        metrics = self._by_name(self.collector.collect())
+
+        self.assertEqual(list(self.collector._pid_fds), [b"43"])
+        self.assertEqual(metrics["process_count"].value, 1.0)
+
+    def test_caps_open_process_handles(self):
+        for pid in range(100, 110):
+            self._write_pid(pid, utime=0)
+        collector = ProcResourceCollector(proc_root=self.root, processes=True, max_pid_fds=4)
+        try:
+            collector.collect()
+            self._write_pid(105, utime=50)
+            metrics = collector.collect()
+            self.assertEqual(len(collector._pid_fds), 4)
+        finally:
+            collector.close()
+        self.assertEqual(self._by_name(metrics)["process_count"].value, 11.0)
+        busiest = max((m for m in metrics if m.name == "process_cpu_usage"), key=lambda m: m.value)
+        self.assertEqual(busiest.tags["pid"], "105")
+
+    def test_exited_processes_without_handles_drop_their_readings(self):
+        for pid in range(100, 110):
+            self._write_pid(pid, utime=0)
+        collector = ProcResourceCollector(proc_root=self.root, processes=True, max_pid_fds=4)
+        try:
+            collector.collect()
+            for pid in range(100, 110):
+                shutil.rmtree(os.path.join(self.root, str(pid)))
+            collector.collect()
+            self.assertEqual([k for k in collector._prev if k[0] == "pid"], [("pid", b"42")])
+        finally:
+            collector.close()
+
+    def test_restored_state_resumes_rates(self):
+        self.collector.collect()
+        state = self.collector.get_state()
+        self._write(busy=130, idle=170, sectors=10, reads=1, rx=2048, tx=1024)
+
+        restarted = ProcResourceCollector(proc_root=self.root)
+        restarted.set_state(state)
+        metrics = self._by_name(restarted.collect())
+        restarted.close()
+
+        self.assertAlmostEqual(metrics["cpu_usage"].value, 30.0)
+        self.assertIn("disk_read_bytes_per_sec", metrics)
+
+    def test_checkpoint_after_idle_period_keeps_reading_time(self):
+        self.collector.collect()
+        time.sleep(0.3)  # engine stops (and checkpoints) well after the last cycle
+        state = self.collector.get_state()
+        self._write(busy=130, idle=170, sectors=10, reads=1, rx=2048, tx=1024)
+
+        restarted = ProcResourceCollector(proc_root=self.root)
+        restarted.set_state(state)
+        metrics = self._by_name(restarted.collect())
+        restarted.close()
+
+        # 5120 bytes over at least the 0.3 s since the reading, not since the checkpoint
+        self.assertLess(metrics["disk_read_bytes_per_sec"].value, 5120 / 0.3)
+
+    def test_counter_reset_emits_no_rate(self):
+        self._write(busy=100, idle=100, sectors=100, reads=1, rx=4096, tx=4096)
+        self.collector.collect()
+        self._write(busy=110, idle=110, sectors=0, reads=0, rx=0, tx=0)
+
+        metrics = self._by_name(self.collector.collect())
+
+        self.assertNotIn("disk_read_bytes_per_sec", metrics)
+        self.assertNotIn("net_rx_bytes_per_sec", metrics)
+        self.assertIn("cpu_usage", metrics)
+
+    @unittest.skipUnless(os.path.exists("/proc/stat"), "requires Linux /proc")
+    def test_reads_real_proc(self):
+        collector = ProcResourceCollector(processes=True)
+        try:
+            collector.collect()
+            time.sleep(0.2)
+            names = {m.name for m in collector.collect()}
+        finally:
+            collector.close()
+        self.assertIn("cpu_usage", names)
+        self.assertIn("process_count", names)
+
+if __name__ == "__main__":
+    unittest.main()
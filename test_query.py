@@ -0,0 +1,61 @@
+import unittest
+import sqlite3
+import os
+from monitoring_system_v3 import BufferedSQLiteStorage, Metric
+from monitoring_query import MetricQuery
+
+class TestMetricQuery(unittest.TestCase):
+    def setUp(self):
+        self.test_db = "test_query_metrics.db"
+        self._cleanup()
+        storage = BufferedSQLiteStorage(self.test_db)
+        for i in range(100):
+            for host in ("a", "b"):
+                storage.save(Metric(name="cpu_usage", value=float(i), timestamp=1000.0 + i,
+                                    tags={"host": host, "dc": "east"}))
+            storage.save(Metric(name="memory_usage", value=50.0, timestamp=1000.0 + i, tags={"host": "a"}))
+        storage.close()
+        self.query = MetricQuery(self.test_db)
+
+    def tearDown(self):
+        self.query.close()
+        self._cleanup()
+
+    def _cleanup(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.test_db + suffix):
+                os.remove(self.test_db + suffix)
+
+    def test_range_filters_by_time_and_tag(self):
+        result = list(self.query.range("cpu_usage", 1010.0, 1020.0, tags={"host": "b"}))
+
+        self.assertEqual([m.value for m in result], [float(i) for i in range(10, 20)])
+        self.assertTrue(all(m.tags == {"host": "b", "dc": "east"} for m in result))
+
+    def test_range_merges_series_in_timestamp_order(self):
+        result = list(self.query.range("cpu_usage", 1050.0, tags={"dc": "east"}))
+
+        self.assertEqual(len(result), 100)
+        timestamps = [m.timestamp for m in result]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_range_is_lazy(self):
+        result = self.query.range("cpu_usage", 0.0)
+
+        self.assertEqual(next(result).timestamp, 1000.0)
+
+    def test_latest(self):
+        self.assertEqual(self.query.latest("cpu_usage", tags={"host": "a"}).value, 99.0)
+        self.assertEqual(self.query.latest("memory_usage").timestamp, 1099.0)
+        self.assertIsNone(self.query.latest("cpu_usage", tags={"host": "zzz"}))
+
+    def test_range_uses_index(self):
+        with sqlite3.connect(self.test_db) as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT timestamp, value FROM metrics "
+                "WHERE series_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                (1, 0, 1)).fetchall()
+        self.assertIn("idx_metrics_series_id_ts", " ".join(row[-1] for row in plan))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import json
+import time
+import socket
+import base64
+import hashlib
+import unittest
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from monitoring_realtime import (OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, WS_GUID, RealtimeCollector,
+                                 decode_frames, encode_frame)
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """server.js in miniature: GET /api/ping and a broadcast-only /ws on the same port."""
+    protocol_version = "HTTP/1.1"
+    stand_in: "StandInServer" = None
+
+    def do_GET(self):
+        if self.path == "/api/ping":
+            time.sleep(self.stand_in.ping_delay)
+            body = b'{"ok":true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept",
+                         base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode())
+        self.end_headers()
+        self.wfile.flush()
+        self.stand_in.attach(self.connection)
+        buffer = bytearray()
+        while True:
+            data = self.connection.recv(4096)
+            if not data:
+                break
+            buffer += data
+            for _, opcode, payload in decode_frames(buffer):
+                self.stand_in.received.append((opcode, payload))
+                if opcode == OP_CLOSE:
+                    self.close_connection = True
+                    return
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer:
+    def __init__(self):
+        self.clients = []
+        self.received = []
+        self.ping_delay = 0.0
+        self._attached = threading.Condition()
+        handler = type("StandInHandler", (_StandInHandler,), {"stand_in": self})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = "ws://127.0.0.1:%d/ws" % self.httpd.server_address[1]
+
+    def attach(self, sock):
+        with self._attached:
+            self.clients.append(sock)
+            self._attached.notify_all()
+
+    def wait_for_clients(self, count, timeout=5.0):
+        with self._attached:
+            return self._attached.wait_for(lambda: len(self.clients) >= count, timeout)
+
+    def send(self, frame: bytes):
+        self.clients[-1].sendall(frame)
+
+    def broadcast(self, event: dict):
+        self.send(encode_frame(OP_TEXT, json.dumps(event).encode(), mask=False))
+
+    def drop(self):
+        self.clients[-1].shutdown(socket.SHUT_RDWR)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for sock in self.clients:
+            sock.close()
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+class TestFrames(unittest.TestCase):
+    def test_round_trips_masked_and_extended_lengths(self):
+        buffer = bytearray()
+        for payload in (b"", b"x" * 125, b"y" * 300, b"z" * 70000):
+            buffer += encode_frame(OP_TEXT, payload)
+        buffer += encode_frame(OP_PING, b"p", mask=False)[:2]  # partial frame stays buffered
+        frames = decode_frames(buffer)
+        self.assertEqual([len(p) for _, _, p in frames], [0, 125, 300, 70000])
+        self.assertEqual(frames[3], (True, OP_TEXT, b"z" * 70000))
+        self.assertEqual(len(buffer), 2)
+
+class TestRealtimeCollector(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer()
+        self.collector = RealtimeCollector(self.server.url, ping_interval=0.05, backoff_min=0.05, backoff_max=0.2)
+        self.collected = []
+
+    def tearDown(self):
+        self.collector.close()
+        self.server.close()
+
+    def _collect(self, name, count=1):
+        def ready():
+            self.collected.extend(self.collector.collect())
+            return len([m for m in self.collected if m.name == name]) >= count
+        self.assertTrue(_wait(ready), f"no {name}")
+        return [m for m in self.collected if m.name == name]
+
+    def test_turns_events_into_metrics_as_they_arrive(self):
+        self.collector.start()
+        self.assertTrue(self.server.wait_for_clients(1))
+        sent = time.time()
+        self.server.broadcast({"type": "docs_updated", "docsCount": 12, "ts": sent * 1000,
+                               "counts": {"forwarded": 3, "received": 2, "returned": 1}})
+        # a fragmented message with a ping in between, as a browser-grade server may send
+        text = json.dumps({"type": "docs_updated", "docsCount": 13}).encode()
+        self.server.send(bytes([OP_TEXT]) + encode_frame(OP_TEXT, text[:10], mask=False)[1:]
+                         + encode_frame(OP_PING, b"hb", mask=False)
+                         + bytes([0x80]) + encode_frame(OP_TEXT, text[10:], mask=False)[1:])
+
+        totals = self._collect("ims_docs_total", 2)
+        self.assertEqual([m.value for m in totals], [12.0, 13.0])
+        self.assertGreaterEqual(totals[0].timestamp, sent)
+        admin = {m.tags["status"]: m.value for m in self.collected if m.name == "ims_docs_admin"}
+        self.assertEqual(admin, {"forwarded": 3.0, "received": 2.0, "returned": 1.0})
+        events = [m.value for m in self.collected if m.name == "ims_ws_events_total"]
+        self.assertEqual(events, [1.0, 2.0])
+        lag = [m.value for m in self.collected if m.name == "ims_ws_broadcast_lag_seconds"]
+        self.assertEqual(len(lag), 1)
+        self.assertLess(abs(lag[0]), 5)
+        self.assertTrue(_wait(lambda: (OP_PONG, b"hb") in self.server.received))
+
+        pings = self._collect("ims_ping_status", 2)
+        self.assertEqual({m.value for m in pings}, {200.0})
+        self.assertTrue(all(m.value < 5 for m in self.collected if m.name == "ims_ping_seconds"))
+        self.assertTrue(any(m.name == "ims_ws_events_per_sec" for m in self.collected))
+
+    def test_reconnects_after_connection_loss_and_keeps_totals(self):
+        self.collector.set_state({"events": {"docs_updated": 40}})
+        self.collector.start()
+        self.assertTrue(self.server.wait_for_clients(1))
+        self.server.broadcast({"type": "docs_updated", "docsCount": 1})
+        self._collect("ims_docs_total")
+
+        self.server.drop()
+        self.assertTrue(self.server.wait_for_clients(2))
+        self.server.broadcast({"type": "docs_updated", "docsCount": 2})
+        self._collect("ims_docs_total", 2)
+        events = [m.value for m in self.collected if m.name == "ims_ws_events_total"]
+        self.assertEqual(events, [41.0, 42.0])
+        self.assertEqual(self.collector.connects, 2)
+        self.assertEqual(self.collector.get_state(), {"events": {"docs_updated": 42}})
+
+    def test_backs_off_while_server_is_down(self):
+        self.server.close()
+        self.collector.start()
+        self.assertTrue(_wait(lambda: self.collector.failures >= 2))
+        time.sleep(0.3)
+        self.assertLess(self.collector.failures, 10)  # delays grow to backoff_max instead of spinning
+        health = {m.name: m.value for m in self.collector.metrics()}
+        self.assertEqual(health["ims_ws_connected"], 0.0)
+        self.assertEqual(health["ims_ws_connects_total"], 0.0)
+        # the API is still pinged during the backoff, and reported down
+        pings = self._collect("ims_ping_status", 2)
+        self.assertEqual({m.value for m in pings}, {0.0})
+
+    def test_slow_ping_does_not_delay_events(self):
+        self.server.ping_delay = 0.5
+        self.collector.ping_interval = 0.01
+        self.collector.start()
+        self.assertTrue(self.server.wait_for_clients(1))
+        time.sleep(0.1)  # a ping is in flight
+        sent = time.time()
+        self.server.broadcast({"type": "docs_updated", "docsCount": 1, "ts": sent * 1000})
+
+        totals = self._collect("ims_docs_total")
+        self.assertLess(totals[0].timestamp - sent, 0.3)
+
+if __name__ == "__main__":
+    unittest.main()
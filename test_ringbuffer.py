@@ -0,0 +1,54 @@
+import unittest
+from monitoring_system_v3 import Metric
+from monitoring_ringbuffer import RecentStore, SeriesRing, CompactMetric
+from monitoring_bench import bench_recent_memory
+
+class TestSeriesRing(unittest.TestCase):
+    def test_overwrites_oldest_and_wraps_window(self):
+        ring = SeriesRing(capacity=5)
+        for i in range(8):
+            ring.append(float(i), float(i * 10))
+
+        segments = ring.window()
+        self.assertEqual(len(segments), 2)
+        self.assertEqual([list(ts) for ts, _ in segments], [[3.0, 4.0], [5.0, 6.0, 7.0]])
+        self.assertEqual(ring.latest(), (7.0, 70.0))
+
+    def test_window_bounds(self):
+        ring = SeriesRing(capacity=10)
+        for i in range(10):
+            ring.append(float(i), float(i))
+
+        segments = ring.window(since=2.0, until=5.0)
+        self.assertEqual([list(values) for _, values in segments], [[2.0, 3.0, 4.0]])
+        self.assertEqual(ring.window(since=20.0), [])
+
+    def test_window_is_zero_copy(self):
+        ring = SeriesRing(capacity=4)
+        for i in range(4):
+            ring.append(float(i), 0.0)
+
+        (_, values), = ring.window()
+        ring.values[0] = 42.0
+        self.assertEqual(values[0], 42.0)
+
+class TestRecentStore(unittest.TestCase):
+    def test_interns_series_and_serves_latest(self):
+        store = RecentStore(capacity=3)
+        for i in range(5):
+            store.save(Metric(name="cpu_usage", value=float(i), timestamp=float(i), tags={"host": "a"}))
+        sid = store.series_id("cpu_usage", {"host": "a"})
+        store.append(CompactMetric(sid, 99.0, 5.0))
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual(list(store.iter_window("cpu_usage", {"host": "a"})), [(3.0, 3.0), (4.0, 4.0), (5.0, 99.0)])
+        self.assertEqual(store.latest("cpu_usage", {"host": "a"}).value, 99.0)
+        self.assertIsNone(store.latest("cpu_usage", {"host": "b"}))
+
+    def test_memory_at_least_five_times_smaller(self):
+        result = bench_recent_memory(series=20, samples_per_series=100)
+
+        self.assertGreaterEqual(result["ratio"], 5.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import sqlite3
+import os
+from monitoring_system_v3 import BufferedSQLiteStorage, Metric
+from monitoring_rollup import RollupManager
+from monitoring_query import MetricQuery
+
+class TestRollupManager(unittest.TestCase):
+    def setUp(self):
+        self.test_db = "test_rollup_metrics.db"
+        self._cleanup()
+        self.storage = BufferedSQLiteStorage(self.test_db)
+        self.manager = RollupManager(self.test_db, batch_size=50, prune_batch_size=10)
+
+    def tearDown(self):
+        self.manager.stop()
+        self.storage.close()
+        self._cleanup()
+
+    def _cleanup(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.test_db + suffix):
+                os.remove(self.test_db + suffix)
+
+    def _save(self, start, count, step=1.0, host="a"):
+        for i in range(count):
+            self.storage.save(Metric(name="cpu_usage", value=float(i), timestamp=start + i * step,
+                                     tags={"host": host}))
+        self.storage.flush()
+
+    def _rows(self, table):
+        with sqlite3.connect(self.test_db) as conn:
+            return conn.execute(
+                f"SELECT bucket, min, max, sum, count, last FROM {table} ORDER BY bucket").fetchall()
+
+    def test_rollup_is_incremental(self):
+        self._save(0.0, 90)
+        self.assertEqual(self.manager.rollup(), 90)
+        self._save(90.0, 30)
+        self.assertEqual(self.manager.rollup(), 30)
+
+        self.assertEqual(self._rows("metrics_1m"), [
+            (0.0, 0.0, 59.0, float(sum(range(60))), 60, 59.0),
+            (60.0, 0.0, 89.0, float(sum(range(60, 90)) + sum(range(30))), 60, 29.0),
+        ])
+        self.assertEqual(self._rows("metrics_1h")[0][4], 120)
+
+    def test_prune_only_drops_rolled_up_rows(self):
+        self.manager.retention.update({"raw": 100, "1m": 200})
+        self._save(0.0, 300)
+        self.manager.rollup()
+        self._save(0.0, 10, host="late")
+
+        self.manager.prune(now=400.0)
+
+        with sqlite3.connect(self.test_db) as conn:
+            remaining = conn.execute(
+                "SELECT COUNT(*), MIN(s.tags) FROM metrics m JOIN series s ON s.id = m.series_id").fetchone()
+        self.assertEqual(remaining, (10, '{"host": "late"}'))
+        self.assertEqual([row[0] for row in self._rows("metrics_1m")], [240.0])
+
+    def test_prune_resumes_from_last_pruned_id(self):
+        self.manager.retention["raw"] = 100
+        self._save(0.0, 300)
+        self.manager.rollup()
+
+        self.assertEqual(self.manager.prune(now=250.0), 150)
+        self.assertEqual(self.manager._state("prune_id"), 150)
+        self.assertEqual(self.manager.prune(now=250.0), 0)
+
+        self._save(0.0, 5, host="late")
+        self.manager.rollup()
+        self.assertEqual(self.manager.prune(now=400.0), 155)
+        with sqlite3.connect(self.test_db) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0], 0)
+
+    def test_long_range_query_uses_coarse_tier(self):
+        self._save(0.0, 600, step=60.0)
+        self._save(0.0, 600, step=60.0, host="b")
+        self.manager.rollup()
+        query = MetricQuery(self.test_db, retention={"raw": 1e12, "1m": 1e12, "1h": 1e12})
+        try:
+            self.assertEqual(query.select_tier(0.0, 600.0, 1000), "raw")
+            self.assertEqual(query.select_tier(0.0, 36000.0, 1000), "1m")
+            self.assertEqual(query.select_tier(0.0, 36000.0, 100), "1h")
+
+            points = list(query.rollup("cpu_usage", 0.0, 36000.0, tags={"host": "a"}, max_points=100))
+        finally:
+            query.close()
+
+        self.assertEqual([p.timestamp for p in points], [3600.0 * i for i in range(10)])
+        self.assertEqual(points[0].count, 60)
+        self.assertEqual(points[0].avg, sum(range(60)) / 60)
+        self.assertEqual(points[0].last, 59.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from typing import List
+from monitoring_system_v3 import IStorage, Metric
+from monitoring_router import StorageRouter
+
+class FlakyStorage(IStorage):
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.saved: List[Metric] = []
+
+    def save(self, metric: Metric):
+        self.save_batch([metric])
+
+    def save_batch(self, metrics: List[Metric]):
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("backend unavailable")
+        self.saved.extend(metrics)
+
+class StrictStorage(FlakyStorage):
+    """Rejects batches holding a non-string tag value, like a typed store would."""
+
+    def save_batch(self, metrics: List[Metric]):
+        if any(not isinstance(v, str) for m in metrics for v in m.tags.values()):
+            raise TypeError("tag values must be strings")
+        super().save_batch(metrics)
+
+def _metrics(count: int, start: int = 0) -> List[Metric]:
+    return [Metric(name="cpu_usage", value=float(i), tags={"host": "a"}) for i in range(start, start + count)]
+
+class TestStorageRouter(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir)
+
+    def _router(self, backends, **kwargs):
+        kwargs.setdefault("batch_wait", 0.0)
+        kwargs.setdefault("retry_backoff", 0.05)
+        return StorageRouter(backends, spill_dir=self.spill_dir, **kwargs)
+
+    def test_save_does_not_wait_for_slow_backend(self):
+        slow = FlakyStorage(delay=0.2)
+        router = self._router([slow], batch_size=10)
+
+        start = time.monotonic()
+        for metric in _metrics(50):
+            router.save(metric)
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        self.assertTrue(router.flush(timeout=5))
+        router.close()
+        self.assertEqual([m.value for m in slow.saved], [float(i) for i in range(50)])
+
+    def test_failed_batches_spill_and_replay_in_order(self):
+        flaky = FlakyStorage(failures=3)
+        healthy = FlakyStorage()
+        router = self._router([flaky, healthy], batch_size=5)
+
+        for metric in _metrics(20):
+            router.save(metric)
+        self.assertTrue(router.flush(timeout=5))
+        deadline = time.monotonic() + 5
+        while len(flaky.saved) < 20 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stats = router.stats()["FlakyStorage"]
+        router.close()
+
+        self.assertEqual([m.value for m in flaky.saved], [float(i) for i in range(20)])
+        self.assertEqual([m.value for m in healthy.saved], [float(i) for i in range(20)])
+        self.assertEqual(stats["failed"], 3)
+        self.assertGreater(stats["replayed"], 0)
+        self.assertEqual(stats["spill_bytes"], 0)
+
+    def test_overflow_spills_instead_of_blocking(self):
+        slow = FlakyStorage(delay=0.05)
+        router = self._router([slow], max_queue=10, batch_size=10)
+
+        for metric in _metrics(200):
+            router.save(metric)
+        self.assertTrue(router.flush(timeout=5))
+        deadline = time.monotonic() + 10
+        while len(slow.saved) < 200 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stats = router.stats()["FlakyStorage"]
+        router.close()
+
+        self.assertGreater(stats["spilled"], 0)
+        self.assertEqual(stats["dropped"], 0)
+        self.assertEqual(sorted(m.value for m in slow.saved), [float(i) for i in range(200)])
+
+    def test_spill_survives_restart(self):
+        down = FlakyStorage(failures=1000)
+        router = self._router([down], batch_size=10)
+        for metric in _metrics(30):
+            router.save(metric)
+        self.assertTrue(router.flush(timeout=5))
+        router.close()
+        self.assertEqual(down.saved, [])
+        spill_files = os.listdir(self.spill_dir)
+        self.assertEqual(len(spill_files), 1)
+
+        recovered = FlakyStorage()
+        router = self._router([recovered])
+        deadline = time.monotonic() + 5
+        while len(recovered.saved) < 30 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        router.close()
+
+        self.assertEqual([m.value for m in recovered.saved], [float(i) for i in range(30)])
+        self.assertEqual(os.path.getsize(os.path.join(self.spill_dir, spill_files[0])), 0)
+
+    def test_bad_metric_is_dropped_alone(self):
+        strict = StrictStorage()
+        router = self._router([strict], batch_size=10, batch_wait=0.2)
+        bad = Metric(name="cpu_usage", value=-1.0, tags={"host": ["a"]})
+        for metric in _metrics(3) + [bad] + _metrics(2, start=3):
+            router.save(metric)
+        self.assertTrue(router.flush(timeout=5))
+        for metric in _metrics(2, start=5):
+            router.save(metric)
+        self.assertTrue(router.flush(timeout=5))
+        stats = router.stats()["StrictStorage"]
+        router.close()
+
+        self.assertEqual([m.value for m in strict.saved], [float(i) for i in range(7)])
+        self.assertEqual((stats["delivered"], stats["dropped"]), (7, 1))
+
+    def test_unencodable_metric_is_not_spilled(self):
+        down = FlakyStorage(failures=2)
+        router = self._router([down], batch_size=10, batch_wait=0.2)
+        bad = Metric(name="cpu_usage", value=-1.0, tags={"host": ["a"]})
+        for metric in _metrics(3) + [bad] + _metrics(2, start=3):
+            router.save(metric)
+        self.assertTrue(router.flush(timeout=5))
+        deadline = time.monotonic() + 5
+        while len(down.saved) < 5 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stats = router.stats()["FlakyStorage"]
+        router.close()
+
+        self.assertEqual([m.value for m in down.saved], [float(i) for i in range(5)])
+        self.assertEqual((stats["spilled"], stats["dropped"]), (5, 1))
+
+    def test_relative_spill_dir_is_resolved_once(self):
+        cwd = os.getcwd()
+        os.chdir(self.spill_dir)
+        try:
+            router = StorageRouter([FlakyStorage()], spill_dir="spill")
+            os.chdir(cwd)
+            router.close()
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(router.spill_dir, os.path.join(os.path.realpath(self.spill_dir), "spill"))
+        self.assertTrue(os.path.isdir(router.spill_dir))
+
+    def test_lag_metrics_per_backend(self):
+        router = self._router([FlakyStorage()])
+        for metric in _metrics(5):
+            router.save(metric)
+        router.flush(timeout=5)
+        metrics = {m.name: m for m in router.metrics()}
+        router.close()
+
+        self.assertEqual(metrics["storage_lag_seconds"].tags, {"backend": "FlakyStorage"})
+        self.assertEqual(metrics["storage_delivered_total"].value, 5.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from typing import List, Tuple
+from monitoring_system_v3 import MonitoringEngine, IAlertChannel, Metric
+from monitoring_rules import AlertRule, RuleEngine
+
+class RecordingChannel(IAlertChannel):
+    def __init__(self):
+        self.alerts: List[Tuple[str, str]] = []
+
+    def send_alert(self, message: str, severity: str):
+        self.alerts.append((message, severity))
+
+def sample(value, ts, **tags):
+    return Metric(name="cpu_usage", value=value, timestamp=ts, tags=tags or {"host": "a"})
+
+class TestRuleEngine(unittest.TestCase):
+    def _states(self, engine, metrics):
+        return [(e.state, e.timestamp) for m in metrics for e in engine.evaluate(m)]
+
+    def test_fires_once_and_resolves_with_hysteresis(self):
+        engine = RuleEngine([AlertRule(name="cpu", metric="cpu_usage", threshold=80, clear_threshold=70)])
+        values = [50, 85, 90, 75, 95, 65, 85]
+
+        states = self._states(engine, [sample(v, t) for t, v in enumerate(values)])
+
+        self.assertEqual(states, [("firing", 1), ("resolved", 5), ("firing", 6)])
+
+    def test_for_duration_and_matchers(self):
+        engine = RuleEngine([AlertRule(name="cpu", metric="cpu_usage", threshold=80,
+                                       for_duration=2, matchers={"host": "a"})])
+        metrics = [sample(90, t) for t in range(4)] + [sample(90, t, host="b") for t in range(4)]
+
+        self.assertEqual(self._states(engine, metrics), [("firing", 2)])
+
+    def test_windowed_average_and_rate(self):
+        engine = RuleEngine([
+            AlertRule(name="avg", metric="cpu_usage", threshold=50, aggregation="avg", window=2),
+            AlertRule(name="rate", metric="cpu_usage", threshold=20, aggregation="rate", window=10),
+        ])
+        events = [e for t, v in enumerate([0, 100, 100, 0, 0]) for e in engine.evaluate(sample(v, t))]
+
+        self.assertEqual([(e.rule.name, e.state, e.timestamp) for e in events], [
+            ("rate", "firing", 1), ("avg", "firing", 2), ("rate", "resolved", 3), ("avg", "resolved", 4)])
+
+    def test_only_matching_metric_rules_are_evaluated(self):
+        engine = RuleEngine([AlertRule(name=f"r{i}", metric=f"m{i}", threshold=0) for i in range(1000)])
+
+        self.assertEqual(engine.evaluate(Metric(name="cpu_usage", value=1.0)), [])
+        self.assertEqual(len(engine.evaluate(Metric(name="m7", value=1.0))), 1)
+
+    def test_rules_are_indexed_by_matcher(self):
+        rules = [AlertRule(name=f"h{i}", metric="cpu_usage", threshold=0, matchers={"host": f"h{i}", "dc": "x"})
+                 for i in range(1000)]
+        rules.append(AlertRule(name="any", metric="cpu_usage", threshold=0))
+        engine = RuleEngine(rules)
+
+        metric = sample(1.0, 0, host="h7", dc="x")
+        self.assertEqual(len(engine._index["cpu_usage"].candidates(metric.tags)), 2)
+        self.assertEqual([e.rule.name for e in engine.evaluate(metric)], ["h7", "any"])
+        self.assertEqual([e.rule.name for e in engine.evaluate(sample(1.0, 0, host="h8", dc="y"))], ["any"])
+
+        engine.remove_rule("h7")
+        self.assertEqual([e.rule.name for e in engine.evaluate(sample(1.0, 1, host="h7", dc="x", pod="p"))], ["any"])
+
+    def test_idle_series_state_is_evicted(self):
+        engine = RuleEngine([AlertRule(name="cpu", metric="cpu_usage", threshold=80)], stale_after=100)
+        for i in range(50):
+            engine.evaluate(sample(10, 0, host=f"h{i}"))
+        engine.evaluate(sample(90, 0, host="hot"))
+        engine.evaluate(sample(10, 150, host="h0"))
+
+        states = engine._index["cpu_usage"].rules[0].states
+        self.assertEqual(sorted(dict(key)["host"] for key in states), ["h0", "hot"])
+        self.assertEqual(engine.firing(), [("cpu", (("host", "hot"),))])
+
+    def test_engine_uses_rule_engine(self):
+        config = {"thresholds": {"cpu_usage": 80.0}, "interval": 1}
+        engine = MonitoringEngine(config)
+        channel = RecordingChannel()
+        engine.register_alerter(channel)
+        engine.set_rule_engine(RuleEngine.from_config(config))
+
+        for t, value in enumerate([90, 95, 10]):
+            engine._evaluate(sample(value, t))
+
+        self.assertEqual([severity for _, severity in channel.alerts], ["critical", "info"])
+        self.assertIn("cpu_usage{host=a}", channel.alerts[0][0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import json
+import tempfile
+import unittest
+import http.client
+from unittest import mock
+import monitoring_search
+from monitoring_search import SearchIndex, SearchServer
+
+def _titles(response):
+    return [r["title"] for r in response["results"]]
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.sync("dms_docs_v1", [
+            {"controlNumber": "IMS-2024-0001", "title": "Receiving report", "owner": "maria", "status": "Open"},
+            {"controlNumber": "IMS-2024-0002", "title": "Damaged pallet IMS-2024-0001", "owner": "jose"},
+            {"controlNumber": "QA-77", "title": "Pallet audit", "owner": "ana"},
+        ])
+        self.index.sync("ims_cycle_count_v1", [
+            {"id": "cc1", "itemCode": 880123, "location": "A01-R2", "physical": 8, "system": 10},
+        ])
+        self.index.sync("ims_daily_attendance_v1", [{"id": "a1", "name": "Maria Santos", "userId": "U100", "role": "IC"}])
+
+    def test_substring_matches_across_datasets(self):
+        self.assertEqual(_titles(self.index.search("0123")), ["880123"])
+        self.assertEqual(self.index.search("zzz")["total"], 0)
+
+        result = self.index.search("880123")["results"][0]
+        self.assertEqual(result, {"type": "Cycle Count", "title": "880123", "subtitle": "A01-R2", "meta": "Var: -2",
+                                  "link": "cycle_count.html?search=880123"})
+
+    def test_ranks_primary_field_matches_first(self):
+        response = self.index.search("ims-2024-0001")
+        self.assertEqual(response["total"], 2)
+        self.assertEqual(_titles(response), ["Receiving report", "Damaged pallet IMS-2024-0001"])
+
+        response = self.index.search("pallet")
+        self.assertEqual(_titles(response), ["Pallet audit", "Damaged pallet IMS-2024-0001"])
+
+    def test_short_terms_and_multiple_terms(self):
+        # owner is not searched, like app.js: maria's document does not match
+        self.assertEqual(_titles(self.index.search("ma")), ["Maria Santos"])
+        self.assertEqual(_titles(self.index.search("maria u1")), ["Maria Santos"])
+        self.assertEqual(_titles(self.index.search("ma", types={"Attendance"})), ["Maria Santos"])
+
+    def test_incremental_updates(self):
+        self.index.upsert("dms_docs_v1", [{"controlNumber": "QA-77", "title": "Cycle audit", "owner": "ana"}])
+        self.assertEqual(_titles(self.index.search("pallet")), ["Damaged pallet IMS-2024-0001"])
+        self.assertEqual(_titles(self.index.search("cycle audit")), ["Cycle audit"])
+
+        self.assertTrue(self.index.remove("ims_daily_attendance_v1", "a1"))
+        self.assertEqual(_titles(self.index.search("santos")), [])
+
+        self.index.sync("dms_docs_v1", [{"controlNumber": "QA-77", "title": "Cycle audit"}])
+        self.assertEqual(self.index.search("ims-2024")["total"], 0)
+        self.assertEqual(self.index.stats()["dms_docs_v1"], 1)
+
+    def test_bulk_ranking_matches_record_ranking(self):
+        docs = [{"controlNumber": f"DOC-{i:03d}", "title": f"pallet {i}" if i % 3 else "pal", "owner": "x"}
+                for i in range(60)]
+        self.index.sync("dms_docs_v1", docs)
+        expected = _titles(self.index.search("pal", limit=30))
+        with mock.patch.object(monitoring_search, "BULK_RANK", 5):
+            self.assertEqual(_titles(self.index.search("pal", limit=30)), expected)
+        self.assertEqual(expected[:20], ["pal"] * 20)
+
+    def test_loads_exports_and_db_json(self):
+        path = tempfile.mktemp(suffix=".json")
+        try:
+            with open(path, "w") as f:
+                json.dump({"docs": [{"controlNumber": "TEST-002", "title": "Smoke Test Document"}],
+                           "users": [], "ims_validation_tasks_v1": [{"id": "v1", "sku": "SKU-9", "validator": "ana"}]}, f)
+            index = SearchIndex()
+            index.load(path)
+            self.assertEqual(_titles(index.search("test-002")), ["Smoke Test Document"])
+            self.assertEqual(_titles(index.search("sku-9")), ["SKU-9"])
+        finally:
+            os.remove(path)
+
+class TestSearchServer(unittest.TestCase):
+    def setUp(self):
+        self.server = SearchServer(SearchIndex(), port=0).start()
+        self.conn = http.client.HTTPConnection(*self.server.address, timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.close()
+
+    def _request(self, method, path, body=None):
+        self.conn.request(method, path, body=body)
+        response = self.conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_records_and_queries(self):
+        body = json.dumps([{"id": "IR-5", "description": "Forklift incident", "status": "Open"}])
+        self.assertEqual(self._request("POST", "/records/ims_ir_records_v1", body), (200, {"updated": 1}))
+        status, response = self._request("GET", "/search?q=forklift")
+        self.assertEqual(status, 200)
+        self.assertEqual(response["results"][0]["link"], "ir_monitoring.html?search=IR-5")
+
+        self.assertEqual(self._request("DELETE", "/records/ims_ir_records_v1/IR-5")[1], {"removed": True})
+        self.assertEqual(self._request("GET", "/search?q=forklift")[1]["total"], 0)
+        self.assertEqual(self._request("POST", "/records/unknown", "[]")[0], 404)
+
+    def test_rejects_negative_content_length(self):
+        self.conn.request("POST", "/records/ims_ir_records_v1", body=b"[]", headers={"Content-Length": "-1"})
+        response = self.conn.getresponse()
+        self.assertEqual(response.status, 400)
+        self.assertEqual(json.loads(response.read()), {"error": "bad Content-Length"})
+
+if __name__ == "__main__":
+    unittest.main()
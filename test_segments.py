@@ -0,0 +1,145 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+from unittest import mock
+from monitoring_system_v3 import Metric, MetricType
+from monitoring_segments import SegmentStorage, _Segment
+
+class TestSegmentStorage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _storage(self, **kwargs):
+        kwargs.setdefault("segment_window", 100.0)
+        kwargs.setdefault("batch_size", 50)
+        return SegmentStorage(self.directory, **kwargs)
+
+    def _fill(self, storage, count=300, hosts=("a", "b", "c")):
+        for i in range(count):
+            for host in hosts:
+                storage.save(Metric(name="cpu_usage", value=float(i), timestamp=float(i), tags={"host": host}))
+        storage.save(Metric(name="bytes_total", value=1.0, timestamp=5.0, metric_type=MetricType.COUNTER))
+
+    def test_range_reads_only_matching_series(self):
+        storage = self._storage()
+        self._fill(storage)
+
+        result = list(storage.range("cpu_usage", 90.0, 110.0, tags={"host": "b"}))
+        self.assertEqual([m.timestamp for m in result], [float(t) for t in range(90, 110)])
+        self.assertTrue(all(m.tags == {"host": "b"} for m in result))
+        self.assertEqual(len(list(storage.range("cpu_usage", 0.0, 10.0))), 30)
+        self.assertEqual(list(storage.range("bytes_total"))[0].metric_type, MetricType.COUNTER)
+        storage.close()
+
+    def test_segments_per_window_and_reopen(self):
+        storage = self._storage()
+        self._fill(storage)
+        storage.close()
+
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".seg"))
+        # the late bytes_total sample reopens window 0 in a second segment
+        self.assertEqual([n.split("-")[0] for n in names],
+                         ["000000000000", "000000000000", "000000000100", "000000000200"])
+        self.assertTrue(all(os.path.exists(os.path.join(self.directory, n + ".idx")) for n in names))
+
+        reopened = self._storage()
+        self.assertEqual(sum(1 for _ in reopened.scan()), 901)
+        reopened.close()
+
+    def test_recovers_from_torn_tail(self):
+        storage = self._storage()
+        self._fill(storage, count=60)
+        storage.flush()
+        active = storage.segments()[0].path
+        # simulate a crash: no index written and half a block at the end
+        with open(active, "ab") as f:
+            f.write(b"SBLK\xff\x00\x00\x00partial")
+        if os.path.exists(active + ".idx"):
+            os.remove(active + ".idx")
+
+        reopened = self._storage()
+        self.assertEqual(sum(1 for _ in reopened.scan()), 181)
+        self.assertEqual(os.path.getsize(active), reopened.segments()[0].size)
+        reopened.close()
+
+    def test_compaction_merges_sealed_segments(self):
+        storage = self._storage(max_segment_bytes=2000)
+        self._fill(storage)
+        storage.close()
+        storage = self._storage()
+        before = len(storage.segments())
+
+        removed = storage.compact(before=1000.0, period=1000.0)
+
+        self.assertEqual(removed, before)
+        self.assertEqual(len(storage.segments()), 1)
+        result = list(storage.range("cpu_usage", tags={"host": "c"}))
+        self.assertEqual([m.timestamp for m in result], [float(t) for t in range(300)])
+        storage.close()
+
+        reopened = self._storage()
+        self.assertEqual(sum(1 for _ in reopened.scan()), 901)
+        reopened.close()
+
+    def test_compaction_writes_without_holding_the_lock(self):
+        storage = self._storage(max_segment_bytes=2000)
+        self._fill(storage)
+        storage.close()
+        storage = self._storage()
+        append_block = _Segment.append_block
+        blocks, reads = [], []
+
+        def checked_append_block(segment, metrics, keys, fsync):
+            if segment.path.endswith(".tmp"):
+                blocks.append(len(metrics))
+                reader = threading.Thread(target=lambda: reads.append(len(storage.segments())))
+                reader.start()
+                reader.join(2.0)
+            return append_block(segment, metrics, keys, fsync)
+
+        with mock.patch.object(_Segment, "append_block", checked_append_block):
+            storage.compact(before=1000.0, period=1000.0, block_records=100)
+
+        self.assertEqual(sum(blocks), 901)
+        self.assertEqual(len(reads), len(blocks))
+        result = list(storage.range("cpu_usage", tags={"host": "b"}))
+        self.assertEqual([m.timestamp for m in result], [float(t) for t in range(300)])
+        storage.close()
+
+    def test_flushes_pending_metrics_in_background(self):
+        storage = self._storage(batch_size=1000, flush_interval=0.05)
+        storage.save(Metric(name="cpu_usage", value=1.0, timestamp=1.0))
+        deadline = time.monotonic() + 5.0
+        while not storage.segments() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(storage.segments()), 1)
+        self.assertEqual(storage._pending, [])
+        storage.close()
+
+    def test_reads_while_flushing(self):
+        storage = self._storage(batch_size=10, segment_window=1e9)
+        done = threading.Event()
+
+        def write():
+            for i in range(3000):
+                storage.save(Metric(name="cpu_usage", value=float(i), timestamp=float(i), tags={"host": str(i % 7)}))
+            done.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        while not done.is_set():
+            timestamps = [m.timestamp for m in storage.range("cpu_usage", tags={"host": "3"})]
+            self.assertEqual(timestamps, sorted(timestamps))
+            sum(1 for _ in storage.scan())
+        writer.join()
+        self.assertEqual(len(list(storage.range("cpu_usage"))), 3000)
+        storage.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from typing import List
+from monitoring_system_v3 import MonitoringEngine, ICollector, IStorage, Metric
+from monitoring_proc import ProcResourceCollector
+from monitoring_shard import ShardPool, shard_for
+
+class PidCollector(ICollector):
+    def __init__(self, label: str, delay: float = 0.0):
+        self.label = label
+        self.delay = delay
+
+    @property
+    def name(self) -> str:
+        return self.label
+
+    def collect(self) -> List[Metric]:
+        time.sleep(self.delay)
+        return [Metric(name="worker_pid", value=float(os.getpid()), tags={"collector": self.label})]
+
+class CrashOnceCollector(PidCollector):
+    def __init__(self, label: str, flag_path: str):
+        super().__init__(label)
+        self.flag_path = flag_path
+
+    def collect(self) -> List[Metric]:
+        if not os.path.exists(self.flag_path):
+            open(self.flag_path, "w").close()
+            os._exit(1)
+        return super().collect()
+
+class HangOnceCollector(PidCollector):
+    def __init__(self, label: str, flag_path: str):
+        super().__init__(label)
+        self.flag_path = flag_path
+
+    def collect(self) -> List[Metric]:
+        if not os.path.exists(self.flag_path):
+            open(self.flag_path, "w").close()
+            time.sleep(60)
+        return super().collect()
+
+class ListStorage(IStorage):
+    def __init__(self):
+        self.saved: List[Metric] = []
+
+    def save(self, metric: Metric):
+        self.saved.append(metric)
+
+class TestShardPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_assignment_is_stable(self):
+        collectors = [PidCollector(f"c{i}") for i in range(20)]
+        first = [shard_for(c, 4) for c in collectors]
+
+        self.assertEqual(first, [shard_for(PidCollector(f"c{i}"), 4) for i in range(20)])
+        self.assertGreater(len(set(first)), 1)
+
+    def test_engine_collects_in_worker_processes(self):
+        storage = ListStorage()
+        engine = MonitoringEngine({"thresholds": {}, "interval": 1, "self_metrics": False})
+        for i in range(6):
+            engine.register_collector(PidCollector(f"c{i}"))
+        engine.register_storage(storage)
+        engine.set_shard_pool(ShardPool(shards=3).start())
+        # registered after the pool took the engine's collectors: runs in-process
+        engine.register_collector(PidCollector("late"))
+        try:
+            engine.run_once()
+            engine.run_once()
+        finally:
+            engine.stop()
+
+        self.assertEqual([m.tags["collector"] for m in storage.saved],
+                         ([f"c{i}" for i in range(6)] + ["late"]) * 2)
+        pids = {m.value for m in storage.saved if m.tags["collector"] != "late"}
+        self.assertNotIn(float(os.getpid()), pids)
+        self.assertGreater(len(pids), 1)
+        self.assertEqual({m.value for m in storage.saved if m.tags["collector"] == "late"}, {float(os.getpid())})
+
+    def test_slow_shard_is_an_overrun(self):
+        pool = ShardPool([PidCollector("fast"), PidCollector("slow", delay=0.5)], shards=1).start()
+        try:
+            results, overruns = pool.collect_all(timeout=0.1)
+            self.assertEqual([c.name for c in overruns], ["fast", "slow"])
+            time.sleep(0.6)
+            results, overruns = pool.collect_all(timeout=2.0)
+        finally:
+            pool.close()
+
+        self.assertEqual(overruns, [])
+        self.assertEqual([c.name for c, _, _, _ in results], ["fast", "slow"])
+
+    def test_restarts_crashed_worker(self):
+        flag = os.path.join(self.tmp, "crashed")
+        pool = ShardPool([CrashOnceCollector("crashy", flag)], shards=1).start()
+        try:
+            _, overruns = pool.collect_all(timeout=2.0)
+            self.assertEqual([c.name for c in overruns], ["crashy"])
+            results, overruns = pool.collect_all(timeout=2.0)
+            stats = pool.stats()[0]
+        finally:
+            pool.close()
+
+        self.assertEqual(overruns, [])
+        self.assertEqual(len(results[0][1]), 1)
+        self.assertEqual(stats["restarts"], 1)
+        self.assertEqual(stats["samples"], 1)
+
+    def test_restarts_hung_worker(self):
+        flag = os.path.join(self.tmp, "hung")
+        pool = ShardPool([HangOnceCollector("hangy", flag)], shards=1, hang_timeout=1.0).start()
+        try:
+            _, overruns = pool.collect_all(timeout=0.3)
+            self.assertEqual([c.name for c in overruns], ["hangy"])
+            # still hung: reported again without queueing another request
+            _, overruns = pool.collect_all(timeout=0.1)
+            self.assertEqual([c.name for c in overruns], ["hangy"])
+            self.assertEqual(pool.stats()[0]["restarts"], 0)
+            time.sleep(1.0)
+            results, overruns = pool.collect_all(timeout=5.0)
+            stats = pool.stats()[0]
+        finally:
+            pool.close()
+
+        self.assertEqual(overruns, [])
+        self.assertEqual(len(results[0][1]), 1)
+        self.assertEqual(stats["restarts"], 1)
+
+    def test_proc_collector_runs_in_a_worker(self):
+        pool = ShardPool([ProcResourceCollector()], shards=1).start()
+        try:
+            pool.collect_all(timeout=5.0)
+            time.sleep(0.2)
+            results, overruns = pool.collect_all(timeout=5.0)
+        finally:
+            pool.close()
+
+        self.assertEqual(overruns, [])
+        self.assertIsNone(results[0][3])
+        self.assertIn("cpu_usage", {m.name for m in results[0][1]})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,9 @@ import unittest
 import sqlite3
 import os
 import json
-from monitoring_system_v3 import SQLiteStorage, Metric
+import time
+from monitoring_system_v3 import SQLiteStorage, BufferedSQLiteStorage, MonitoringEngine, Metric
+from monitoring_query import MetricQuery
 
 class TestSQLiteStorage(unittest.TestCase):
     def setUp(self):
@@ -28,7 +30,8 @@ class TestSQLiteStorage(unittest.TestCase):
         # Assert: Manually verify the data exists in the SQLite file
         with sqlite3.connect(self.test_db) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT name, value, tags FROM metrics WHERE name = ?", ("unit_test_metric",))
+            cursor.execute("SELECT s.name, m.value, s.tags FROM metrics m JOIN series s ON s.id = m.series_id "
+                           "WHERE s.name = ?", ("unit_test_metric",))
             row = cursor.fetchone()
             
             self.assertIsNotNone(row, "The metric should be found in the database")
@@ -36,5 +39,125 @@ class TestSQLiteStorage(unittest.TestCase):
             self.assertEqual(row[1], 99.9)
             self.assertEqual(json.loads(row[2]), {"env": "test"})
 
+class TestSeriesRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_db = "test_series_metrics.db"
+        self._cleanup()
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.test_db + suffix):
+                os.remove(self.test_db + suffix)
+
+    def test_rows_store_series_ids(self):
+        storage = SQLiteStorage(self.test_db)
+        storage.save_batch([
+            Metric(name="cpu_usage", value=1.0, tags={"host": "a", "dc": "x"}),
+            Metric(name="cpu_usage", value=2.0, tags={"dc": "x", "host": "a"}),
+            Metric(name="cpu_usage", value=3.0, tags={"host": "b"}),
+        ])
+
+        with sqlite3.connect(self.test_db) as conn:
+            rows = conn.execute("SELECT name, tags, series_id FROM metrics ORDER BY id").fetchall()
+            series = conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+        self.assertEqual([r[:2] for r in rows], [(None, None)] * 3)
+        self.assertEqual(rows[0][2], rows[1][2])
+        self.assertNotEqual(rows[0][2], rows[2][2])
+        self.assertEqual(series, 2)
+
+    def test_cardinality_limit_refuses_new_series(self):
+        storage = SQLiteStorage(self.test_db, max_series_per_metric=3)
+        storage.save_batch([Metric(name="http_requests", value=1.0, tags={"request_id": str(i)}) for i in range(10)])
+        storage.save_batch([Metric(name="http_requests", value=2.0, tags={"request_id": "0"}),
+                            Metric(name="cpu_usage", value=1.0)])
+
+        with sqlite3.connect(self.test_db) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0], 5)
+        self.assertEqual(storage.registry.top_offenders(1), [("http_requests", 3, 7)])
+
+        reopened = SQLiteStorage(self.test_db, max_series_per_metric=3)
+        reopened.save(Metric(name="http_requests", value=1.0, tags={"request_id": "new"}))
+        self.assertEqual(reopened.registry.dropped, {"http_requests": 1})
+        dropped = [m for m in reopened.metrics() if m.name == "series_dropped_total"]
+        self.assertEqual((dropped[0].tags, dropped[0].value), ({"metric": "http_requests"}, 1.0))
+
+    def test_migrates_legacy_rows(self):
+        with sqlite3.connect(self.test_db) as conn:
+            conn.execute("CREATE TABLE metrics (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp REAL, "
+                         "name TEXT, value REAL, tags TEXT)")
+            conn.executemany("INSERT INTO metrics (timestamp, name, value, tags) VALUES (?, ?, ?, ?)",
+                             [(1.0, "cpu_usage", 10.0, '{"host": "a"}'), (2.0, "cpu_usage", 20.0, None)])
+
+        storage = SQLiteStorage(self.test_db)
+        storage.save(Metric(name="cpu_usage", value=30.0, timestamp=3.0, tags={"host": "a"}))
+
+        query = MetricQuery(self.test_db)
+        self.assertEqual([m.value for m in query.range("cpu_usage", 0.0)], [10.0, 20.0, 30.0])
+        self.assertEqual([m.value for m in query.range("cpu_usage", 0.0, tags={"host": "a"})], [10.0, 30.0])
+        query.close()
+
+class TestBufferedSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.test_db = "test_buffered_metrics.db"
+        self._cleanup()
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.test_db + suffix):
+                os.remove(self.test_db + suffix)
+
+    def _count(self):
+        with sqlite3.connect(self.test_db) as conn:
+            return conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0]
+
+    def test_flushes_when_batch_is_full(self):
+        storage = BufferedSQLiteStorage(self.test_db, batch_size=10, flush_interval=60)
+        for i in range(25):
+            storage.save(Metric(name="batched", value=float(i)))
+
+        self.assertEqual(self._count(), 20)
+        self.assertEqual(storage.pending, 5)
+        storage.close()
+        self.assertEqual(self._count(), 25)
+
+    def test_engine_stop_flushes_tail(self):
+        storage = BufferedSQLiteStorage(self.test_db, batch_size=1000, flush_interval=60)
+        engine = MonitoringEngine({"thresholds": {}, "interval": 1})
+        engine.register_storage(storage)
+        storage.save(Metric(name="tail", value=1.0, tags={"env": "test"}))
+
+        engine.stop()
+
+        with sqlite3.connect(self.test_db) as conn:
+            row = conn.execute(
+                "SELECT s.name, m.value, s.tags FROM metrics m JOIN series s ON s.id = m.series_id").fetchone()
+        self.assertEqual(row, ("tail", 1.0, json.dumps({"env": "test"})))
+
+    def test_flushes_on_interval(self):
+        storage = BufferedSQLiteStorage(self.test_db, batch_size=1000, flush_interval=0.05)
+        storage.save(Metric(name="timed", value=1.0))
+        deadline = time.time() + 2
+        while self._count() == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._count(), 1)
+        storage.close()
+
+    def test_save_batch_writes_through_and_raises(self):
+        storage = BufferedSQLiteStorage(self.test_db, batch_size=1000, flush_interval=60)
+        storage.save(Metric(name="buffered", value=1.0))
+        storage.save_batch([Metric(name="batch", value=float(i)) for i in range(3)])
+
+        self.assertEqual(self._count(), 4)
+        self.assertEqual(storage.pending, 0)
+        storage.close()
+        with self.assertRaises(RuntimeError):
+            storage.save_batch([Metric(name="late", value=1.0)])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file